@@ -0,0 +1,165 @@
+"""
+Float32 (`embedding`, vector) against half-precision (`embedding_half`, halfvec) storage
+for one embed_version: on-disk size, HNSW build time, query latency and recall. Needs
+both columns filled (e.g. `benchmarks.search_load seed`, or `tools.halfvec backfill`
+without `release`); run from `backend/`:
+
+    python -m benchmarks.halfvec --embed-version bench-0 --queries 200 --limit 30
+    python -m benchmarks.halfvec --embed-version bench-0 --rebuild
+
+Queries are stored embeddings of the version plus a little noise. Recall@limit is
+measured for both storages against an exact float32 scan (index scans disabled), so the
+halfvec figure includes both the ANN and the rounding loss. `--rebuild` drops and
+rebuilds both HNSW indexes (without CONCURRENTLY) to time them; otherwise existing
+indexes are kept and only their sizes are reported.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import cast, func, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from models.search_record import SearchRecord
+from services.vector_search import EmbeddingStorage, FilterPlanner, ann_index_name, nearest_query
+from tools.ann_indexes import build as build_ann_index, drop as drop_ann_index
+
+STORAGES: Tuple[EmbeddingStorage, ...] = ("vector", "halfvec")
+
+
+async def sample_queries(session: AsyncSession, embed_version: str, count: int, dim: int, rng: np.random.Generator) -> List[List[float]]:
+    result = await session.execute(
+        select(cast(SearchRecord.embedding, Vector(dim))).where(
+            SearchRecord.embed_version == embed_version, SearchRecord.embedding.is_not(None)
+        ).order_by(func.random()).limit(count)
+    )
+    rows = [np.asarray(row, dtype=np.float32) for row in result.scalars().all()]
+    if not rows:
+        raise SystemExit(f"No float32 embeddings for embed_version {embed_version!r}")
+    queries = []
+    for row in rows:
+        vector = row + 0.05 * rng.standard_normal(dim).astype(np.float32)
+        queries.append((vector / np.linalg.norm(vector)).tolist())
+    return queries
+
+
+async def column_sizes(session: AsyncSession, embed_version: str) -> Dict[str, int]:
+    result = await session.execute(
+        select(
+            func.coalesce(func.sum(func.pg_column_size(SearchRecord.embedding)), 0),
+            func.coalesce(func.sum(func.pg_column_size(SearchRecord.embedding_half)), 0),
+        ).where(SearchRecord.embed_version == embed_version)
+    )
+    vector_bytes, halfvec_bytes = result.one()
+    return {"vector": int(vector_bytes), "halfvec": int(halfvec_bytes)}
+
+
+async def index_size(session: AsyncSession, name: str) -> Optional[int]:
+    result = await session.execute(text("SELECT pg_relation_size(to_regclass(:name))"), {"name": name})
+    return result.scalar_one()
+
+
+async def rebuild_indexes(engine: AsyncEngine, embed_version: str, dim: int) -> Dict[str, float]:
+    timings = {}
+    for storage in STORAGES:
+        await drop_ann_index(engine, embed_version, "hnsw", concurrently=False, storage=storage)
+        started = time.perf_counter()
+        await build_ann_index(engine, embed_version, "hnsw", dim, 16, 64, None, None, concurrently=False, storage=storage)
+        timings[storage] = time.perf_counter() - started
+    return timings
+
+
+async def exact_neighbours(session: AsyncSession, queries: List[List[float]], embed_version: str, limit: int, dim: int) -> List[Set[int]]:
+    truth = []
+    for query_vector in queries:
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        results = await session.execute(nearest_query(query_vector, embed_version, limit, dim))
+        truth.append({row.id for row in results})
+        await session.rollback()
+    return truth
+
+
+async def measure(
+    session: AsyncSession,
+    planner: FilterPlanner,
+    queries: List[List[float]],
+    truth: List[Set[int]],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    ef_search: Optional[int],
+) -> Tuple[List[float], float]:
+    await planner.nearest(session, queries[0], embed_version, limit, dim, ef_search=ef_search)  # warm-up
+    await session.rollback()
+    timings = []
+    hits = 0
+    for query_vector, expected in zip(queries, truth):
+        started = time.perf_counter()
+        ranked = await planner.nearest(session, query_vector, embed_version, limit, dim, ef_search=ef_search)
+        timings.append(time.perf_counter() - started)
+        # End the transaction so SET LOCAL recall settings do not leak into the next query
+        await session.rollback()
+        hits += len(expected.intersection(record_id for record_id, _ in ranked))
+    return timings, hits / max(1, sum(len(expected) for expected in truth))
+
+
+def mib(size: Optional[int]) -> str:
+    return "-" if size is None else f"{size / 2 ** 20:.1f}"
+
+
+async def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Benchmark halfvec against float32 embedding storage")
+    parser.add_argument("--embed-version", default="default")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="Drop and rebuild both HNSW indexes to time the builds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    dim = settings.embedding_dim
+    build_times: Dict[str, float] = {}
+    if args.rebuild:
+        ddl_engine = create_async_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+        try:
+            build_times = await rebuild_indexes(ddl_engine, args.embed_version, dim)
+        finally:
+            await ddl_engine.dispose()
+
+    engine = create_async_engine(settings.database_url)
+    try:
+        async with AsyncSession(engine) as session:
+            sizes = await column_sizes(session, args.embed_version)
+            index_sizes = {
+                storage: await index_size(session, ann_index_name(args.embed_version, "hnsw", storage)) for storage in STORAGES
+            }
+            queries = await sample_queries(session, args.embed_version, args.queries, dim, np.random.default_rng(args.seed))
+            await session.rollback()
+            truth = await exact_neighbours(session, queries, args.embed_version, args.limit, dim)
+
+            print(f"{len(queries)} queries, limit {args.limit}, ef_search {args.ef_search or 'default'}")
+            print(f"{'storage':<9}{'column MiB':>12}{'index MiB':>11}{'build s':>9}{'median ms':>11}{'p95 ms':>9}{f'recall@{args.limit}':>11}")
+            for storage in STORAGES:
+                planner = FilterPlanner(settings.filter_prefilter_max_rows, settings.filter_overfetch_factor, storage=storage)
+                timings, recall = await measure(session, planner, queries, truth, args.embed_version, args.limit, dim, args.ef_search)
+                median = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else median
+                build = f"{build_times[storage]:.1f}" if storage in build_times else "-"
+                print(
+                    f"{storage:<9}{mib(sizes[storage]):>12}{mib(index_sizes[storage]):>11}{build:>9}"
+                    f"{median * 1000:>11.2f}{p95 * 1000:>9.2f}{recall:>11.3f}"
+                )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
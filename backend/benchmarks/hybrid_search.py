@@ -0,0 +1,124 @@
+"""
+Latency of hybrid (lexical + vector, rank-fused) ranking against the vector-only path.
+Needs a populated search_records table with the V6 lexical indexes (e.g. seeded by
+`benchmarks.search_load seed`); run from `backend/`:
+
+    python -m benchmarks.hybrid_search --embed-version bench-0 --queries 200 --limit 30
+
+Query texts are scientific names sampled from the embed_version, half of them with a
+typo so the trigram indexes are exercised too; query vectors are random unit vectors.
+Both paths go through FilterPlanner, each query in its own transaction, so the timings
+are the `rank` stage of /api/search without the model or hydration.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from models.search_record import SearchRecord
+from services.search_filters import SearchFilters
+from services.vector_search import FilterPlanner, RankedIds
+
+Query = Tuple[str, List[float]]
+
+
+def with_typo(text: str, rng: np.random.Generator) -> str:
+    if len(text) < 4:
+        return text
+    position = int(rng.integers(1, len(text) - 1))
+    return text[:position] + text[position + 1] + text[position] + text[position + 2:]
+
+
+async def sample_queries(session: AsyncSession, embed_version: str, count: int, dim: int, rng: np.random.Generator) -> List[Query]:
+    result = await session.execute(
+        select(SearchRecord.scientific_name).where(
+            SearchRecord.embed_version == embed_version, SearchRecord.scientific_name.is_not(None)
+        ).limit(count * 50)
+    )
+    names = list(result.scalars().all())
+    if not names:
+        raise SystemExit(f"No named rows for embed_version {embed_version!r}")
+    queries = []
+    for index in range(count):
+        name = names[int(rng.integers(len(names)))]
+        vector = rng.standard_normal(dim)
+        queries.append((with_typo(name, rng) if index % 2 else name, (vector / np.linalg.norm(vector)).tolist()))
+    return queries
+
+
+async def measure(
+    session: AsyncSession,
+    path: Callable[[AsyncSession, str, List[float]], Awaitable[RankedIds]],
+    queries: Sequence[Query],
+    repeat: int,
+) -> Tuple[List[float], float]:
+    await path(session, *queries[0])  # warm-up: prepared statements, type introspection
+    await session.rollback()
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        for query_text, query_vector in queries:
+            started = time.perf_counter()
+            rows += len(await path(session, query_text, query_vector))
+            timings.append(time.perf_counter() - started)
+            # End the transaction so SET LOCAL recall settings do not leak into the next query
+            await session.rollback()
+    return timings, rows / len(timings)
+
+
+async def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Benchmark hybrid search against vector-only search")
+    parser.add_argument("--embed-version", default="default")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--candidates", type=int, default=settings.hybrid_candidates)
+    parser.add_argument("--rrf-k", type=int, default=settings.hybrid_rrf_k)
+    parser.add_argument("--tax-order", default=None, help="Also apply a tax_order filter to both paths")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    dim = settings.embedding_dim
+    filters = SearchFilters(tax_order=args.tax_order)
+    planner = FilterPlanner(
+        settings.filter_prefilter_max_rows, settings.filter_overfetch_factor, storage=settings.embedding_storage
+    )
+
+    async def vector_path(session: AsyncSession, query_text: str, query_vector: List[float]) -> RankedIds:
+        return await planner.nearest(session, query_vector, args.embed_version, args.limit, dim, filters)
+
+    async def hybrid_path(session: AsyncSession, query_text: str, query_vector: List[float]) -> RankedIds:
+        return await planner.hybrid(
+            session, query_text, query_vector, args.embed_version, args.limit, dim, args.candidates, args.rrf_k, filters
+        )
+
+    engine = create_async_engine(settings.database_url)
+    try:
+        async with AsyncSession(engine) as session:
+            queries = await sample_queries(session, args.embed_version, args.queries, dim, np.random.default_rng(args.seed))
+            await session.rollback()
+
+            print(f"{len(queries)} queries x {args.repeat} repeats, limit {args.limit}, {args.candidates} candidates per side")
+            print(f"{'path':<8}{'rows':>7}{'median ms':>12}{'p95 ms':>10}{'mean ms':>10}")
+            medians = {}
+            for name, path in (("vector", vector_path), ("hybrid", hybrid_path)):
+                timings, rows = await measure(session, path, queries, args.repeat)
+                median = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else median
+                medians[name] = median
+                print(f"{name:<8}{rows:>7.1f}{median * 1000:>12.2f}{p95 * 1000:>10.2f}{statistics.fmean(timings) * 1000:>10.2f}")
+            print(f"hybrid/vector median: {medians['hybrid'] / medians['vector']:.2f}x")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
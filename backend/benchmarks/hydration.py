@@ -0,0 +1,89 @@
+"""
+Per-row cost of hydrating search results: the SearchRecord ORM path against the asyncpg
+payload fast path. Needs a populated search_records table; run from `backend/`:
+
+    python -m benchmarks.hydration --embed-version default --rows 100 --repeat 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from controllers.search_controller import (
+    SearchResponse,
+    create_record_payload,
+    fetch_record_payloads,
+    fetch_records_by_id,
+)
+from models.search_record import SearchRecord
+
+
+async def orm_path(session: AsyncSession, record_ids: List[int]) -> int:
+    records = await fetch_records_by_id(session, record_ids)
+    payload = [create_record_payload(record) for record in records if record.external_media_uri is not None]
+    SearchResponse(record_count=len(payload), records=payload, embed_version="").model_dump_json()
+    # Don't let the identity map serve the next repeat from memory
+    session.expunge_all()
+    return len(payload)
+
+
+async def asyncpg_path(session: AsyncSession, record_ids: List[int]) -> int:
+    payload = await fetch_record_payloads(session, record_ids)
+    SearchResponse(record_count=len(payload), records=payload, embed_version="").model_dump_json()
+    return len(payload)
+
+
+async def measure(
+    session: AsyncSession,
+    path: Callable[[AsyncSession, List[int]], Awaitable[int]],
+    record_ids: List[int],
+    repeat: int,
+) -> tuple[List[float], int]:
+    await path(session, record_ids)  # warm-up: prepared statements, type introspection
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = await path(session, record_ids)
+        timings.append(time.perf_counter() - started)
+    return timings, rows
+
+
+async def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Benchmark search result hydration paths")
+    parser.add_argument("--embed-version", default="default")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.database_url)
+    try:
+        async with AsyncSession(engine) as session:
+            result = await session.execute(
+                select(SearchRecord.id).where(SearchRecord.embed_version == args.embed_version).limit(args.rows)
+            )
+            record_ids = list(result.scalars().all())
+            if not record_ids:
+                raise SystemExit(f"No rows for embed_version {args.embed_version!r}")
+
+            print(f"Hydrating {len(record_ids)} ids x {args.repeat} repeats")
+            print(f"{'path':<10}{'rows':>6}{'median ms':>12}{'p95 ms':>10}{'us/row':>10}")
+            for name, path in (("orm", orm_path), ("asyncpg", asyncpg_path)):
+                timings, rows = await measure(session, path, record_ids, args.repeat)
+                median = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else median
+                per_row = 1e6 * median / rows if rows else float("nan")
+                print(f"{name:<10}{rows:>6}{1000 * median:>12.2f}{1000 * p95:>10.2f}{per_row:>10.1f}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+CPU latency and throughput of the query encoders: the torch open_clip model against the
+float32 and int8 ONNX towers written by `tools.onnx_export`. Run from `backend/`:
+
+    python -m benchmarks.inference_backends --batch-sizes 1 8 32 --repeat 20 --threads 4
+
+Backends whose towers have not been exported are skipped.
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List, Tuple
+
+import open_clip
+import torch
+
+from config.settings import Settings
+from services.onnx_encoder import OnnxCLIP, artifact_dir, tower_file
+
+
+def measure(encode: Callable[[torch.Tensor], torch.Tensor], inputs: torch.Tensor, repeat: int) -> List[float]:
+    encode(inputs)  # warm-up: allocator, graph optimisation, thread pool spin-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(inputs)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Benchmark torch and ONNX Runtime query encoders on CPU")
+    parser.add_argument("--onnx-model-dir", default=settings.onnx_model_dir)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for every backend; 0 keeps each default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model, _, _ = open_clip.create_model_and_transforms(settings.model_name, pretrained=settings.model_pretrained)
+    model = model.float().eval()
+    tokenizer = open_clip.get_tokenizer(settings.model_name)
+    directory = artifact_dir(args.onnx_model_dir, settings.model_name, settings.model_pretrained)
+
+    backends: List[Tuple[str, object]] = [("torch", model)]
+    for quantized in (False, True):
+        if (directory / tower_file("text", quantized)).exists():
+            backends.append(("onnx int8" if quantized else "onnx fp32", OnnxCLIP(directory, quantized, args.threads)))
+
+    height, width = model.visual.image_size
+    print(f"{settings.model_name}/{settings.model_pretrained} on CPU, {torch.get_num_threads()} torch threads, {args.repeat} repeats")
+    print(f"{'backend':<12}{'tower':<8}{'batch':>6}{'median ms':>12}{'p95 ms':>10}{'items/s':>10}")
+    for batch_size in args.batch_sizes:
+        inputs = {
+            "text": tokenizer(["pressed fern specimen on herbarium paper"] * batch_size),
+            "image": torch.randn(batch_size, 3, height, width),
+        }
+        for name, backend in backends:
+            for tower in ("text", "image"):
+                encode = backend.encode_text if tower == "text" else backend.encode_image
+                with torch.no_grad():
+                    timings = measure(encode, inputs[tower], args.repeat)
+                median = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else median
+                print(f"{name:<12}{tower:<8}{batch_size:>6}{1000 * median:>12.2f}{1000 * p95:>10.2f}{batch_size / median:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
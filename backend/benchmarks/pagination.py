@@ -0,0 +1,113 @@
+"""
+Deep cursor pagination against an exact ranking: pages through far more rows than the
+default hnsw.ef_search (40) with `next_page`, the way successive /api/search cursors do,
+and checks that every page is full, no row repeats and the pages match an exact scan of
+the same depth. Needs seeded rows and an HNSW index (e.g. `benchmarks.search_load seed`);
+run from `backend/`:
+
+    python -m benchmarks.pagination --embed-version bench-0 --limit 30 --pages 10
+    python -m benchmarks.pagination --embed-version bench-0 --tax-order Lepidoptera
+
+Exits non-zero when a page comes back short while the exact ranking still had rows.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.halfvec import sample_queries
+from config.settings import Settings
+from services.search_filters import SearchFilters
+from services.vector_search import RankedIds, nearest_query, next_page
+
+
+async def exact_ranking(
+    session: AsyncSession, query_vector: List[float], embed_version: str, depth: int, dim: int, filters: Optional[SearchFilters]
+) -> RankedIds:
+    await session.execute(text("SET LOCAL enable_indexscan = off"))
+    results = await session.execute(nearest_query(query_vector, embed_version, depth, dim, filters, "prefilter"))
+    ranked = [(row.id, row.distance) for row in results]
+    await session.rollback()
+    return ranked
+
+
+async def paginate(
+    session: AsyncSession,
+    query_vector: List[float],
+    embed_version: str,
+    limit: int,
+    pages: int,
+    dim: int,
+    filters: Optional[SearchFilters],
+    overfetch_factor: int,
+) -> List[RankedIds]:
+    # The first page as a cursor-less search would rank it, exactly; every later page goes through next_page
+    served = [(await exact_ranking(session, query_vector, embed_version, limit, dim, filters))]
+    while len(served) < pages and len(served[-1]) == limit:
+        last_id, last_distance = served[-1][-1]
+        page = await next_page(
+            session, query_vector, embed_version, limit, dim, last_distance, last_id, filters,
+            offset=sum(len(ranked) for ranked in served), overfetch_factor=overfetch_factor,
+        )
+        await session.rollback()
+        served.append(page)
+    return served
+
+
+async def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Check deep cursor pagination against an exact ranking")
+    parser.add_argument("--embed-version", default="default")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per query; limit * pages should exceed 2 * ef_search")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--tax-order", help="Page through a filtered search")
+    parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    filters = SearchFilters(tax_order=args.tax_order) if args.tax_order else None
+    depth = args.limit * args.pages
+    engine = create_async_engine(settings.database_url)
+    short_pages = duplicates = hits = expected_rows = 0
+    started = time.perf_counter()
+    try:
+        async with AsyncSession(engine) as session:
+            queries = await sample_queries(session, args.embed_version, args.queries, args.dim, np.random.default_rng(args.seed))
+            await session.rollback()
+            for query_vector in queries:
+                truth = await exact_ranking(session, query_vector, args.embed_version, depth, args.dim, filters)
+                served = await paginate(
+                    session, query_vector, args.embed_version, args.limit, args.pages, args.dim, filters,
+                    settings.filter_overfetch_factor,
+                )
+                ids = [record_id for ranked in served for record_id, _ in ranked]
+                # A page is short (or missing) when the exact ranking still had more rows at that depth
+                for number in range(args.pages):
+                    served_rows = len(served[number]) if number < len(served) else 0
+                    if served_rows < min(args.limit, max(0, len(truth) - number * args.limit)):
+                        short_pages += 1
+                duplicates += len(ids) - len(set(ids))
+                hits += len(set(ids).intersection(record_id for record_id, _ in truth))
+                expected_rows += len(truth)
+    finally:
+        await engine.dispose()
+
+    print(
+        f"embed_version={args.embed_version} limit={args.limit} pages={args.pages} queries={len(queries)} "
+        f"filters={'tax_order=' + args.tax_order if args.tax_order else 'none'}"
+    )
+    print(f"short pages {short_pages}, duplicate rows {duplicates}, "
+          f"recall@{depth} {hits / max(1, expected_rows):.4f}, {time.perf_counter() - started:.1f}s")
+    if short_pages:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,347 @@
+"""
+Reproducible load test for /api/search. A deterministic stub replaces the CLIP model,
+so only Postgres/pgvector is needed (e.g. the compose `postgres` service with migrations
+applied); no GPU or network. Run from `backend/`:
+
+    python -m benchmarks.search_load seed --rows 100000 --embed-versions 3
+    python -m benchmarks.search_load run --workload mixed --concurrency 16 --requests 2000
+    python -m benchmarks.search_load clean
+
+`seed` writes clustered, normalized synthetic embeddings (both the float32 and the
+halfvec column) to the embed_versions `bench-0` ... `bench-{n-1}` and builds an HNSW
+index for each over the column EMBEDDING_STORAGE selects. `run` drives the FastAPI
+app in-process with text, image or mixed queries spread over those versions. It reports
+latency percentiles and throughput, and splits the server-side time by search stage,
+using the histograms behind `/metrics`. The same `--seed` gives the same rows and the
+same request sequence.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import asyncpg
+import httpx
+import numpy as np
+import open_clip
+import torch
+from PIL import Image
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config.settings import Settings
+from services.model_registry import ModelRegistry, ModelSpec
+from services.vector_search import partition_name
+from tools.ann_indexes import build as build_ann_index
+
+BENCH_PREFIX = "bench-"
+STUB_IMAGE_SIZE = (224, 224)
+WORDS = [
+    "red", "blue", "spotted", "striped", "small", "large", "dried", "pressed", "pinned", "juvenile",
+    "frog", "beetle", "fern", "oak", "moth", "lizard", "orchid", "snail", "sparrow", "mushroom",
+    "leaf", "wing", "skull", "flower", "shell", "feather", "seed", "root", "egg", "antenna",
+]
+ORDERS = ["Coleoptera", "Lepidoptera", "Anura", "Squamata", "Fagales", "Polypodiales", "Asparagales", "Agaricales"]
+FAMILIES = ["Carabidae", "Noctuidae", "Ranidae", "Lacertidae", "Fagaceae", "Polypodiaceae", "Orchidaceae", "Agaricaceae"]
+STAGES = ("model_lookup", "upload_read", "decode", "query_cache", "encode", "rank", "rerank", "hydrate", "serialize")
+DB_STAGES = ("model_lookup", "rank", "hydrate")
+
+
+def bench_versions(count: int) -> List[str]:
+    return [f"{BENCH_PREFIX}{index}" for index in range(count)]
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    return database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+class StubCLIP:
+    """
+    Deterministic stand-in for an open_clip model: every input row maps to a fixed unit
+    vector derived from a hash of its bytes, after an optional simulated forward cost.
+    """
+
+    def __init__(self, dim: int, forward_ms: float = 0.0) -> None:
+        self.dim = dim
+        self.forward_ms = forward_ms
+
+    def vectors(self, inputs: torch.Tensor) -> torch.Tensor:
+        if self.forward_ms:
+            time.sleep(self.forward_ms / 1000)
+        rows = []
+        for row in inputs.cpu().numpy():
+            seed = int.from_bytes(hashlib.sha256(row.tobytes()).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            rows.append(vector / np.linalg.norm(vector))
+        return torch.from_numpy(np.stack(rows))
+
+    def encode_text(self, tokens: torch.Tensor) -> torch.Tensor:
+        return self.vectors(tokens)
+
+    def encode_image(self, pixels: torch.Tensor) -> torch.Tensor:
+        return self.vectors(pixels)
+
+
+class StubModelRegistry(ModelRegistry):
+    """A ModelRegistry whose models are StubCLIPs with the real image transform and tokenizer."""
+
+    forward_ms = 0.0
+
+    def load_weights(self, spec: ModelSpec) -> Tuple[Any, Dict[str, Any], Callable]:
+        preprocess = open_clip.image_transform(STUB_IMAGE_SIZE, is_train=False)
+        return StubCLIP(self.settings.embedding_dim, self.forward_ms), {"size": STUB_IMAGE_SIZE}, preprocess
+
+
+async def seed(settings: Settings, rows: int, versions: int, clusters: int, batch_size: int, rng_seed: int, index: bool) -> None:
+    rng = np.random.default_rng(rng_seed)
+    dim = settings.embedding_dim
+    # Clustered rather than uniform vectors, so ANN recall and latency look like real embeddings
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    columns = [
+        "media_uuid", "specimen_uuid", "collection_date", "scientific_name", "common_name", "location",
+        "tax_order", "tax_family", "external_media_uri", "embedding", "embedding_half", "model", "pretrained", "embed_version",
+    ]
+    query = (
+        f"INSERT INTO search_records ({', '.join(columns)}) "
+        f"VALUES ({', '.join(f'${i}' for i in range(1, len(columns) + 1))})"
+    )
+
+    conn = await asyncpg.connect(asyncpg_dsn(settings.database_url))
+    try:
+        started = time.perf_counter()
+        for embed_version in bench_versions(versions):
+            # A fresh partition without its ANN index, which is built once the rows are in
+            await conn.execute(f"DROP TABLE IF EXISTS {partition_name(embed_version)}")
+            await conn.execute("SELECT ensure_search_records_partition($1, $2, $3, false)", embed_version, dim, settings.embedding_storage)
+            for offset in range(0, rows, batch_size):
+                count = min(batch_size, rows - offset)
+                embeddings = centroids[rng.integers(clusters, size=count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+                embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+                values = []
+                for row, embedding in enumerate(embeddings):
+                    taxon = int(rng.integers(len(ORDERS)))
+                    values.append((
+                        uuid.UUID(bytes=rng.bytes(16), version=4),
+                        uuid.UUID(bytes=rng.bytes(16), version=4),
+                        date(1900, 1, 1) + timedelta(days=int(rng.integers(45_000))),
+                        f"{FAMILIES[taxon]} sp. {offset + row}",
+                        " ".join(rng.choice(WORDS, 2)),
+                        f"POINT({rng.uniform(-180, 180):.5f} {rng.uniform(-85, 85):.5f})",
+                        ORDERS[taxon],
+                        FAMILIES[taxon],
+                        f"https://example.org/bench/{embed_version}/{offset + row}.jpg",
+                        json.dumps(embedding.tolist()),
+                        json.dumps(embedding.tolist()),
+                        settings.model_name,
+                        settings.model_pretrained,
+                        embed_version,
+                    ))
+                async with conn.transaction():
+                    await conn.executemany(query, values)
+            print(f"Seeded {rows} rows into {embed_version} ({time.perf_counter() - started:.1f}s)")
+        await conn.execute(
+            "INSERT INTO embed_version_generations (embed_version, generation) SELECT unnest($1::varchar[]), 1 "
+            "ON CONFLICT (embed_version) DO UPDATE SET generation = embed_version_generations.generation + 1, updated_at = now()",
+            bench_versions(versions),
+        )
+        await conn.execute("ANALYZE search_records")
+    finally:
+        await conn.close()
+
+    if index:
+        engine = create_async_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+        try:
+            for embed_version in bench_versions(versions):
+                await build_ann_index(
+                    engine, embed_version, "hnsw", dim, 16, 64, None, None, concurrently=False, storage=settings.embedding_storage
+                )
+        finally:
+            await engine.dispose()
+
+
+async def clean(settings: Settings, versions: int) -> None:
+    conn = await asyncpg.connect(asyncpg_dsn(settings.database_url))
+    try:
+        # Dropping a partition drops its rows and indexes at once
+        for embed_version in bench_versions(versions):
+            await conn.execute(f"DROP TABLE IF EXISTS {partition_name(embed_version)}")
+        print(f"Removed benchmark partitions: {', '.join(partition_name(v) for v in bench_versions(versions))}")
+    finally:
+        await conn.close()
+
+
+def synthetic_images(rng: np.random.Generator, count: int) -> List[bytes]:
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        # Upscaled noise compresses like a photo rather than like pure noise
+        Image.fromarray(pixels).resize((640, 480), Image.BILINEAR).save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def stage_totals(metrics) -> Dict[str, Tuple[int, float]]:
+    totals = {}
+    for (stage,), (counts, total) in metrics.stages.series.items():
+        totals[stage] = (sum(counts), total[0])
+    for counts, total in metrics.pool_checkout.series.values():
+        totals["pool_checkout"] = (sum(counts), total[0])
+    return totals
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+async def run(
+    settings: Settings,
+    workload: str,
+    image_ratio: float,
+    concurrency: int,
+    requests: int,
+    warmup: int,
+    versions: int,
+    distinct_queries: int,
+    distinct_images: int,
+    limit: int,
+    forward_ms: float,
+    rng_seed: int,
+) -> None:
+    # Imported here: main builds its Settings at import time, and the stub must be in place before startup
+    import main as app_module
+
+    StubModelRegistry.forward_ms = forward_ms
+    app_module.ModelRegistry = StubModelRegistry
+    app = app_module.app
+
+    rng = np.random.default_rng(rng_seed)
+    queries = [" ".join(rng.choice(WORDS, int(rng.integers(1, 4)))) for _ in range(distinct_queries)]
+    images = synthetic_images(rng, distinct_images) if workload != "text" else []
+    embed_versions = bench_versions(versions)
+    ratio = {"text": 0.0, "image": 1.0, "mixed": image_ratio}[workload]
+    plan = []
+    for _ in range(warmup + requests):
+        is_image = bool(images) and rng.random() < ratio
+        item = int(rng.integers(len(images) if is_image else len(queries)))
+        plan.append((is_image, item, embed_versions[int(rng.integers(len(embed_versions)))]))
+
+    async with app_module.lifespan(app):
+        # SQL echo logging would dominate the measurements
+        app.state.db_engine.sync_engine.echo = False
+        metrics = app.state.metrics
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+
+            async def send(is_image: bool, item: int, embed_version: str) -> Tuple[float, int]:
+                params = {"limit": limit, "embed_version": embed_version}
+                started = time.perf_counter()
+                if is_image:
+                    response = await client.post(
+                        "/api/search", params=params, files={"image": ("query.jpg", images[item], "image/jpeg")}
+                    )
+                else:
+                    response = await client.post("/api/search", params=params, data={"search_param": queries[item]})
+                return time.perf_counter() - started, response.status_code
+
+            async def drive(items: List[Tuple[bool, int, str]], results: List[Tuple[float, int, bool]]) -> None:
+                position = 0
+
+                async def worker() -> None:
+                    nonlocal position
+                    while position < len(items):
+                        is_image, item, embed_version = items[position]
+                        position += 1
+                        latency, status = await send(is_image, item, embed_version)
+                        results.append((latency, status, is_image))
+
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+            await drive(plan[:warmup], [])
+            before = stage_totals(metrics)
+            coalesced_before = app.state.search_coalescer.counts["coalesced"]
+            results: List[Tuple[float, int, bool]] = []
+            started = time.perf_counter()
+            await drive(plan[warmup:], results)
+            elapsed = time.perf_counter() - started
+            after = stage_totals(metrics)
+            coalesced = app.state.search_coalescer.counts["coalesced"] - coalesced_before
+
+    ok = [latency for latency, status, _ in results if status == 200]
+    errors = len(results) - len(ok)
+    print(f"workload={workload} concurrency={concurrency} requests={len(results)} errors={errors} "
+          f"embed_versions={versions} stub_forward_ms={forward_ms}")
+    print(f"throughput {len(results) / elapsed:.1f} req/s over {elapsed:.1f}s")
+    print(f"coalesced {coalesced} searches into identical ones already in flight")
+    print(f"{'kind':<8}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, selected in (
+        ("all", ok),
+        ("text", [latency for latency, status, is_image in results if status == 200 and not is_image]),
+        ("image", [latency for latency, status, is_image in results if status == 200 and is_image]),
+    ):
+        if selected:
+            print(f"{kind:<8}{len(selected):>7}{1000 * percentile(selected, 50):>10.2f}{1000 * percentile(selected, 90):>10.2f}"
+                  f"{1000 * percentile(selected, 99):>10.2f}{1000 * max(selected):>10.2f}")
+
+    print(f"{'stage':<14}{'calls':>7}{'mean ms':>10}{'ms/request':>12}{'share':>8}")
+    spent = {stage: (after.get(stage, (0, 0.0))[0] - before.get(stage, (0, 0.0))[0],
+                     after.get(stage, (0, 0.0))[1] - before.get(stage, (0, 0.0))[1]) for stage in STAGES}
+    server_total = sum(total for _, total in spent.values()) or float("nan")
+    for stage, (calls, total) in spent.items():
+        if calls:
+            print(f"{stage:<14}{calls:>7}{1000 * total / calls:>10.2f}{1000 * total / len(results):>12.2f}{total / server_total:>8.1%}")
+    db_total = sum(spent[stage][1] for stage in DB_STAGES)
+    print(f"database stages ({', '.join(DB_STAGES)}): {db_total / server_total:.1%} of timed server work, "
+          f"{1000 * db_total / len(results):.2f} ms/request")
+    checkouts, checkout_total = (after.get("pool_checkout", (0, 0.0))[index] - before.get("pool_checkout", (0, 0.0))[index] for index in (0, 1))
+    if checkouts:
+        print(f"pool checkout wait {1000 * checkout_total / checkouts:.2f} ms mean over {checkouts} checkouts")
+    if ok:
+        print(f"mean end-to-end {1000 * statistics.mean(ok):.2f} ms")
+
+
+def main() -> None:
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Seed synthetic search data and load-test /api/search")
+    parser.add_argument("--embed-versions", type=int, default=3, help="Number of bench-N embed_versions")
+    parser.add_argument("--seed", type=int, default=7, help="RNG seed for rows and request sequences")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed", help="Write synthetic rows and build their HNSW indexes")
+    seed_parser.add_argument("--rows", type=int, default=100_000, help="Rows per embed_version")
+    seed_parser.add_argument("--clusters", type=int, default=256)
+    seed_parser.add_argument("--batch-size", type=int, default=5_000)
+    seed_parser.add_argument("--no-index", dest="index", action="store_false")
+
+    run_parser = subparsers.add_parser("run", help="Drive the app with concurrent searches")
+    run_parser.add_argument("--workload", choices=("text", "image", "mixed"), default="mixed")
+    run_parser.add_argument("--image-ratio", type=float, default=0.2, help="Share of image queries in the mixed workload")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--requests", type=int, default=2_000)
+    run_parser.add_argument("--warmup", type=int, default=100)
+    run_parser.add_argument("--distinct-queries", type=int, default=5_000, help="Fewer distinct queries means more cache hits")
+    run_parser.add_argument("--distinct-images", type=int, default=50)
+    run_parser.add_argument("--limit", type=int, default=30)
+    run_parser.add_argument("--forward-ms", type=float, default=0.0, help="Simulated model forward time per batch")
+
+    subparsers.add_parser("clean", help="Drop the benchmark rows and indexes")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed(settings, args.rows, args.embed_versions, args.clusters, args.batch_size, args.seed, args.index))
+    elif args.command == "run":
+        asyncio.run(run(
+            settings, args.workload, args.image_ratio, args.concurrency, args.requests, args.warmup, args.embed_versions,
+            args.distinct_queries, args.distinct_images, args.limit, args.forward_ms, args.seed,
+        ))
+    else:
+        asyncio.run(clean(settings, args.embed_versions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Per-worker memory and cold-start time of the gunicorn launch, with and without
+MODEL_PRELOAD. Starts `gunicorn -c gunicorn.conf.py main:app` once per mode, waits until
+every worker has finished its startup, and reads /proc/<pid>/smaps_rollup of the master
+and each worker (Linux only). Run from `backend/`:
+
+    python -m benchmarks.worker_memory --workers 4
+    python -m benchmarks.worker_memory --workers 8 --modes preload
+
+RSS counts shared pages once per process, so it barely moves with preloading; PSS splits
+each shared page between the processes mapping it and USS counts only private pages, so
+those show what a worker actually costs. The app's lifespan does not touch Postgres, so
+only the model weights (downloaded once into the open_clip cache) are needed.
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+STARTUP_COMPLETE = "Application startup complete."
+SMAPS_FIELDS = ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+
+
+def smaps_rollup(pid: int) -> Dict[str, int]:
+    """Memory of one process in bytes, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, _, rest = line.partition(":")
+        if name in SMAPS_FIELDS:
+            values[name] = int(rest.split()[0]) * 1024
+    values["Uss"] = values.pop("Private_Clean") + values.pop("Private_Dirty")
+    return values
+
+
+def children(pid: int) -> List[int]:
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+
+
+def launch(workers: int, port: int, preload: bool, timeout: float) -> Tuple[subprocess.Popen, Optional[float]]:
+    """Start gunicorn; returns it with the seconds until every worker was serving (None on timeout)."""
+    env = {**os.environ, "MODEL_PRELOAD": "true" if preload else "false"}
+    command = [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app",
+        "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    ready = threading.Event()
+    completed = []
+
+    def follow() -> None:
+        for line in process.stdout:
+            if STARTUP_COMPLETE in line:
+                completed.append(time.perf_counter())
+                if len(completed) == workers:
+                    ready.set()
+
+    threading.Thread(target=follow, daemon=True).start()
+    if not ready.wait(timeout):
+        return process, None
+    return process, completed[-1] - started
+
+
+def measure(workers: int, port: int, preload: bool, timeout: float, settle: float) -> Optional[Dict[str, float]]:
+    process, cold_start = launch(workers, port, preload, timeout)
+    try:
+        if cold_start is None:
+            print(f"{'preload' if preload else 'separate'}: workers not ready after {timeout:.0f}s")
+            return None
+        # Let import-time and first-request allocations settle before sampling
+        time.sleep(settle)
+        master = smaps_rollup(process.pid)
+        worker_memory = [smaps_rollup(pid) for pid in children(process.pid)]
+        return {
+            "cold_start": cold_start,
+            "master_rss": master["Rss"],
+            "worker_rss": statistics.fmean(memory["Rss"] for memory in worker_memory),
+            "worker_pss": statistics.fmean(memory["Pss"] for memory in worker_memory),
+            "worker_uss": statistics.fmean(memory["Uss"] for memory in worker_memory),
+            "total_pss": master["Pss"] + sum(memory["Pss"] for memory in worker_memory),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def mib(size: float) -> str:
+    return f"{size / 2 ** 20:.0f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure gunicorn worker memory with and without model preloading")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=("separate", "preload"), default=["separate", "preload"])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for every worker to start")
+    parser.add_argument("--settle", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers; memory in MiB")
+    print(f"{'mode':<10}{'cold start s':>14}{'master RSS':>12}{'worker RSS':>12}{'worker PSS':>12}{'worker USS':>12}{'total PSS':>11}")
+    for mode in args.modes:
+        result = measure(args.workers, args.port, mode == "preload", args.timeout, args.settle)
+        if result is None:
+            continue
+        print(
+            f"{mode:<10}{result['cold_start']:>14.1f}{mib(result['master_rss']):>12}{mib(result['worker_rss']):>12}"
+            f"{mib(result['worker_pss']):>12}{mib(result['worker_uss']):>12}{mib(result['total_pss']):>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
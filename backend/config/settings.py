@@ -1,6 +1,6 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Annotated
+from typing import Annotated, List, Literal, Optional
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(extra="allow", protected_namespaces=('settings_',))
 
@@ -31,3 +31,324 @@ class Settings(BaseSettings):
         ge=0,
         description="The maximum number of connections to allow in the connection pool 'overflow'"
     )]
+
+    encode_batch_max_size: Annotated[int, Field(
+        default=16,
+        ge=1,
+        description="The maximum number of queries encoded together in one forward pass"
+    )]
+
+    encode_batch_max_wait_ms: Annotated[float, Field(
+        default=5.0,
+        ge=0,
+        description="How long (in milliseconds) the oldest queued query may wait for a batch to fill up"
+    )]
+
+    inference_backend: Annotated[Literal["torch", "onnx"], Field(
+        default="torch",
+        description="Query encoder runtime: the PyTorch open_clip model, or ONNX Runtime on CPU using the towers exported by tools.onnx_export"
+    )]
+
+    onnx_model_dir: Annotated[str, Field(
+        default="/data/onnx_models",
+        description="Directory holding exported ONNX towers, one subdirectory per model_name/model_pretrained pair"
+    )]
+
+    onnx_quantized: Annotated[bool, Field(
+        default=False,
+        description="Use the dynamically int8-quantized ONNX towers instead of the float32 ones"
+    )]
+
+    onnx_intra_op_threads: Annotated[int, Field(
+        default=0,
+        ge=0,
+        description="ONNX Runtime intra-op threads per forward pass; 0 uses one per physical core"
+    )]
+
+    model_registry_max_resident: Annotated[int, Field(
+        default=2,
+        ge=1,
+        description="How many query encoders keep their weights loaded; the least recently used is evicted beyond this"
+    )]
+
+    model_registry_version_ttl_seconds: Annotated[float, Field(
+        default=300,
+        gt=0,
+        description="How long the model/pretrained pair read for an embed_version is reused before it is looked up again"
+    )]
+
+    inference_threads: Annotated[int, Field(
+        default=1,
+        ge=1,
+        description="Threads dedicated to model forward passes, kept separate from the event loop and decode workers"
+    )]
+
+    image_decode_workers: Annotated[int, Field(
+        default=4,
+        ge=1,
+        description="Threads used to decode and preprocess uploaded query images"
+    )]
+
+    image_max_upload_bytes: Annotated[int, Field(
+        default=20 * 1024 * 1024,
+        ge=1,
+        description="Largest accepted image upload, in bytes; larger uploads are rejected with a 413"
+    )]
+
+    image_max_pixels: Annotated[int, Field(
+        default=50_000_000,
+        ge=1,
+        description="Largest accepted image size in pixels, checked from the header before decoding"
+    )]
+
+    query_cache_size: Annotated[int, Field(
+        default=10_000,
+        ge=0,
+        description="The maximum number of text query vectors kept in the in-process cache (0 disables it)"
+    )]
+
+    query_cache_ttl_seconds: Annotated[float, Field(
+        default=3600,
+        gt=0,
+        description="How long (in seconds) a text query vector stays in the in-process cache"
+    )]
+
+    query_cache_redis_url: Annotated[Optional[str], Field(
+        default=None,
+        description="Redis URL for the shared query vector cache, e.g. redis://redis:6379/1. Unset disables the shared tier"
+    )]
+
+    query_cache_redis_ttl_seconds: Annotated[int, Field(
+        default=86_400,
+        ge=1,
+        description="How long (in seconds) a text query vector stays in the shared Redis cache"
+    )]
+
+    result_cache_size: Annotated[int, Field(
+        default=1000,
+        ge=0,
+        description="The maximum number of ranked search results kept in the result cache (0 disables it)"
+    )]
+
+    result_cache_ttl_seconds: Annotated[float, Field(
+        default=600,
+        gt=0,
+        description="How long (in seconds) a ranked search result stays in the result cache"
+    )]
+
+    result_cache_generation_ttl_seconds: Annotated[float, Field(
+        default=5,
+        ge=0,
+        description="How long (in seconds) an embed_version generation is trusted before it is re-read from the database"
+    )]
+
+    embedding_dim: Annotated[int, Field(
+        default=512,
+        ge=1,
+        description="Dimension of the stored embeddings; the search query and ANN indexes cast `embedding` to vector(embedding_dim)"
+    )]
+
+    embedding_storage: Annotated[Literal["vector", "halfvec"], Field(
+        default="vector",
+        description="Which embedding column search reads: float32 `embedding`, or the half-precision `embedding_half` (V7; backfill with `python -m tools.halfvec backfill` first)"
+    )]
+
+    search_engine: Annotated[Literal["pgvector", "local"], Field(
+        default="pgvector",
+        description="Where nearest-neighbour queries run: 'pgvector' in Postgres, or 'local' over memory-mapped snapshots (falls back to pgvector for versions without a snapshot)"
+    )]
+
+    local_engine_snapshot_dir: Annotated[str, Field(
+        default="/data/vector_snapshots",
+        description="Directory holding the snapshots written by `python -m tools.vector_snapshot export`"
+    )]
+
+    local_engine_refresh_seconds: Annotated[float, Field(
+        default=30,
+        ge=0,
+        description="How often (in seconds) the local engine checks for a newer snapshot of a version"
+    )]
+
+    local_engine_compression: Annotated[Literal["none", "int8", "pq"], Field(
+        default="none",
+        description="Search the local engine over quantized codes built by `python -m tools.vector_snapshot export --compress` (or `compress`) instead of the float32 vectors"
+    )]
+
+    local_engine_rerank_factor: Annotated[int, Field(
+        default=4,
+        ge=0,
+        description="With compression, re-rank the best limit * factor candidates against the exact vectors (0 disables re-ranking)"
+    )]
+
+    filter_prefilter_max_rows: Annotated[int, Field(
+        default=20_000,
+        ge=0,
+        description="Filtered searches whose filters match at most this many rows rank those rows exactly; broader filters over-fetch from the ANN index and filter afterwards"
+    )]
+
+    filter_overfetch_factor: Annotated[int, Field(
+        default=10,
+        ge=1,
+        description="How many times `limit` nearest rows a post-filtered search fetches before applying its filters"
+    )]
+
+    search_hydration: Annotated[Literal["asyncpg", "orm"], Field(
+        default="asyncpg",
+        description="How ranked search results are loaded: projected payload columns via asyncpg, or full SearchRecord ORM entities"
+    )]
+
+    batch_search_max_queries: Annotated[int, Field(
+        default=256,
+        ge=1,
+        description="The maximum number of text and image queries accepted by one /api/search/batch request"
+    )]
+
+    batch_search_max_images: Annotated[int, Field(
+        default=16,
+        ge=1,
+        description="The maximum number of images accepted by one /api/search/batch request; more are rejected with a 413"
+    )]
+
+    hybrid_candidates: Annotated[int, Field(
+        default=100,
+        ge=1,
+        le=1000,
+        description="How many lexical and how many vector candidates a mode=hybrid search fuses"
+    )]
+
+    hybrid_rrf_k: Annotated[int, Field(
+        default=60,
+        ge=0,
+        description="Reciprocal rank fusion constant k: a candidate at rank r scores 1 / (k + r); larger values flatten the head of each list"
+    )]
+
+    rerank_pool_size: Annotated[int, Field(
+        default=150,
+        ge=1,
+        le=1000,
+        description="How many ranked candidates a rerank=true search over-fetches for specimen collapsing and MMR"
+    )]
+
+    rerank_lambda: Annotated[float, Field(
+        default=0.7,
+        ge=0.0,
+        le=1.0,
+        description="MMR trade-off between relevance (1.0) and diversity (0.0) for rerank=true searches"
+    )]
+
+    rerank_budget_ms: Annotated[float, Field(
+        default=20.0,
+        ge=0.0,
+        description="Time allowed for the MMR loop; past it the page is completed in relevance order"
+    )]
+
+    thumbnail_cache_dir: Annotated[str, Field(
+        default="/data/thumbnails",
+        description="Directory of the on-disk thumbnail cache behind /api/media/{media_uuid}/thumb"
+    )]
+
+    thumbnail_cache_max_bytes: Annotated[int, Field(
+        default=1024 * 1024 * 1024,
+        ge=0,
+        description="Size bound of the thumbnail cache; least recently used thumbnails are deleted beyond it"
+    )]
+
+    thumbnail_widths: Annotated[List[int], Field(
+        default=[160, 320, 640],
+        min_length=1,
+        description="Thumbnail widths rendered for each original; requested widths are rounded up to one of these"
+    )]
+
+    thumbnail_quality: Annotated[int, Field(
+        default=80,
+        ge=1,
+        le=100,
+        description="WebP/JPEG encoder quality for thumbnails"
+    )]
+
+    thumbnail_workers: Annotated[int, Field(
+        default=4,
+        ge=1,
+        description="Threads decoding originals and encoding thumbnails"
+    )]
+
+    thumbnail_max_source_bytes: Annotated[int, Field(
+        default=50 * 1024 * 1024,
+        ge=1,
+        description="Originals larger than this are not downloaded"
+    )]
+
+    thumbnail_fetch_timeout_seconds: Annotated[float, Field(
+        default=10.0,
+        gt=0,
+        description="Timeout for fetching an original from its media host"
+    )]
+
+    thumbnail_max_age_seconds: Annotated[int, Field(
+        default=7 * 24 * 3600,
+        ge=0,
+        description="Cache-Control max-age sent with thumbnails"
+    )]
+
+    classify_label_dir: Annotated[str, Field(
+        default="/data/label_embeddings",
+        description="Directory holding the label-embedding matrices used by /api/classify, one subdirectory per model_name/model_pretrained pair"
+    )]
+
+    classify_ranks: Annotated[List[Literal["scientific_name", "tax_genus", "tax_family"]], Field(
+        default=["scientific_name"],
+        min_length=1,
+        description="Taxonomic ranks whose distinct values get a label matrix and can be predicted by /api/classify"
+    )]
+
+    classify_prompt_template: Annotated[str, Field(
+        default="a photo of {}.",
+        description="Text encoded for each label, with {} replaced by the name; changing it rebuilds every matrix"
+    )]
+
+    classify_refresh_seconds: Annotated[float, Field(
+        default=60,
+        gt=0,
+        description="How often /api/classify checks for newly ingested names to append to the label matrices"
+    )]
+
+    model_preload: Annotated[bool, Field(
+        default=False,
+        description="Load the default model's weights once in the gunicorn master (gunicorn.conf.py) so forked workers share them copy-on-write; torch on CPU only"
+    )]
+
+    admission_text_concurrency: Annotated[int, Field(
+        default=32,
+        ge=1,
+        description="Text queries encoded at once; more wait in the admission queue (cached text queries skip it)"
+    )]
+
+    admission_image_concurrency: Annotated[int, Field(
+        default=8,
+        ge=1,
+        description="Image queries decoded and encoded at once; more wait in the admission queue"
+    )]
+
+    admission_db_concurrency: Annotated[int, Field(
+        default=0,
+        ge=0,
+        description="Requests holding a database session at once; 0 uses pool_size + max_overflow, so requests queue here with a deadline instead of in the connection pool"
+    )]
+
+    admission_queue_size: Annotated[int, Field(
+        default=64,
+        ge=0,
+        description="Requests allowed to wait for each of the text, image and database stages; beyond it requests are rejected at once with a 503"
+    )]
+
+    admission_timeout_seconds: Annotated[float, Field(
+        default=5.0,
+        gt=0,
+        description="Total time a request may spend waiting for admission across all stages before it is rejected with a 503"
+    )]
+
+    admission_retry_after_seconds: Annotated[float, Field(
+        default=1.0,
+        gt=0,
+        description="Retry-After sent with 503 responses from admission control"
+    )]
@@ -0,0 +1,75 @@
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from pydantic import BaseModel
+
+from config.settings import Settings
+from controllers.search_controller import resolve_spec
+from services.image_decoding import read_upload
+from services.label_embeddings import LabelRank, ZeroShotClassifier
+from services.model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class LabelPrediction(BaseModel):
+    label: str
+    score: float
+    probability: float
+
+class ClassifyResponse(BaseModel):
+    filename: Optional[str] = None
+    rank: str
+    embed_version: str
+    model: str
+    pretrained: str
+    predictions: List[LabelPrediction]
+
+@router.post("/classify", response_model=ClassifyResponse)
+async def classify(
+    request: Request,
+    image: UploadFile = File(...),
+    k: int = Query(5, ge=1, le=100),
+    rank: LabelRank = Query("scientific_name", description="Taxonomic rank to predict; must be one of CLASSIFY_RANKS"),
+    embed_version: str = Query("default", max_length=512, description="Selects the model whose embedding space is used"),
+) -> ClassifyResponse:
+    """Zero-shot classification of an image against the names in search_records."""
+    try:
+        settings: Settings = request.app.state.settings
+        models: ModelRegistry = request.app.state.models
+        classifier: ZeroShotClassifier = request.app.state.classifier
+        if rank not in classifier.ranks:
+            raise HTTPException(status_code=400, detail=f"Classification by {rank} is not enabled.")
+
+        spec = await resolve_spec(request, embed_version)
+        contents = await read_upload(image, settings.image_max_upload_bytes)
+        # Admitted before the model is borrowed (or loaded), and without holding a database slot
+        async with request.app.state.admission.admit(request, "image"), models.acquire(spec) as loaded:
+            pixels = await request.app.state.image_decoder.decode(contents, loaded.preprocess, loaded.image_size)
+            vector = await loaded.encoder.encode_image(pixels)
+
+        predictions = await classifier.classify(spec, rank, vector, k)
+        if predictions is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Label embeddings for this model are still being built.",
+                headers={"Retry-After": str(max(1, int(settings.classify_refresh_seconds)))},
+            )
+        return ClassifyResponse(
+            filename=image.filename,
+            rank=rank,
+            embed_version=embed_version,
+            model=spec.name,
+            pretrained=spec.pretrained,
+            predictions=[
+                LabelPrediction(label=label, score=score, probability=probability)
+                for label, score, probability in predictions
+            ],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during classification: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during classification.")
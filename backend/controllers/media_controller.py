@@ -0,0 +1,60 @@
+import logging
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from models.search_record import SearchRecord
+from services.thumbnails import MEDIA_TYPES, ThumbnailError, Thumbnailer
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/media/{media_uuid}/thumb")
+async def thumbnail(
+    request: Request,
+    media_uuid: UUID,
+    width: int = Query(320, ge=1, le=4096, description="Requested width in pixels; rounded up to a configured thumbnail width"),
+) -> Response:
+    """A resized copy of a record's media, WebP when the client accepts it and JPEG otherwise."""
+    try:
+        settings: Settings = request.app.state.settings
+        thumbnailer: Thumbnailer = request.app.state.thumbnailer
+
+        source_url = thumbnailer.sources.get(str(media_uuid))
+        if source_url is None:
+            async with AsyncSession(request.app.state.db_engine) as session:
+                result = await session.execute(
+                    select(SearchRecord.external_media_uri).where(
+                        SearchRecord.media_uuid == media_uuid, SearchRecord.external_media_uri.is_not(None)
+                    ).limit(1)
+                )
+                source_url = result.scalar_one_or_none()
+            if source_url is None:
+                raise HTTPException(status_code=404, detail="Media not found.")
+            thumbnailer.sources.set(str(media_uuid), source_url)
+
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        width = thumbnailer.width_for(width)
+        etag = f'"{thumbnailer.digest(source_url, width, fmt)}"'
+        headers = {
+            "Cache-Control": f"public, max-age={settings.thumbnail_max_age_seconds}, immutable",
+            "ETag": etag,
+            "Vary": "Accept",
+        }
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        try:
+            data = await thumbnailer.thumbnail(source_url, width, fmt)
+        except ThumbnailError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        return Response(content=data, media_type=MEDIA_TYPES[fmt], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving thumbnail for {media_uuid}: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while serving the thumbnail.")
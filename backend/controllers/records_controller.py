@@ -0,0 +1,63 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from controllers.search_controller import SearchResponse, fetch_record_payloads, get_session
+from models.search_record import SearchRecord
+from services.model_registry import ModelRegistry
+from services.result_cache import SearchResultCache
+from services.vector_search import similar
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/records/{record_id}/similar", response_model=SearchResponse)
+async def similar_records(
+    request: Request,
+    record_id: int,
+    limit: int = Query(12, ge=1, le=100),
+    embed_version: Optional[str] = Query(None, max_length=512, description="The record's embed_version; looked up when omitted"),
+    ef_search: Optional[int] = Query(None, ge=1, le=1000, description="HNSW candidate list size; higher trades latency for recall"),
+    probes: Optional[int] = Query(None, ge=1, le=10000, description="IVFFlat lists probed; higher trades latency for recall"),
+    session: AsyncSession = Depends(get_session)
+) -> SearchResponse:
+    """Records nearest to a stored record's embedding, ranked in SQL without running the model."""
+    try:
+        settings: Settings = request.app.state.settings
+        result_cache: SearchResultCache = request.app.state.result_cache
+
+        if embed_version is None:
+            result = await session.execute(select(SearchRecord.embed_version).where(SearchRecord.id == record_id))
+            embed_version = result.scalar_one_or_none()
+            if embed_version is None:
+                raise HTTPException(status_code=404, detail="Record not found.")
+
+        cache_key = (f"record:{record_id}", embed_version, limit, (ef_search, probes))
+        generation = await result_cache.generation(session, embed_version)
+        ranked = result_cache.get(cache_key, generation)
+        if ranked is None:
+            models: ModelRegistry = request.app.state.models
+            dim = models.embedding_dim(await models.spec_for(session, embed_version))
+            ranked = await similar(
+                session, record_id, embed_version, limit, dim, ef_search, probes, settings.embedding_storage
+            )
+            if not ranked:
+                exists = await session.execute(
+                    select(SearchRecord.id).where(SearchRecord.id == record_id, SearchRecord.embed_version == embed_version)
+                )
+                if exists.first() is None:
+                    raise HTTPException(status_code=404, detail="Record not found in this embed_version.")
+            result_cache.set(cache_key, generation, ranked)
+
+        payload = await fetch_record_payloads(session, [similar_id for similar_id, _ in ranked], embed_version)
+        return SearchResponse(record_count=len(payload), records=payload, embed_version=embed_version)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding records similar to {record_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while finding similar records.")
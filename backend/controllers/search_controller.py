@@ -1,18 +1,30 @@
+import hashlib
 import logging
-from typing import Optional, List, AsyncGenerator
-from fastapi import APIRouter, File, Form, UploadFile, Depends, HTTPException, Request, Query
+from contextlib import asynccontextmanager
+from typing import Any, Literal, Optional, List, AsyncGenerator, AsyncIterator, Mapping
+from fastapi import APIRouter, File, Form, UploadFile, Depends, HTTPException, Request, Response, Query
 from sqlmodel import select
-import torch
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy import func, cast
-from pgvector.sqlalchemy import Vector
-from PIL import Image
-import io
+import asyncio
+import numpy as np
+import torch
 from datetime import date
 from uuid import UUID
 from pydantic import BaseModel, Field
+from config.settings import Settings
 from models.search_record import SearchRecord
+from services.admission import AdmissionControl
+from services.coalescing import SingleFlight
+from services.embedding_cache import QueryEmbeddingCache
+from services.image_decoding import read_upload
+from services.metrics import SearchMetrics
+from services.model_registry import ModelRegistry, ModelSpec
+from services.pagination import SearchCursor
+from services.reranking import DiversityReranker
+from services.result_cache import SearchResultCache, vector_digest
+from services.search_filters import SearchFilters, search_filters
+from services.vector_search import FilterPlanner, RankedIds, batch_nearest, next_page
 
 logger = logging.getLogger(__name__)
 
@@ -44,12 +56,30 @@ class SearchResponse(BaseModel):
     record_count: int
     records: List[RecordPayload]
     embed_version: str
+    next_cursor: Optional[str] = None
 
-async def get_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+class BatchSearchResponse(BaseModel):
+    query_count: int
+    results: List[SearchResponse]
+
+@asynccontextmanager
+async def request_session(request: Request) -> AsyncIterator[AsyncSession]:
     engine: AsyncEngine = request.app.state.db_engine
-    async with AsyncSession(engine) as session:
+    # Queued here, with a deadline, rather than in the connection pool
+    async with request.app.state.admission.admit(request, "database"):
+        # The connection is checked out by the first query (timed by SearchMetrics), not up front
+        async with AsyncSession(engine) as session:
+            yield session
+
+async def get_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with request_session(request) as session:
         yield session
 
+async def resolve_spec(request: Request, embed_version: str) -> ModelSpec:
+    """The model of `embed_version`, holding a database slot only for the lookup (none once it is cached)."""
+    async with request_session(request) as session:
+        return await request.app.state.models.spec_for(session, embed_version)
+
 @router.post("/search", response_model=SearchResponse)
 async def search(
     request: Request,
@@ -57,60 +87,370 @@ async def search(
     image: Optional[UploadFile] = File(None),
     limit: int = Query(30, ge=1, le=100),
     embed_version: str = Query("default", max_length=512),
-    session: AsyncSession = Depends(get_session)
+    ef_search: Optional[int] = Query(None, ge=1, le=1000, description="HNSW candidate list size; higher trades latency for recall"),
+    probes: Optional[int] = Query(None, ge=1, le=10000, description="IVFFlat lists probed; higher trades latency for recall"),
+    cursor: Optional[str] = Query(None, max_length=4096, description="next_cursor of a previous response; fetches the following page"),
+    mode: Literal["vector", "hybrid"] = Query("vector", description="hybrid also matches text queries against taxon names and fuses both rankings"),
+    rerank: bool = Query(False, description="Collapse results by specimen and diversify them with MMR over an over-fetched candidate pool"),
+    rerank_pool: Optional[int] = Query(None, ge=1, le=1000, description="Candidates re-ranked when rerank is set; defaults to RERANK_POOL_SIZE"),
+    rerank_lambda: Optional[float] = Query(None, ge=0.0, le=1.0, description="MMR relevance weight (1.0 = no diversification); defaults to RERANK_LAMBDA"),
+    filters: SearchFilters = Depends(search_filters),
 ) -> SearchResponse:
     try:
-        if search_param is None and image is None:
+        settings: Settings = request.app.state.settings
+        query_cache: QueryEmbeddingCache = request.app.state.query_cache
+        metrics: SearchMetrics = request.app.state.metrics
+        coalescer: SingleFlight[str] = request.app.state.search_coalescer
+
+        if cursor is None and search_param is None and image is None:
             raise HTTPException(status_code=400, detail="At least one of search_param or image must be provided.")
+        contents = None
+        if image is not None and cursor is None:
+            with metrics.stage("upload_read"):
+                contents = await read_upload(image, settings.image_max_upload_bytes)
+
+        # Everything that can change the response body; identical requests in flight share one computation
+        key = (
+            search_param, hashlib.sha256(contents).hexdigest() if contents is not None else None,
+            image.filename if image else None, embed_version, limit, filters.cache_key(),
+            ef_search, probes, cursor, mode, rerank, rerank_pool, rerank_lambda,
+        )
 
-        search_vector = await process_input(request, search_param, image)
+        async def compute() -> str:
+            # A cursor carries its own version and filters
+            nonlocal embed_version, filters
+            lexical_text = None
+            offset = 0
+            if cursor is not None:
+                try:
+                    page = SearchCursor.decode(cursor)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="The cursor is malformed.")
+                with metrics.stage("query_cache"):
+                    search_vector = await query_cache.get_vector(page.vector_id)
+                if search_vector is None:
+                    raise HTTPException(status_code=410, detail="The cursor has expired; run the search again.")
+                vector_id = page.vector_id
+                embed_version = page.embed_version
+                filters = page.filters
+                offset = page.offset
+            else:
+                with metrics.stage("model_lookup"):
+                    spec = await resolve_spec(request, embed_version)
+                # Encoded before a database slot is taken, so requests queued for inference hold none
+                search_vector = await process_input(request, spec, search_param, image, contents)
+                vector_id = vector_digest(search_vector)
+                # Only text queries have names to match; an uploaded image takes precedence over text
+                if mode == "hybrid" and image is None:
+                    lexical_text = search_param
 
-        query = select(SearchRecord).where(
-            SearchRecord.embed_version == embed_version
-        ).order_by(
-            func.l2_distance(
-                SearchRecord.embedding,
-                cast(search_vector, Vector)
-            )
-        ).limit(limit)
+            # Opened here rather than as a dependency, so coalesced requests never hold a connection
+            async with request_session(request) as session:
+                if cursor is not None:
+                    with metrics.stage("rank"):
+                        ranked = await next_page(
+                            session, search_vector.tolist(), embed_version, limit, len(search_vector),
+                            page.last_distance, page.last_id, filters, ef_search, probes, settings.embedding_storage,
+                            offset, settings.filter_overfetch_factor,
+                        )
+                else:
+                    pool_size = max(rerank_pool or settings.rerank_pool_size, limit) if rerank else limit
+                    with metrics.stage("rank"):
+                        ranked = await rank(
+                            request, session, search_vector, embed_version, pool_size, filters, ef_search, probes, lexical_text
+                        )
+                    if rerank:
+                        reranker: DiversityReranker = request.app.state.reranker
+                        with metrics.stage("rerank"):
+                            ranked = await reranker.rerank(
+                                session, ranked, limit,
+                                settings.rerank_lambda if rerank_lambda is None else rerank_lambda, len(search_vector),
+                                embed_version,
+                            )
 
-        results = await session.execute(query)
-        records = results.scalars().all()
+                next_cursor = None
+                # Fused scores are not distances, and re-ranked pages are not in distance order, so
+                # neither can be continued by keyset
+                if len(ranked) == limit and lexical_text is None and not rerank:
+                    last_id, last_distance = ranked[-1]
+                    await query_cache.put_vector(vector_id, search_vector)
+                    next_cursor = SearchCursor(
+                        vector_id=vector_id,
+                        embed_version=embed_version,
+                        filters=filters,
+                        last_distance=last_distance,
+                        last_id=last_id,
+                        offset=offset + len(ranked),
+                    ).encode()
 
-        payload = [create_record_payload(record) for record in records if record.external_media_uri is not None]
+                record_ids = [record_id for record_id, _ in ranked]
+                with metrics.stage("hydrate"):
+                    if settings.search_hydration == "orm":
+                        records = await fetch_records_by_id(session, record_ids, embed_version)
+                        payload = [create_record_payload(record) for record in records if record.external_media_uri is not None]
+                    else:
+                        payload = await fetch_record_payloads(session, record_ids, embed_version)
 
-        return SearchResponse(
-            search_param=search_param,
-            filename=image.filename if image else None,
-            record_count=len(payload),
-            records=payload,
-            embed_version=embed_version
-        )
+            # Serialized here rather than by FastAPI so the stage can be timed; the model is already validated
+            with metrics.stage("serialize"):
+                return SearchResponse(
+                    search_param=search_param,
+                    filename=image.filename if image else None,
+                    record_count=len(payload),
+                    records=payload,
+                    embed_version=embed_version,
+                    next_cursor=next_cursor,
+                ).model_dump_json()
+
+        body = await coalescer.run(key, compute)
+        return Response(content=body, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error during search: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred during the search process.")
 
-async def process_input(request: Request, search_param: Optional[str], image: Optional[UploadFile]) -> List[float]:
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search(
+    request: Request,
+    search_params: List[str] = Form([]),
+    images: List[UploadFile] = File([]),
+    limit: int = Query(30, ge=1, le=100),
+    embed_version: str = Query("default", max_length=512),
+    ef_search: Optional[int] = Query(None, ge=1, le=1000, description="HNSW candidate list size; higher trades latency for recall"),
+    probes: Optional[int] = Query(None, ge=1, le=10000, description="IVFFlat lists probed; higher trades latency for recall"),
+    filters: SearchFilters = Depends(search_filters),
+) -> BatchSearchResponse:
+    """Run many text and/or image searches with one batched encode and one nearest-neighbour round-trip."""
+    try:
+        settings: Settings = request.app.state.settings
+        if not search_params and not images:
+            raise HTTPException(status_code=400, detail="At least one search_params entry or image must be provided.")
+        if len(search_params) + len(images) > settings.batch_search_max_queries:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch search accepts at most {settings.batch_search_max_queries} queries.",
+            )
+        if len(images) > settings.batch_search_max_images:
+            raise HTTPException(
+                status_code=413,
+                detail=f"A batch search accepts at most {settings.batch_search_max_images} images.",
+            )
+
+        models: ModelRegistry = request.app.state.models
+        spec = await resolve_spec(request, embed_version)
+        # Encoded before a database slot is taken, as in search
+        search_vectors = await process_inputs(request, spec, search_params, images)
+        async with request_session(request) as session:
+            ranked = await batch_nearest(
+                session, search_vectors, embed_version, limit, models.embedding_dim(spec), filters, ef_search, probes,
+                settings.filter_overfetch_factor, settings.embedding_storage,
+            )
+            record_ids = list({record_id: None for results in ranked for record_id, _ in results})
+            payloads = {payload.id: payload for payload in await fetch_record_payloads(session, record_ids, embed_version)}
+
+        labels = [(search_param, None) for search_param in search_params] + [(None, image.filename) for image in images]
+        results = []
+        for (search_param, filename), query_ranked in zip(labels, ranked):
+            payload = [payloads[record_id] for record_id, _ in query_ranked if record_id in payloads]
+            results.append(SearchResponse(
+                search_param=search_param,
+                filename=filename,
+                record_count=len(payload),
+                records=payload,
+                embed_version=embed_version,
+            ))
+        return BatchSearchResponse(query_count=len(results), results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during batch search: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during the batch search process.")
+
+async def rank(
+    request: Request,
+    session: AsyncSession,
+    search_vector: List[float],
+    embed_version: str,
+    limit: int,
+    filters: SearchFilters,
+    ef_search: Optional[int],
+    probes: Optional[int],
+    lexical_text: Optional[str] = None,
+) -> RankedIds:
+    settings: Settings = request.app.state.settings
+    result_cache: SearchResultCache = request.app.state.result_cache
+    # The query vector has the width of its model's embeddings, which need not be EMBEDDING_DIM
+    dim = len(search_vector)
+    cache_key = result_cache.key(search_vector, embed_version, limit, (ef_search, probes, filters.cache_key(), lexical_text))
+    generation = await result_cache.generation(session, embed_version)
+    ranked = result_cache.get(cache_key, generation)
+    if ranked is not None:
+        return ranked
+
+    planner: FilterPlanner = request.app.state.filter_planner
+    if lexical_text is not None:
+        ranked = await planner.hybrid(
+            session, lexical_text, search_vector, embed_version, limit, dim,
+            settings.hybrid_candidates, settings.hybrid_rrf_k, filters, ef_search, probes,
+        )
+    # The local engine has no access to the filter columns, so filtered searches always go to Postgres
+    elif settings.search_engine == "local" and filters.is_empty:
+        ranked = await request.app.state.local_engine.search(embed_version, search_vector, limit)
+    if ranked is None:
+        ranked = await planner.nearest(
+            session, search_vector, embed_version, limit, dim, filters, ef_search, probes
+        )
+    result_cache.set(cache_key, generation, ranked)
+    return ranked
+
+async def process_input(
+    request: Request,
+    spec: ModelSpec,
+    search_param: Optional[str],
+    image: Optional[UploadFile],
+    contents: Optional[bytes] = None,
+) -> List[float]:
+    """
+    The query vector of a text or image query. The model is only borrowed (and loaded, if it
+    is not resident) once the request is admitted to its inference stage.
+    """
     try:
         app = request.app
+        metrics: SearchMetrics = app.state.metrics
+        admission: AdmissionControl = app.state.admission
+        models: ModelRegistry = app.state.models
         if image:
-            contents = await image.read()
-            img = Image.open(io.BytesIO(contents))
-            img_preprocessed = app.state.preprocess(img).unsqueeze(0).to(app.state.device)
-            with torch.no_grad(), torch.autocast(device_type='cuda', dtype=torch.float16):
-                image_features = app.state.model.encode_image(img_preprocessed)
-                return image_features.cpu().numpy()[0].tolist()
+            if contents is None:
+                with metrics.stage("upload_read"):
+                    contents = await read_upload(image, app.state.settings.image_max_upload_bytes)
+            async with admission.admit(request, "image"), models.acquire(spec) as loaded:
+                with metrics.stage("decode"):
+                    img_preprocessed = await app.state.image_decoder.decode(contents, loaded.preprocess, loaded.image_size)
+                with metrics.stage("encode"):
+                    image_features = await loaded.encoder.encode_image(img_preprocessed)
+            return image_features.tolist()
         else:
-            with torch.no_grad(), torch.autocast(device_type='cuda', dtype=torch.float16):
-                text = app.state.tokenizer([search_param]).to(app.state.device)
-                text_features = app.state.model.encode_text(text)
-                return text_features.cpu().numpy()[0].tolist()
+            with metrics.stage("query_cache"):
+                text_features = await app.state.query_cache.get(search_param, spec)
+            if text_features is None:
+                async with admission.admit(request, "text"), models.acquire(spec) as loaded:
+                    with metrics.stage("encode"):
+                        text = loaded.tokenizer([search_param])[0]
+                        text_features = await loaded.encoder.encode_text(text)
+                await app.state.query_cache.set(search_param, text_features, spec)
+            return text_features.tolist()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing input: {str(e)}")
         raise HTTPException(status_code=500, detail="An error occurred while processing the input.")
 
+async def process_inputs(
+    request: Request, spec: ModelSpec, search_params: List[str], images: List[UploadFile]
+) -> List[List[float]]:
+    """Vectors for every text query, then every image, encoding all cache misses of a modality in one pass."""
+    try:
+        app = request.app
+        admission: AdmissionControl = app.state.admission
+        models: ModelRegistry = app.state.models
+        text_vectors: List[Optional[np.ndarray]] = [
+            await app.state.query_cache.get(search_param, spec) for search_param in search_params
+        ]
+        misses = [index for index, vector in enumerate(text_vectors) if vector is None]
+        if misses:
+            async with admission.admit(request, "text"), models.acquire(spec) as loaded:
+                tokens = loaded.tokenizer([search_params[index] for index in misses])
+                features = await loaded.encoder.encode_text_batch(tokens)
+            for index, vector in zip(misses, features):
+                text_vectors[index] = vector
+                await app.state.query_cache.set(search_params[index], vector, spec)
+
+        image_vectors: List[np.ndarray] = []
+        max_bytes = app.state.settings.image_max_upload_bytes
+        # One decode pool's worth of images at a time, each chunk under its own image slot, so a
+        # batch buffers and decodes no more at once than a burst of single-image searches would
+        chunk_size = app.state.settings.image_decode_workers
+        for offset in range(0, len(images), chunk_size):
+            contents = [await read_upload(image, max_bytes) for image in images[offset:offset + chunk_size]]
+            async with admission.admit(request, "image"), models.acquire(spec) as loaded:
+                pixels = await asyncio.gather(*(
+                    app.state.image_decoder.decode(content, loaded.preprocess, loaded.image_size) for content in contents
+                ))
+                image_vectors.extend(await loaded.encoder.encode_image_batch(torch.stack(pixels)))
+
+        return [vector.tolist() for vector in text_vectors + image_vectors]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing batch input: {str(e)}")
+        raise HTTPException(status_code=500, detail="An error occurred while processing the input.")
+
+async def fetch_records_by_id(session: AsyncSession, record_ids: List[int], embed_version: Optional[str] = None) -> List[SearchRecord]:
+    if not record_ids:
+        return []
+    query = select(SearchRecord).where(SearchRecord.id.in_(record_ids))
+    if embed_version is not None:
+        # Lets Postgres prune to one partition instead of probing every version's id index
+        query = query.where(SearchRecord.embed_version == embed_version)
+    results = await session.execute(query)
+    records_by_id = {record.id: record for record in results.scalars().all()}
+    return [records_by_id[record_id] for record_id in record_ids if record_id in records_by_id]
+
+# Only the columns RecordPayload needs; notably not the 512-float embedding
+RECORD_PAYLOAD_SQL = """
+SELECT id, scientific_name, common_name, media_uuid, external_media_uri, specimen_uuid,
+       recorded_by, collection_date, model, pretrained, embed_version,
+       ST_Y(location::geometry) AS latitude, ST_X(location::geometry) AS longitude
+FROM search_records
+WHERE id = ANY($1::int[]) AND external_media_uri IS NOT NULL
+"""
+# The same, pruned to one embed_version's partition
+RECORD_PAYLOAD_IN_VERSION_SQL = RECORD_PAYLOAD_SQL + "AND embed_version = $2\n"
+
+async def fetch_record_payloads(
+    session: AsyncSession, record_ids: List[int], embed_version: Optional[str] = None
+) -> List[RecordPayload]:
+    """
+    Hydrate ranked record ids straight from asyncpg records, in the session's transaction.
+
+    Skips ORM entity hydration, shapely (latitude/longitude come from ST_Y/ST_X) and
+    per-row pydantic validation, since every value comes from typed database columns.
+    """
+    if not record_ids:
+        return []
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    if embed_version is None:
+        rows = await raw_connection.driver_connection.fetch(RECORD_PAYLOAD_SQL, record_ids)
+    else:
+        rows = await raw_connection.driver_connection.fetch(RECORD_PAYLOAD_IN_VERSION_SQL, record_ids, embed_version)
+    rows_by_id = {row["id"]: row for row in rows}
+    return [
+        create_record_payload_from_row(rows_by_id[record_id])
+        for record_id in record_ids if record_id in rows_by_id
+    ]
+
+def create_record_payload_from_row(row: Mapping[str, Any]) -> RecordPayload:
+    display_name = row["common_name"] or row["scientific_name"] or ""
+    return RecordPayload.model_construct(
+        id=row["id"],
+        scientific_name=row["scientific_name"],
+        common_name=row["common_name"],
+        name=display_name,
+        description=display_name,
+        external_id=row["media_uuid"],
+        media_url=row["external_media_uri"],
+        specimen_id=row["specimen_uuid"],
+        recorded_by=row["recorded_by"],
+        collection_date=row["collection_date"],
+        latitude=row["latitude"],
+        longitude=row["longitude"],
+        model=row["model"],
+        pretrained=row["pretrained"],
+        embed_version=row["embed_version"],
+    )
+
 def create_record_payload(record: SearchRecord) -> RecordPayload:
     return RecordPayload(
         id=record.id,
@@ -0,0 +1,21 @@
+from typing import Any, Dict
+from fastapi import APIRouter, Request
+
+router = APIRouter()
+
+@router.get("/stats")
+async def stats(request: Request) -> Dict[str, Any]:
+    state = request.app.state
+    return {
+        "models": state.models.stats(),
+        "image_decoder": state.image_decoder.stats(),
+        "query_cache": state.query_cache.stats(),
+        "result_cache": state.result_cache.stats(),
+        "local_engine": state.local_engine.stats(),
+        "filter_planner": state.filter_planner.stats(),
+        "reranker": state.reranker.stats(),
+        "search_coalescer": state.search_coalescer.stats(),
+        "admission": state.admission.stats(),
+        "thumbnails": state.thumbnailer.stats(),
+        "classifier": state.classifier.stats(),
+    }
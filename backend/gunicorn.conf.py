@@ -0,0 +1,23 @@
+"""
+Gunicorn configuration for the backend image (see Dockerfile):
+
+    gunicorn -c gunicorn.conf.py main:app --workers 4
+
+With MODEL_PRELOAD=true the master loads the default model's weights before forking, and
+the workers share those pages copy-on-write instead of each loading a copy; worker RSS
+then counts the shared weights, so compare PSS (`python -m benchmarks.worker_memory`).
+"""
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = "0.0.0.0:8080"
+
+
+def on_starting(server) -> None:
+    # Imported here, once gunicorn has put the working directory on sys.path; a plain start
+    # then does not pull torch into the master either
+    from config.settings import Settings
+
+    settings = Settings()
+    if settings.model_preload:
+        from services.model_registry import preload_weights
+
+        preload_weights(settings)
@@ -1,16 +1,34 @@
 # main.py
 import logging
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 import torch
-import open_clip
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy.pool import AsyncAdaptedQueuePool
+from redis.asyncio import Redis
 from config.settings import Settings
 
 from controllers.search_controller import router as search_router
+from controllers.stats_controller import router as stats_router
+from controllers.records_controller import router as records_router
+from controllers.metrics_controller import router as metrics_router
+from controllers.media_controller import router as media_router
+from controllers.classify_controller import router as classify_router
+from services.admission import AdmissionControl
+from services.coalescing import SingleFlight
+from services.image_decoding import ImageDecoder
+from services.metrics import Counter, Gauge, SearchMetrics
+from services.embedding_cache import QueryEmbeddingCache
+from services.result_cache import SearchResultCache
+from services.local_engine import LocalVectorEngine
+from services.model_registry import ModelRegistry
+from services.reranking import DiversityReranker
+from services.thumbnails import Thumbnailer
+from services.label_embeddings import ZeroShotClassifier
+from services.vector_search import FilterPlanner
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,15 +54,93 @@ async def lifespan(app: FastAPI):
         device = torch.device("mps:0" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"Using device: {device}")
         
-        model, _, preprocess = open_clip.create_model_and_transforms(settings.model_name, pretrained=settings.model_pretrained, device=device)
-        model = model.to(device)
-        tokenizer = open_clip.get_tokenizer(settings.model_name)
-        
-        app.state.model = model
-        app.state.preprocess = preprocess
+        if settings.inference_backend == "onnx":
+            device = torch.device("cpu")
+            logger.info(f"Using ONNX Runtime encoders (int8: {settings.onnx_quantized})")
+
+        app.state.settings = settings
         app.state.device = device
-        app.state.tokenizer = tokenizer
+        app.state.models = ModelRegistry(
+            settings,
+            device,
+            max_resident=settings.model_registry_max_resident,
+            version_ttl_seconds=settings.model_registry_version_ttl_seconds,
+        )
+        # Load the default model up front so the first search does not pay for it
+        await app.state.models.get(app.state.models.default)
+        app.state.image_decoder = ImageDecoder(
+            max_workers=settings.image_decode_workers,
+            max_pixels=settings.image_max_pixels,
+        )
+        app.state.query_cache = QueryEmbeddingCache(
+            settings.model_name,
+            settings.model_pretrained,
+            max_size=settings.query_cache_size,
+            ttl_seconds=settings.query_cache_ttl_seconds,
+            redis=Redis.from_url(settings.query_cache_redis_url) if settings.query_cache_redis_url else None,
+            redis_ttl_seconds=settings.query_cache_redis_ttl_seconds,
+        )
+        app.state.result_cache = SearchResultCache(
+            max_size=settings.result_cache_size,
+            ttl_seconds=settings.result_cache_ttl_seconds,
+            generation_ttl_seconds=settings.result_cache_generation_ttl_seconds,
+        )
+        app.state.local_engine = LocalVectorEngine(
+            settings.local_engine_snapshot_dir,
+            refresh_seconds=settings.local_engine_refresh_seconds,
+            compression=None if settings.local_engine_compression == "none" else settings.local_engine_compression,
+            rerank_factor=settings.local_engine_rerank_factor,
+        )
+        app.state.filter_planner = FilterPlanner(
+            prefilter_max_rows=settings.filter_prefilter_max_rows,
+            overfetch_factor=settings.filter_overfetch_factor,
+            storage=settings.embedding_storage,
+        )
+        app.state.reranker = DiversityReranker(budget_ms=settings.rerank_budget_ms, storage=settings.embedding_storage)
+        app.state.search_coalescer = SingleFlight()
+        app.state.admission = AdmissionControl(
+            text_limit=settings.admission_text_concurrency,
+            image_limit=settings.admission_image_concurrency,
+            database_limit=settings.admission_db_concurrency or settings.pool_size + settings.max_overflow,
+            max_waiting=settings.admission_queue_size,
+            timeout_seconds=settings.admission_timeout_seconds,
+            retry_after_seconds=settings.admission_retry_after_seconds,
+        )
+        app.state.thumbnailer = Thumbnailer(
+            settings.thumbnail_cache_dir,
+            settings.thumbnail_cache_max_bytes,
+            widths=settings.thumbnail_widths,
+            quality=settings.thumbnail_quality,
+            max_workers=settings.thumbnail_workers,
+            max_source_bytes=settings.thumbnail_max_source_bytes,
+            max_pixels=settings.image_max_pixels,
+            fetch_timeout_seconds=settings.thumbnail_fetch_timeout_seconds,
+        )
         app.state.db_engine = get_db_engine()
+        app.state.metrics = SearchMetrics(app.state.db_engine)
+        app.state.metrics.gauges.append(Counter(
+            "nfhm_search_coalesced_total",
+            "Searches answered by an identical search already in flight instead of running their own.",
+            lambda: app.state.search_coalescer.counts["coalesced"],
+        ))
+        app.state.metrics.gauges.extend([
+            Gauge("nfhm_admission_waiting", "Requests queued for admission to a stage.", app.state.admission.waiting, ("gate",)),
+            Gauge("nfhm_admission_active", "Requests admitted to a stage and still running it.", app.state.admission.active, ("gate",)),
+            Counter(
+                "nfhm_admission_rejected_total",
+                "Requests rejected with a 503 because a stage's queue was full or their deadline passed.",
+                app.state.admission.rejected,
+                ("gate", "reason"),
+            ),
+        ])
+        app.state.classifier = ZeroShotClassifier(
+            app.state.db_engine,
+            app.state.models,
+            settings.classify_label_dir,
+            ranks=settings.classify_ranks,
+            template=settings.classify_prompt_template,
+            refresh_seconds=settings.classify_refresh_seconds,
+        )
         
         logger.info("Application startup complete.")
         yield
@@ -54,9 +150,17 @@ async def lifespan(app: FastAPI):
     finally:
         logger.info("Shutting down application...")
         # Clean up resources
-        del app.state.model
-        del app.state.preprocess
-        del app.state.tokenizer
+        await app.state.classifier.close()
+        del app.state.classifier
+        await app.state.models.close()
+        del app.state.models
+        app.state.image_decoder.shutdown()
+        del app.state.image_decoder
+        await app.state.query_cache.close()
+        del app.state.query_cache
+        await app.state.thumbnailer.close()
+        del app.state.thumbnailer
+        app.state.metrics.close()
         await app.state.db_engine.dispose()
         torch.cuda.empty_cache()
         logger.info("Application shutdown complete.")
@@ -64,6 +168,26 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(search_router, prefix="/api")
+app.include_router(stats_router, prefix="/api")
+app.include_router(records_router, prefix="/api")
+app.include_router(media_router, prefix="/api")
+app.include_router(classify_router, prefix="/api")
+app.include_router(metrics_router)
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by endpoint name, not raw path, to keep the number of series bounded
+        route = request.scope.get("route")
+        request.app.state.metrics.requests.observe(
+            time.perf_counter() - started, request.method, route.name if route else "unmatched", str(status)
+        )
 
 @app.get("/")
 async def healthcheck():
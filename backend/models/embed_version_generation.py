@@ -0,0 +1,12 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+class EmbedVersionGeneration(SQLModel, table=True):
+    __tablename__ = "embed_version_generations"
+    __table_args__ = {"extend_existing": True}
+
+    embed_version: str = Field(primary_key=True, max_length=512)
+    generation: int = Field(default=0)
+    updated_at: Optional[datetime] = Field(default=None)
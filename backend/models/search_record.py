@@ -5,11 +5,12 @@ from uuid import UUID
 from geoalchemy2 import Geography
 from geoalchemy2.shape import to_shape
 from pydantic import computed_field
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 from sqlmodel import Field, SQLModel
 from sqlalchemy import Column
 
 class SearchRecord(SQLModel, table=True):
+    # LIST-partitioned by embed_version since V8, with (id, embed_version) as the primary key
     __tablename__ = "search_records"
     __table_args__ = {"extend_existing": True}
     model_config = {
@@ -40,6 +41,8 @@ class SearchRecord(SQLModel, table=True):
     earliest_age_or_lowest_stage: Optional[str] = Field(default=None, max_length=512)
     external_media_uri: Optional[str] = Field(default=None, max_length=2083)
     embedding: Optional[list[float]] = Field(default=None, sa_column=Column(Vector(512)))
+    # Half-precision copy of `embedding` (V7); searched instead of it when EMBEDDING_STORAGE=halfvec
+    embedding_half: Optional[list[float]] = Field(default=None, sa_column=Column(HALFVEC(512)))
     model: str = Field(default=None, max_length=255)
     pretrained: str = Field(default=None, max_length=255)
     embed_version: str = Field(default=None, max_length=512)
@@ -0,0 +1,129 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+REJECTION_REASONS = ("queue_full", "deadline")
+
+
+class AdmissionGate:
+    """
+    Bounds how many requests run one stage at a time, with a bounded FIFO queue in front.
+
+    A request that finds the queue full, or that is still queued when its deadline passes,
+    is rejected with a 503 instead of piling onto the stage, so a spike sheds the excess
+    quickly and the admitted requests still finish in time.
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = dict.fromkeys(REJECTION_REASONS, 0)
+        self.total_wait = 0.0
+
+    def reject(self, reason: str, retry_after: float) -> HTTPException:
+        self.rejected[reason] += 1
+        return HTTPException(
+            status_code=503,
+            detail=f"The server is overloaded ({self.name}); retry shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    @asynccontextmanager
+    async def admit(self, deadline: float, retry_after: float) -> AsyncIterator[None]:
+        """Hold one slot for the block; `deadline` is in event-loop time."""
+        loop = asyncio.get_running_loop()
+        if self.semaphore.locked() or self.waiting:
+            if self.waiting >= self.max_waiting:
+                raise self.reject("queue_full", retry_after)
+            if deadline <= loop.time():
+                raise self.reject("deadline", retry_after)
+            queued_at = loop.time()
+            self.waiting += 1
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await self.semaphore.acquire()
+            except TimeoutError:
+                raise self.reject("deadline", retry_after)
+            finally:
+                self.waiting -= 1
+            self.total_wait += loop.time() - queued_at
+        else:
+            await self.semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "mean_queue_wait_ms": 1000 * self.total_wait / self.admitted if self.admitted else 0.0,
+        }
+
+
+class AdmissionControl:
+    """
+    Admission gates for the expensive stages of a request: text encoding, image decoding and
+    encoding (separately, since an image costs far more than a text query), and database work.
+
+    Every request gets one deadline, fixed the first time it queues at any gate, and waits at
+    all gates count against it.
+    """
+
+    def __init__(
+        self,
+        text_limit: int,
+        image_limit: int,
+        database_limit: int,
+        max_waiting: int,
+        timeout_seconds: float,
+        retry_after_seconds: float,
+    ) -> None:
+        self.gates = {
+            "text": AdmissionGate("text", text_limit, max_waiting),
+            "image": AdmissionGate("image", image_limit, max_waiting),
+            "database": AdmissionGate("database", database_limit, max_waiting),
+        }
+        self.timeout_seconds = timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+    def deadline(self, request: Request) -> float:
+        deadline = getattr(request.state, "admission_deadline", None)
+        if deadline is None:
+            deadline = request.state.admission_deadline = asyncio.get_running_loop().time() + self.timeout_seconds
+        return deadline
+
+    def admit(self, request: Request, gate: str):
+        """Context manager holding a slot of `gate` for `request`, or raising a 503."""
+        return self.gates[gate].admit(self.deadline(request), self.retry_after_seconds)
+
+    def waiting(self) -> Dict[Tuple[str, ...], int]:
+        return {(name,): gate.waiting for name, gate in self.gates.items()}
+
+    def active(self) -> Dict[Tuple[str, ...], int]:
+        return {(name,): gate.active for name, gate in self.gates.items()}
+
+    def rejected(self) -> Dict[Tuple[str, ...], int]:
+        return {(name, reason): count for name, gate in self.gates.items() for reason, count in gate.rejected.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "timeout_seconds": self.timeout_seconds,
+            **{name: gate.stats() for name, gate in self.gates.items()},
+        }
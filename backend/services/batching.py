@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingEncode:
+    tensor: torch.Tensor
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class BatchStats:
+    """Running batch-size and queue-wait statistics for one encoder lane."""
+
+    def __init__(self, max_batch_size: int) -> None:
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = [0] * (max_batch_size + 1)
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_forward = 0.0
+
+    def record(self, waits: List[float], forward_seconds: float) -> None:
+        self.batches += 1
+        self.items += len(waits)
+        # Explicit batches (batch search) can exceed the scheduler's max size; count them in the last bucket
+        self.batch_size_counts[min(len(waits), len(self.batch_size_counts) - 1)] += 1
+        self.total_wait += sum(waits)
+        self.max_wait = max(self.max_wait, *waits)
+        self.total_forward += forward_seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {
+                str(size): count for size, count in enumerate(self.batch_size_counts) if count
+            },
+            "mean_queue_wait_ms": 1000 * self.total_wait / self.items if self.items else 0.0,
+            "max_queue_wait_ms": 1000 * self.max_wait,
+            "mean_forward_ms": 1000 * self.total_forward / self.batches if self.batches else 0.0,
+        }
+
+
+class EncoderLane:
+    """Collects single-item encode requests and runs them through `encode_fn` as one batch."""
+
+    def __init__(
+        self,
+        name: str,
+        encode_fn: Callable[[torch.Tensor], torch.Tensor],
+        device: torch.device,
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.name = name
+        self.encode_fn = encode_fn
+        self.device = device
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue[PendingEncode] = asyncio.Queue()
+        self.stats = BatchStats(max_batch_size)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run(), name=f"encoder-lane-{self.name}")
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        while not self.queue.empty():
+            pending = self.queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Encoder is shutting down"))
+
+    async def submit(self, tensor: torch.Tensor) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(PendingEncode(tensor, future, time.perf_counter()))
+        return await future
+
+    async def submit_batch(self, inputs: torch.Tensor) -> np.ndarray:
+        """Encode an already-batched tensor in one forward pass, bypassing the queue."""
+        started = time.perf_counter()
+        features = await asyncio.get_running_loop().run_in_executor(self.executor, self.forward, inputs)
+        self.stats.record([0.0] * inputs.shape[0], time.perf_counter() - started)
+        return features
+
+    async def run(self) -> None:
+        while True:
+            batch = await self.collect()
+            try:
+                await self.flush(batch)
+            except Exception as e:
+                logger.error(f"Error encoding {self.name} batch of {len(batch)}: {str(e)}")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+    async def collect(self) -> List[PendingEncode]:
+        first = await self.queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Past the deadline (e.g. while the previous batch ran): take what is already queued.
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def flush(self, batch: List[PendingEncode]) -> None:
+        batch = [pending for pending in batch if not pending.future.cancelled()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        inputs = torch.stack([pending.tensor for pending in batch])
+        features = await asyncio.get_running_loop().run_in_executor(self.executor, self.forward, inputs)
+        self.stats.record([started - pending.enqueued_at for pending in batch], time.perf_counter() - started)
+
+        for pending, row in zip(batch, features):
+            if not pending.future.done():
+                pending.future.set_result(row)
+
+    def forward(self, inputs: torch.Tensor) -> np.ndarray:
+        # Half-precision autocast only pays off on CUDA; elsewhere run the model as loaded
+        autocast = torch.autocast(device_type='cuda', dtype=torch.float16) if self.device.type == 'cuda' else nullcontext()
+        with torch.no_grad(), autocast:
+            return self.encode_fn(inputs.to(self.device)).float().cpu().numpy()
+
+
+class BatchingEncoder:
+    """
+    Dynamic micro-batching scheduler in front of the CLIP model.
+
+    Concurrent requests are queued per modality and encoded together once either
+    `max_batch_size` requests are waiting or the oldest one has waited `max_wait_ms`.
+    Forward passes run off the event loop, on `executor` when given (shared between
+    encoders) or else on a dedicated pool of `inference_threads` threads.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        device: torch.device,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        inference_threads: int = 1,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=inference_threads, thread_name_prefix="encoder")
+        self.text = EncoderLane("text", model.encode_text, device, max_batch_size, max_wait_ms, self.executor)
+        self.image = EncoderLane("image", model.encode_image, device, max_batch_size, max_wait_ms, self.executor)
+
+    def start(self) -> None:
+        self.text.start()
+        self.image.start()
+
+    async def stop(self) -> None:
+        await self.text.stop()
+        await self.image.stop()
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        """Encode a single tokenized query (shape `[context_length]`)."""
+        return await self.text.submit(tokens)
+
+    async def encode_image(self, pixels: torch.Tensor) -> np.ndarray:
+        """Encode a single preprocessed image (shape `[3, H, W]`)."""
+        return await self.image.submit(pixels)
+
+    async def encode_text_batch(self, tokens: torch.Tensor) -> np.ndarray:
+        """Encode many tokenized queries (shape `[n, context_length]`) in one forward pass."""
+        return await self.text.submit_batch(tokens)
+
+    async def encode_image_batch(self, pixels: torch.Tensor) -> np.ndarray:
+        """Encode many preprocessed images (shape `[n, 3, H, W]`) in one forward pass."""
+        return await self.image.submit_batch(pixels)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "text": self.text.stats.snapshot(),
+            "image": self.image.stats.snapshot(),
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs the
+    computation and every caller that arrives while it is in flight awaits its result,
+    or its exception, instead of running its own.
+
+    If the leader is cancelled (its client went away), a waiting caller takes over and
+    runs the computation itself. Nothing is kept once the computation finishes; caching
+    finished results is the result cache's job.
+    """
+
+    def __init__(self) -> None:
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.counts: Dict[str, int] = {"leaders": 0, "coalesced": 0, "takeovers": 0}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        abandoned = False
+        while (future := self.inflight.get(key)) is not None:
+            try:
+                # Shielded so one waiter being cancelled does not cancel the shared future
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                abandoned = True
+                continue
+            self.counts["coalesced"] += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        # Marks a failure as retrieved even when no other caller was waiting for it
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.inflight[key] = future
+        self.counts["takeovers" if abandoned else "leaders"] += 1
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+        future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "inflight": len(self.inflight)}
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from services.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache of text query vectors.
+
+    The first tier is an in-process LRU; the optional second tier is Redis, shared by every
+    backend replica. Keys depend only on (model_name, model_pretrained, normalized text);
+    the pair defaults to the one the cache was created with and can be given per call.
+    """
+
+    key_prefix = "nfhm:query_embedding"
+    vector_key_prefix = "nfhm:query_vector"
+
+    def __init__(
+        self,
+        model_name: str,
+        model_pretrained: str,
+        max_size: int = 10_000,
+        ttl_seconds: Optional[float] = 3600,
+        redis: Optional[Redis] = None,
+        redis_ttl_seconds: Optional[int] = 86_400,
+    ) -> None:
+        self.model_name = model_name
+        self.model_pretrained = model_pretrained
+        self.local: TTLCache[np.ndarray] = TTLCache(max_size, ttl_seconds)
+        # Query vectors of any modality by digest, so continuation cursors can resume a search
+        self.vectors: TTLCache[np.ndarray] = TTLCache(max_size, ttl_seconds)
+        self.redis = redis
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    def key(self, text: str, model: Optional[Tuple[str, str]] = None) -> str:
+        model_name, model_pretrained = model or (self.model_name, self.model_pretrained)
+        raw = "\x1f".join((model_name, model_pretrained, normalize_query_text(text)))
+        return f"{self.key_prefix}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    async def get(self, text: str, model: Optional[Tuple[str, str]] = None) -> Optional[np.ndarray]:
+        key = self.key(text, model)
+        vector = self.local.get(key)
+        if vector is not None:
+            self.local_hits += 1
+            return vector
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Query embedding cache lookup in Redis failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                self.redis_hits += 1
+                vector = np.frombuffer(raw, dtype="<f4")
+                self.local.set(key, vector)
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, text: str, vector: np.ndarray, model: Optional[Tuple[str, str]] = None) -> None:
+        key = self.key(text, model)
+        vector = np.ascontiguousarray(vector, dtype="<f4")
+        self.local.set(key, vector)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, vector.tobytes(), ex=self.redis_ttl_seconds)
+            except RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Query embedding cache write to Redis failed: {str(e)}")
+
+    async def put_vector(self, vector_id: str, vector: np.ndarray) -> None:
+        vector = np.ascontiguousarray(vector, dtype="<f4")
+        self.vectors.set(vector_id, vector)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.vector_key_prefix}:{vector_id}", vector.tobytes(), ex=self.redis_ttl_seconds)
+            except RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Query vector write to Redis failed: {str(e)}")
+
+    async def get_vector(self, vector_id: str) -> Optional[np.ndarray]:
+        vector = self.vectors.get(vector_id)
+        if vector is None and self.redis is not None:
+            try:
+                raw = await self.redis.get(f"{self.vector_key_prefix}:{vector_id}")
+            except RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Query vector lookup in Redis failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                vector = np.frombuffer(raw, dtype="<f4")
+                self.vectors.set(vector_id, vector)
+        return vector
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "redis_errors": self.redis_errors,
+            "local_size": len(self.local),
+            "redis_enabled": self.redis is not None,
+        }
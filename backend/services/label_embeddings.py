@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import distinct, func
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.embed_version_generation import EmbedVersionGeneration
+from models.search_record import SearchRecord
+from services.model_registry import ModelRegistry, ModelSpec
+
+logger = logging.getLogger(__name__)
+
+LabelRank = Literal["scientific_name", "tax_genus", "tax_family"]
+LABEL_COLUMNS = {
+    "scientific_name": SearchRecord.scientific_name,
+    "tax_genus": SearchRecord.tax_genus,
+    "tax_family": SearchRecord.tax_family,
+}
+# CLIP's learned temperature is clamped at 100; label probabilities use it as is
+LOGIT_SCALE = 100.0
+# Labels per forward pass while (re)building; small, so queued searches get the encoder between chunks
+ENCODE_CHUNK = 64
+
+
+def label_dir(root: str, spec: ModelSpec) -> Path:
+    return Path(root) / f"{spec.name}--{spec.pretrained}"
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_atomic(path: Path, write: Callable[[Any], None]) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    with os.fdopen(fd, "wb") as handle:
+        write(handle)
+    os.replace(temp_path, path)
+
+
+class LabelMatrix:
+    """
+    L2-normalized text embeddings of every distinct value of one taxonomic rank, for one model.
+
+    Stored as `<rank>.npy` (one float32 row per label) and `<rank>.json` (the labels, the
+    prompt template and the names token they were built at). Rows are only ever appended
+    and the JSON is replaced last, so a reader racing a save still sees a consistent prefix.
+    """
+
+    def __init__(self, rank: str, labels: List[str], embeddings: np.ndarray, template: str, token: int) -> None:
+        self.rank = rank
+        self.labels = labels
+        self.embeddings = embeddings
+        self.template = template
+        self.token = token
+
+    @classmethod
+    def load(cls, directory: Path, rank: str) -> Optional["LabelMatrix"]:
+        try:
+            manifest = json.loads((directory / f"{rank}.json").read_text())
+            embeddings = np.load(directory / f"{rank}.npy", mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        labels = manifest["labels"]
+        if embeddings.ndim != 2 or embeddings.shape[0] < len(labels):
+            logger.warning(f"Label matrix {directory / rank} has {embeddings.shape[0]} rows for {len(labels)} labels")
+            return None
+        return cls(rank, labels, embeddings[:len(labels)], manifest["template"], manifest["token"])
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(directory / f"{self.rank}.npy", lambda handle: np.save(handle, np.asarray(self.embeddings, dtype=np.float32)))
+        manifest = {"labels": self.labels, "template": self.template, "token": self.token}
+        write_atomic(directory / f"{self.rank}.json", lambda handle: handle.write(json.dumps(manifest).encode("utf-8")))
+
+    def classify(self, vector: np.ndarray, k: int) -> List[Tuple[str, float, float]]:
+        """The `k` best labels for an image vector as (label, cosine similarity, probability)."""
+        if not self.labels:
+            return []
+        query = normalize_rows(np.asarray(vector, dtype=np.float32))
+        scores = self.embeddings @ query
+        logits = LOGIT_SCALE * (scores - scores.max())
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum()
+        k = min(k, scores.shape[0])
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.labels[index], float(scores[index]), float(probabilities[index])) for index in order]
+
+
+async def names_token(session: AsyncSession) -> int:
+    """Changes whenever any embed_version is (re)ingested, which is when new names can appear."""
+    result = await session.execute(select(func.coalesce(func.sum(EmbedVersionGeneration.generation), 0)))
+    return int(result.scalar_one())
+
+
+async def distinct_labels(session: AsyncSession, rank: str) -> List[str]:
+    column = LABEL_COLUMNS[rank]
+    result = await session.execute(select(distinct(column)).where(column.is_not(None), column != ""))
+    return sorted(result.scalars().all())
+
+
+class ZeroShotClassifier:
+    """
+    Classifies image vectors against per-model label matrices: one matmul and a top-k.
+
+    Matrices are loaded from `root` on first use. At most every `refresh_seconds` the
+    names token is compared with the one a model's matrices were built at; when it moved,
+    a background task encodes only the names not yet in each matrix and appends them.
+    Until a model's first build finishes, `matrix` returns None.
+    """
+
+    def __init__(
+        self,
+        db_engine: AsyncEngine,
+        models: ModelRegistry,
+        root: str,
+        ranks: Sequence[str] = ("scientific_name",),
+        template: str = "a photo of {}.",
+        refresh_seconds: float = 60,
+    ) -> None:
+        self.db_engine = db_engine
+        self.models = models
+        self.root = root
+        self.ranks = tuple(ranks)
+        self.template = template
+        self.refresh_seconds = refresh_seconds
+        self.matrices: Dict[Tuple[ModelSpec, str], LabelMatrix] = {}
+        self.checked_at: Dict[ModelSpec, float] = {}
+        self.refreshing: Dict[ModelSpec, asyncio.Task] = {}
+        self.counts: Dict[str, int] = {"classifications": 0, "refreshes": 0, "labels_encoded": 0}
+
+    async def current(self, spec: ModelSpec, rank: str) -> Optional[LabelMatrix]:
+        matrix = self.matrices.get((spec, rank))
+        if matrix is None:
+            matrix = await asyncio.get_running_loop().run_in_executor(None, LabelMatrix.load, label_dir(self.root, spec), rank)
+            # Built with another prompt template: unusable, and rebuilt from scratch on refresh
+            if matrix is None or matrix.template != self.template:
+                return None
+            self.matrices[(spec, rank)] = matrix
+        return matrix
+
+    async def matrix(self, spec: ModelSpec, rank: str) -> Optional[LabelMatrix]:
+        matrix = await self.current(spec, rank)
+        now = time.monotonic()
+        if now - self.checked_at.get(spec, float("-inf")) >= self.refresh_seconds:
+            self.checked_at[spec] = now
+            self.schedule_refresh(spec)
+        return matrix
+
+    def schedule_refresh(self, spec: ModelSpec) -> None:
+        if spec in self.refreshing:
+            return
+        task = self.refreshing[spec] = asyncio.create_task(self.refresh(spec))
+
+        def done(task: asyncio.Task) -> None:
+            self.refreshing.pop(spec, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Refreshing label embeddings for {spec.name}/{spec.pretrained} failed: {task.exception()}")
+
+        task.add_done_callback(done)
+
+    async def refresh(self, spec: ModelSpec) -> int:
+        """Bring every rank's matrix for `spec` up to date; returns how many labels were encoded."""
+        async with AsyncSession(self.db_engine) as session:
+            token = await names_token(session)
+            current = {rank: await self.current(spec, rank) for rank in self.ranks}
+            stale = [rank for rank, matrix in current.items() if matrix is None or matrix.token != token]
+            names = {rank: await distinct_labels(session, rank) for rank in stale}
+        if not stale:
+            return 0
+
+        encoded = 0
+        loop = asyncio.get_running_loop()
+        async with self.models.acquire(spec) as loaded:
+            for rank in stale:
+                matrix = current[rank]
+                known = set(matrix.labels) if matrix is not None else set()
+                new_labels = [name for name in names[rank] if name not in known]
+                # A matrix saved before any labels existed has no rows to extend
+                blocks = [np.asarray(matrix.embeddings)] if matrix is not None and len(matrix.labels) else []
+                for offset in range(0, len(new_labels), ENCODE_CHUNK):
+                    chunk = new_labels[offset:offset + ENCODE_CHUNK]
+                    tokens = loaded.tokenizer([self.template.format(name) for name in chunk])
+                    blocks.append(normalize_rows(await loaded.encoder.encode_text_batch(tokens)))
+                embeddings = np.concatenate(blocks).astype(np.float32) if blocks else np.zeros((0, self.models.embedding_dim(spec)), dtype=np.float32)
+                labels = (matrix.labels if matrix is not None else []) + new_labels
+                updated = LabelMatrix(rank, labels, embeddings, self.template, token)
+                await loop.run_in_executor(None, updated.save, label_dir(self.root, spec))
+                self.matrices[(spec, rank)] = updated
+                encoded += len(new_labels)
+                logger.info(f"Label embeddings {spec.name}/{spec.pretrained} {rank}: {len(labels)} labels, {len(new_labels)} new")
+        self.counts["refreshes"] += 1
+        self.counts["labels_encoded"] += encoded
+        return encoded
+
+    async def classify(self, spec: ModelSpec, rank: str, vector: np.ndarray, k: int) -> Optional[List[Tuple[str, float, float]]]:
+        matrix = await self.matrix(spec, rank)
+        if matrix is None:
+            return None
+        self.counts["classifications"] += 1
+        # A matmul over 100k+ labels takes milliseconds; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, matrix.classify, vector, k)
+
+    async def close(self) -> None:
+        for task in list(self.refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self.refreshing.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "refreshing": len(self.refreshing),
+            "matrices": {f"{spec.name}/{spec.pretrained}/{rank}": len(matrix.labels) for (spec, rank), matrix in self.matrices.items()},
+        }
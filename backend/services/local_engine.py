@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.quantization import CompressedVectors
+from services.vector_search import RankedIds
+
+logger = logging.getLogger(__name__)
+
+CURRENT_POINTER = "CURRENT"
+IDS_FILE = "ids.npy"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def snapshot_version_dir(snapshot_dir: str | Path, embed_version: str) -> Path:
+    """Directory holding every snapshot of one embed_version (`<slug>/<snapshot_id>/` plus a CURRENT pointer)."""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", embed_version)[:64]
+    digest = hashlib.sha1(embed_version.encode("utf-8")).hexdigest()[:8]
+    return Path(snapshot_dir) / f"{slug}-{digest}"
+
+
+def top_k(embeddings: np.ndarray, ids: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k by negative inner product over a (memory-mapped) float32 matrix."""
+    scores = embeddings @ query
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return ids[:0], scores[:0]
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return ids[order], -scores[order]
+
+
+class VectorSnapshot:
+    """A read-only, memory-mapped (ids, embeddings) snapshot of one embed_version."""
+
+    def __init__(
+        self,
+        embed_version: str,
+        snapshot_id: str,
+        path: Path,
+        compression: Optional[str] = None,
+        rerank_factor: int = 0,
+    ) -> None:
+        self.embed_version = embed_version
+        self.snapshot_id = snapshot_id
+        self.rerank_factor = rerank_factor
+        self.ids: np.ndarray = np.load(path / IDS_FILE, mmap_mode="r")
+        self.embeddings: np.ndarray = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+        if self.embeddings.dtype != np.float32 or self.embeddings.ndim != 2:
+            raise ValueError(f"Snapshot {path} must hold a 2-d float32 embedding matrix")
+        if self.ids.shape[0] != self.embeddings.shape[0]:
+            raise ValueError(f"Snapshot {path} has {self.ids.shape[0]} ids for {self.embeddings.shape[0]} embeddings")
+        self.compressed: Optional[CompressedVectors] = None
+        if compression:
+            self.compressed = CompressedVectors.load(path, compression)
+            if self.compressed is None:
+                logger.warning(f"Snapshot {path} has no {compression} codes; searching the exact vectors")
+
+    @property
+    def count(self) -> int:
+        return self.ids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    def search(self, query: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        query = np.asarray(query, dtype=np.float32)
+        if self.compressed is not None:
+            positions, scores = self.compressed.search(query, k, self.embeddings, self.rerank_factor)
+            return self.ids[positions], -scores
+        return top_k(self.embeddings, self.ids, query, k)
+
+
+class LocalVectorEngine:
+    """
+    In-process nearest-neighbour search over memory-mapped snapshots written by `tools.vector_snapshot`.
+
+    Snapshots are loaded lazily per embed_version. The engine re-reads a version's CURRENT
+    pointer at most every `refresh_seconds` and swaps in a newer snapshot without a restart;
+    searches already running keep using the mapping they started with.
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: str,
+        refresh_seconds: float = 30,
+        compression: Optional[str] = None,
+        rerank_factor: int = 0,
+    ) -> None:
+        self.snapshot_dir = snapshot_dir
+        self.refresh_seconds = refresh_seconds
+        self.compression = compression
+        self.rerank_factor = rerank_factor
+        self.snapshots: Dict[str, VectorSnapshot] = {}
+        self.checked_at: Dict[str, float] = {}
+        self.searches = 0
+        self.reloads = 0
+        self.dim_mismatches = 0
+
+    def current_snapshot_id(self, embed_version: str) -> Optional[str]:
+        try:
+            return (snapshot_version_dir(self.snapshot_dir, embed_version) / CURRENT_POINTER).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def refresh(self, embed_version: str) -> Optional[VectorSnapshot]:
+        self.checked_at[embed_version] = time.monotonic()
+        snapshot_id = self.current_snapshot_id(embed_version)
+        loaded = self.snapshots.get(embed_version)
+        if snapshot_id is None:
+            self.snapshots.pop(embed_version, None)
+            return None
+        if loaded is not None and loaded.snapshot_id == snapshot_id:
+            return loaded
+
+        path = snapshot_version_dir(self.snapshot_dir, embed_version) / snapshot_id
+        try:
+            snapshot = VectorSnapshot(embed_version, snapshot_id, path, self.compression, self.rerank_factor)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load vector snapshot {path}: {str(e)}")
+            return loaded
+        self.snapshots[embed_version] = snapshot
+        self.reloads += 1
+        logger.info(f"Loaded vector snapshot {snapshot_id} for {embed_version!r}: {snapshot.count} x {snapshot.dim}")
+        return snapshot
+
+    def snapshot(self, embed_version: str) -> Optional[VectorSnapshot]:
+        checked_at = self.checked_at.get(embed_version)
+        if checked_at is None or time.monotonic() - checked_at >= self.refresh_seconds:
+            return self.refresh(embed_version)
+        return self.snapshots.get(embed_version)
+
+    async def search(self, embed_version: str, query: Sequence[float], k: int) -> Optional[RankedIds]:
+        """
+        Ranked (record id, distance) pairs, or None when there is no usable snapshot for
+        `embed_version`, in which case the caller searches Postgres instead.
+        """
+        snapshot = await asyncio.to_thread(self.snapshot, embed_version)
+        if snapshot is None:
+            return None
+        if len(query) != snapshot.dim:
+            # A snapshot exported before the version was re-ingested with another model is stale
+            self.dim_mismatches += 1
+            logger.warning(
+                f"Vector snapshot {snapshot.snapshot_id} for {embed_version!r} is {snapshot.dim}-dimensional "
+                f"but the query is {len(query)}-dimensional; searching Postgres instead"
+            )
+            return None
+        ids, distances = await asyncio.to_thread(snapshot.search, query, k)
+        self.searches += 1
+        return list(zip(ids.tolist(), distances.tolist()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "reloads": self.reloads,
+            "dim_mismatches": self.dim_mismatches,
+            "snapshots": {
+                embed_version: {
+                    "snapshot_id": snapshot.snapshot_id,
+                    "count": snapshot.count,
+                    "dim": snapshot.dim,
+                    "compression": snapshot.compressed.quantizer.kind if snapshot.compressed else None,
+                    "resident_bytes": snapshot.compressed.nbytes() if snapshot.compressed else snapshot.embeddings.nbytes,
+                }
+                for embed_version, snapshot in self.snapshots.items()
+            },
+        }
+
+
+def write_snapshot_pointer(version_dir: Path, snapshot_id: str) -> None:
+    tmp = version_dir / f".{CURRENT_POINTER}.{os.getpid()}"
+    tmp.write_text(snapshot_id)
+    os.replace(tmp, version_dir / CURRENT_POINTER)
@@ -0,0 +1,157 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session, SessionTransaction
+
+# Upper bounds in seconds; searches range from sub-millisecond cache hits to multi-second cold loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    """
+    A Prometheus histogram with fixed buckets and optional labels.
+
+    Observations only bump a few list slots, so it is cheap enough for every request; it is
+    not thread-safe and must be observed from the event loop.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts with a trailing +Inf slot, sum)
+        self.series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = format_labels((*self.labelnames, "le"), (*labels, str(bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{series_labels} {total[0]}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    A Prometheus gauge whose value is read from `read` at scrape time. With `labelnames`,
+    `read` returns a mapping of label values to values instead of a single value.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], Any], labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if not self.labelnames:
+            lines.append(f"{self.name} {self.read()}")
+        else:
+            for labels, value in self.read().items():
+                lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(Gauge):
+    """A Prometheus counter whose running total is read from `read` at scrape time."""
+
+    kind = "counter"
+
+
+class SearchMetrics:
+    """
+    Latency histograms for the search API and gauges for the database connection pool,
+    rendered in the Prometheus text exposition format by `/metrics`.
+
+    Pool checkout is timed from session events on the engine's sessions, between a session
+    starting its transaction and the transaction getting its connection, so it is measured
+    wherever a session first touches the database without checking a connection out early.
+    """
+
+    def __init__(self, db_engine: AsyncEngine) -> None:
+        pool = db_engine.pool
+        self.sync_engine = db_engine.sync_engine
+        self.requests = Histogram(
+            "nfhm_http_request_duration_seconds",
+            "Time to handle an HTTP request, by endpoint.",
+            ("method", "handler", "status"),
+        )
+        self.stages = Histogram(
+            "nfhm_search_stage_duration_seconds",
+            "Time spent in each stage of a search request.",
+            ("stage",),
+        )
+        self.pool_checkout = Histogram(
+            "nfhm_db_pool_checkout_seconds",
+            "Time a request waited to check a connection out of the pool, including connecting.",
+        )
+        self.gauges = [
+            Gauge("nfhm_db_pool_size", "Connections the pool keeps open.", pool.size),
+            Gauge("nfhm_db_pool_checked_out", "Connections currently in use by requests.", pool.checkedout),
+            Gauge("nfhm_db_pool_checked_in", "Idle connections available in the pool.", pool.checkedin),
+            Gauge("nfhm_db_pool_overflow", "Connections opened beyond the pool size (negative while below it).", pool.overflow),
+        ]
+
+        event.listen(Session, "after_transaction_create", self.checkout_started)
+        event.listen(Session, "after_begin", self.checkout_finished)
+
+    def checkout_started(self, session: Session, transaction: SessionTransaction) -> None:
+        # Only the outermost transaction acquires a connection; savepoints reuse it
+        if transaction.parent is None:
+            session.info["checkout_started"] = time.perf_counter()
+
+    def checkout_finished(self, session: Session, transaction: SessionTransaction, connection: Connection) -> None:
+        started = session.info.pop("checkout_started", None)
+        if started is not None and connection.engine is self.sync_engine:
+            self.pool_checkout.observe(time.perf_counter() - started)
+
+    def close(self) -> None:
+        event.remove(Session, "after_transaction_create", self.checkout_started)
+        event.remove(Session, "after_begin", self.checkout_finished)
+
+    def stage(self, name: str):
+        """Context manager timing one search stage."""
+        return self.stages.time(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.requests, self.stages, self.pool_checkout, *self.gauges):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,234 @@
+import asyncio
+import gc
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+import open_clip
+import torch
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.settings import Settings
+from models.search_record import SearchRecord
+from services.batching import BatchingEncoder
+from services.lru import TTLCache
+from services.onnx_encoder import OnnxCLIP, artifact_dir
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSpec(NamedTuple):
+    name: str
+    pretrained: str
+
+
+@dataclass
+class LoadedModel:
+    spec: ModelSpec
+    model: Any
+    encoder: BatchingEncoder
+    tokenizer: Any
+    preprocess: Callable
+    image_size: Tuple[int, int]
+    # Requests currently encoding with this model; an evicted model is stopped once it drops to 0
+    active: int = 0
+    evicted: bool = False
+
+
+def preprocess_key(cfg: Dict[str, Any]) -> Hashable:
+    return tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple)) else value) for name, value in cfg.items()))
+
+
+# Weights loaded by `preload_weights` before the server forks its workers; each worker's
+# registry hands these out instead of loading its own copy
+PRELOADED: Dict[ModelSpec, Tuple[Any, Dict[str, Any], Callable]] = {}
+
+
+def preload_weights(settings: Settings) -> Optional[ModelSpec]:
+    """
+    Load the default model's weights into this (parent) process so forked workers inherit
+    them. Tensor storage is never written after loading, so its pages stay shared
+    copy-on-write; `gc.freeze()` keeps the workers' garbage collector from dirtying the
+    pages of the objects around it.
+
+    Only for torch on CPU: CUDA/MPS cannot be initialized before fork, and ONNX Runtime
+    sessions own thread pools that do not survive it. Returns the preloaded spec, if any.
+    """
+    if settings.inference_backend != "torch":
+        logger.warning("Model preloading is only supported with INFERENCE_BACKEND=torch; workers load their own")
+        return None
+    if torch.backends.mps.is_available() or torch.cuda.is_available():
+        logger.warning("Model preloading is for CPU nodes; GPU workers load their own weights")
+        return None
+    spec = ModelSpec(settings.model_name, settings.model_pretrained)
+    threads = torch.get_num_threads()
+    # Keep the parent single-threaded: an OpenMP pool started before fork hangs in the children
+    torch.set_num_threads(1)
+    try:
+        model, _, preprocess = open_clip.create_model_and_transforms(spec.name, pretrained=spec.pretrained, device="cpu")
+    finally:
+        torch.set_num_threads(threads)
+    model.eval()
+    PRELOADED[spec] = (model, dict(model.visual.preprocess_cfg), preprocess)
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded encoder {spec.name}/{spec.pretrained} for forked workers")
+    return spec
+
+
+class ModelRegistry:
+    """
+    Query encoders keyed by (model, pretrained), chosen per request from the embed_version.
+
+    An embed_version's pair is read from the `model`/`pretrained` columns of its rows in
+    search_records and cached for `version_ttl_seconds`; versions with no rows fall back to
+    the configured default. Encoders load on first use, and at most `max_resident` keep
+    their weights loaded; the least recently used one is evicted once its in-flight
+    requests finish. Tokenizers and image transforms are shared between models whose
+    model_name or preprocessing configuration match.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        device: torch.device,
+        max_resident: int = 2,
+        version_ttl_seconds: float = 300,
+    ) -> None:
+        self.settings = settings
+        self.device = device
+        self.default = ModelSpec(settings.model_name, settings.model_pretrained)
+        self.max_resident = max_resident
+        self.versions: TTLCache[ModelSpec] = TTLCache(10_000, version_ttl_seconds)
+        self.resident: "OrderedDict[ModelSpec, LoadedModel]" = OrderedDict()
+        self.loading: Dict[ModelSpec, asyncio.Lock] = {}
+        self.tokenizers: Dict[str, Any] = {}
+        self.dims: Dict[ModelSpec, int] = {}
+        self.transforms: Dict[Hashable, Callable] = {}
+        # One inference pool for every resident model, so loading another does not add forward threads
+        self.executor = ThreadPoolExecutor(max_workers=settings.inference_threads, thread_name_prefix="encoder")
+        self.loads = 0
+        self.evictions = 0
+
+    async def spec_for(self, session: AsyncSession, embed_version: str) -> ModelSpec:
+        spec = self.versions.get(embed_version)
+        if spec is None:
+            result = await session.execute(
+                select(SearchRecord.model, SearchRecord.pretrained)
+                .where(SearchRecord.embed_version == embed_version, SearchRecord.model.is_not(None))
+                .limit(1)
+            )
+            row = result.first()
+            spec = ModelSpec(row.model, row.pretrained or "") if row is not None else self.default
+            self.versions.set(embed_version, spec)
+        return spec
+
+    @asynccontextmanager
+    async def acquire(self, spec: ModelSpec) -> AsyncIterator[LoadedModel]:
+        """Borrow the encoder for `spec`, loading it first if it is not resident."""
+        loaded = await self.get(spec)
+        loaded.active += 1
+        try:
+            yield loaded
+        finally:
+            loaded.active -= 1
+            if loaded.evicted and loaded.active == 0:
+                await self.unload(loaded)
+
+    async def get(self, spec: ModelSpec) -> LoadedModel:
+        loaded = self.resident.get(spec)
+        if loaded is None:
+            lock = self.loading.setdefault(spec, asyncio.Lock())
+            async with lock:
+                loaded = self.resident.get(spec)
+                if loaded is None:
+                    loaded = await self.load(spec)
+                    self.resident[spec] = loaded
+                    await self.evict()
+        # evict() yields while unloading, and a concurrent load may have evicted `spec` meanwhile
+        if spec in self.resident:
+            self.resident.move_to_end(spec)
+        return loaded
+
+    def embedding_dim(self, spec: ModelSpec) -> int:
+        """Width of `spec`'s embeddings, read from its open_clip config without loading weights."""
+        dim = self.dims.get(spec)
+        if dim is None:
+            config = open_clip.get_model_config(spec.name)
+            # Models open_clip has no config for (e.g. loaded from a hub) fall back to EMBEDDING_DIM
+            dim = self.dims[spec] = int(config["embed_dim"]) if config else self.settings.embedding_dim
+        return dim
+
+    async def load(self, spec: ModelSpec) -> LoadedModel:
+        logger.info(f"Loading encoder {spec.name}/{spec.pretrained}")
+        model, preprocess_cfg, preprocess = await asyncio.get_running_loop().run_in_executor(None, self.load_weights, spec)
+        preprocess = self.transforms.setdefault(preprocess_key(preprocess_cfg), preprocess)
+        size = preprocess_cfg["size"]
+        image_size = (size, size) if isinstance(size, int) else tuple(size)
+        tokenizer = self.tokenizers.get(spec.name)
+        if tokenizer is None:
+            tokenizer = self.tokenizers[spec.name] = open_clip.get_tokenizer(spec.name)
+
+        encoder = BatchingEncoder(
+            model,
+            self.device,
+            max_batch_size=self.settings.encode_batch_max_size,
+            max_wait_ms=self.settings.encode_batch_max_wait_ms,
+            executor=self.executor,
+        )
+        encoder.start()
+        self.loads += 1
+        return LoadedModel(spec, model, encoder, tokenizer, preprocess, image_size)
+
+    def load_weights(self, spec: ModelSpec) -> Tuple[Any, Dict[str, Any], Callable]:
+        if self.settings.inference_backend == "onnx":
+            model = OnnxCLIP(
+                artifact_dir(self.settings.onnx_model_dir, spec.name, spec.pretrained),
+                quantized=self.settings.onnx_quantized,
+                intra_op_threads=self.settings.onnx_intra_op_threads,
+            )
+            return model, model.manifest["preprocess"], model.preprocess()
+        if spec in PRELOADED and self.device.type == "cpu":
+            return PRELOADED[spec]
+        model, _, preprocess = open_clip.create_model_and_transforms(spec.name, pretrained=spec.pretrained, device=self.device)
+        model = model.to(self.device)
+        return model, dict(model.visual.preprocess_cfg), preprocess
+
+    async def evict(self) -> None:
+        while len(self.resident) > self.max_resident:
+            spec, loaded = self.resident.popitem(last=False)
+            logger.info(f"Evicting encoder {spec.name}/{spec.pretrained}")
+            loaded.evicted = True
+            self.evictions += 1
+            if loaded.active == 0:
+                await self.unload(loaded)
+
+    async def unload(self, loaded: LoadedModel) -> None:
+        await loaded.encoder.stop()
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+
+    async def close(self) -> None:
+        while self.resident:
+            _, loaded = self.resident.popitem()
+            await self.unload(loaded)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": "/".join(self.default),
+            "max_resident": self.max_resident,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "tokenizers": len(self.tokenizers),
+            "transforms": len(self.transforms),
+            "preloaded": [f"{spec.name}/{spec.pretrained}" for spec in PRELOADED],
+            "resident": {
+                f"{spec.name}/{spec.pretrained}": {"active": loaded.active, "encoder": loaded.encoder.stats()}
+                for spec, loaded in self.resident.items()
+            },
+        }
@@ -0,0 +1,155 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import onnxruntime as ort
+import open_clip
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+TOWERS = ("text", "image")
+
+
+def artifact_dir(root: str, model_name: str, model_pretrained: str) -> Path:
+    """Where the ONNX towers of one (model_name, model_pretrained) pair are cached."""
+    return Path(root) / f"{model_name}--{model_pretrained}".replace("/", "_")
+
+
+def tower_file(tower: str, quantized: bool) -> str:
+    return f"{tower}.int8.onnx" if quantized else f"{tower}.onnx"
+
+
+class Tower(torch.nn.Module):
+    """Exposes one of the CLIP encode methods as `forward` so torch.onnx can trace it."""
+
+    def __init__(self, model: Any, tower: str) -> None:
+        super().__init__()
+        self.model = model
+        self.tower = tower
+
+    def forward(self, inputs: torch.Tensor) -> torch.Tensor:
+        if self.tower == "text":
+            return self.model.encode_text(inputs)
+        return self.model.encode_image(inputs)
+
+
+def export_towers(
+    model: Any,
+    tokenizer: Any,
+    directory: Path,
+    quantize: bool = False,
+    opset: int = 17,
+) -> List[Path]:
+    """
+    Export the text and image towers of an open_clip model to ONNX with a dynamic batch axis.
+
+    With `quantize`, dynamically int8-quantized copies (weights int8, activations quantized
+    per batch at run time) are written next to the float32 graphs. A manifest records the
+    preprocessing configuration so the backend can rebuild the image transform without
+    loading the torch model.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    directory.mkdir(parents=True, exist_ok=True)
+    model = model.float().eval().cpu()
+    preprocess_cfg = dict(model.visual.preprocess_cfg)
+    height, width = preprocess_cfg["size"]
+    sample_inputs = {
+        "text": tokenizer(["a pressed plant specimen", "a pinned beetle"]),
+        "image": torch.zeros(2, 3, height, width),
+    }
+
+    written = []
+    for tower in TOWERS:
+        path = directory / tower_file(tower, quantized=False)
+        module = Tower(model, tower)
+        # Traced with grad enabled on purpose: under no_grad, nn.MultiheadAttention takes its
+        # fused fast path, which has no ONNX symbolic.
+        torch.onnx.export(
+            module,
+            (sample_inputs[tower],),
+            str(path),
+            input_names=["inputs"],
+            output_names=["features"],
+            dynamic_axes={"inputs": {0: "batch"}, "features": {0: "batch"}},
+            opset_version=opset,
+            dynamo=False,
+        )
+        written.append(path)
+        logger.info(f"Exported {tower} tower to {path}")
+        if quantize:
+            quantized_path = directory / tower_file(tower, quantized=True)
+            quantize_dynamic(str(path), str(quantized_path), weight_type=QuantType.QInt8)
+            written.append(quantized_path)
+            logger.info(f"Quantized {tower} tower to {quantized_path}")
+
+    manifest = {
+        "context_length": tokenizer.context_length,
+        "embedding_dim": int(model.text_projection.shape[1]),
+        "preprocess": {**preprocess_cfg, "size": [height, width]},
+        "opset": opset,
+        "quantized": quantize,
+    }
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return written
+
+
+class OnnxCLIP:
+    """
+    ONNX Runtime stand-in for an open_clip model on CPU-only nodes.
+
+    Provides the `encode_text` / `encode_image` methods the BatchingEncoder calls, taking
+    and returning torch tensors, plus the image transform and input size recorded at export.
+    """
+
+    def __init__(self, directory: Path, quantized: bool = False, intra_op_threads: int = 0) -> None:
+        manifest_path = directory / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"No ONNX export at {directory}; run `python -m tools.onnx_export export` first."
+            )
+        self.manifest: Dict[str, Any] = json.loads(manifest_path.read_text())
+        self.quantized = quantized
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime use one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        self.sessions = {
+            tower: ort.InferenceSession(
+                str(directory / tower_file(tower, quantized)), options, providers=["CPUExecutionProvider"]
+            )
+            for tower in TOWERS
+        }
+
+    @property
+    def image_size(self) -> Tuple[int, int]:
+        height, width = self.manifest["preprocess"]["size"]
+        return height, width
+
+    def preprocess(self) -> Callable[[Image.Image], torch.Tensor]:
+        cfg = self.manifest["preprocess"]
+        return open_clip.image_transform(
+            self.image_size,
+            is_train=False,
+            mean=tuple(cfg["mean"]),
+            std=tuple(cfg["std"]),
+            resize_mode=cfg["resize_mode"],
+            interpolation=cfg["interpolation"],
+            fill_color=cfg["fill_color"],
+        )
+
+    def run(self, tower: str, inputs: torch.Tensor) -> torch.Tensor:
+        features = self.sessions[tower].run(None, {"inputs": inputs.cpu().numpy()})[0]
+        return torch.from_numpy(np.asarray(features, dtype=np.float32))
+
+    def encode_text(self, tokens: torch.Tensor) -> torch.Tensor:
+        return self.run("text", tokens)
+
+    def encode_image(self, pixels: torch.Tensor) -> torch.Tensor:
+        return self.run("image", pixels)
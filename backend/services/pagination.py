@@ -0,0 +1,35 @@
+import base64
+import binascii
+
+from pydantic import BaseModel, ValidationError
+
+from services.search_filters import SearchFilters
+
+
+class SearchCursor(BaseModel):
+    """
+    Continuation state of a ranked search, handed to clients as an opaque token.
+
+    The query vector itself stays server-side in the query cache under `vector_id`, so the
+    next page never re-encodes the query; it resumes after (last_distance, last_id), which
+    is `offset` rows into the ranking.
+    """
+
+    vector_id: str
+    embed_version: str
+    filters: SearchFilters
+    last_distance: float
+    last_id: int
+    # Cursors issued before it was added continue as if from the first page
+    offset: int = 0
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode("utf-8")).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "SearchCursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            return cls.model_validate_json(raw)
+        except (binascii.Error, ValueError, ValidationError) as e:
+            raise ValueError("Malformed search cursor") from e
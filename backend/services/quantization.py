@@ -0,0 +1,262 @@
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Tuple, Type
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per block so temporaries stay bounded however large the collection is
+SCORE_BLOCK_ROWS = 65_536
+
+
+def best_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the `k` highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def nearest_centroids(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(x.shape[0], dtype=np.int64)
+    for start in range(0, x.shape[0], SCORE_BLOCK_ROWS):
+        block = x[start:start + SCORE_BLOCK_ROWS]
+        assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assignments
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    centroids = x[rng.choice(x.shape[0], k, replace=x.shape[0] < k)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(x, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        for dim in range(x.shape[1]):
+            centroids[:, dim] = np.bincount(assignments, weights=x[:, dim], minlength=k)
+        empty = counts == 0
+        centroids[~empty] /= counts[~empty, None]
+        # Re-seed empty clusters from random training points
+        centroids[empty] = x[rng.choice(x.shape[0], int(empty.sum()))]
+    return centroids
+
+
+class Quantizer:
+    kind: str = ""
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        raise NotImplementedError('Child classes must define an encode function')
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products between `query` and every encoded row."""
+        raise NotImplementedError('Child classes must define a scores function')
+
+    def code_bytes(self) -> int:
+        raise NotImplementedError('Child classes must define a code_bytes function')
+
+    def nbytes(self) -> int:
+        raise NotImplementedError('Child classes must define a nbytes function')
+
+    def save(self, file: BinaryIO) -> None:
+        raise NotImplementedError('Child classes must define a save function')
+
+    @classmethod
+    def load(cls, path: Path) -> "Quantizer":
+        raise NotImplementedError('Child classes must define a load function')
+
+
+class ScalarQuantizer(Quantizer):
+    """Per-dimension 8-bit scalar quantization: x ~= low + code * scale."""
+
+    kind = "int8"
+
+    def __init__(self, low: np.ndarray, scale: np.ndarray) -> None:
+        self.low = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, sample: np.ndarray) -> "ScalarQuantizer":
+        low = sample.min(axis=0)
+        scale = (sample.max(axis=0) - low) / 255
+        scale[scale == 0] = 1
+        return cls(low, scale)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((x - self.low) / self.scale), 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.low
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # q.(low + c * scale) == c.(q * scale) + q.low, so the codes never need decoding
+        weights = query * self.scale
+        bias = float(query @ self.low)
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + block.shape[0]] = block.astype(np.float32) @ weights + bias
+        return out
+
+    def code_bytes(self) -> int:
+        return self.low.shape[0]
+
+    def nbytes(self) -> int:
+        return self.low.nbytes + self.scale.nbytes
+
+    def save(self, file: BinaryIO) -> None:
+        np.savez(file, low=self.low, scale=self.scale)
+
+    @classmethod
+    def load(cls, path: Path) -> "ScalarQuantizer":
+        with np.load(path) as data:
+            return cls(data["low"], data["scale"])
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization with 256 centroids per subspace, searched with asymmetric
+    distance tables: the query stays exact and is compared against the codebooks once,
+    then every code is scored with `subspaces` table lookups.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks: np.ndarray) -> None:
+        self.codebooks = codebooks.astype(np.float32)  # [subspaces, 256, dim / subspaces]
+
+    @property
+    def subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def sub_dim(self) -> int:
+        return self.codebooks.shape[2]
+
+    @classmethod
+    def train(cls, sample: np.ndarray, subspaces: int = 64, iterations: int = 20, seed: int = 0) -> "ProductQuantizer":
+        dim = sample.shape[1]
+        if dim % subspaces:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by {subspaces} subspaces")
+        sub_dim = dim // subspaces
+        rng = np.random.default_rng(seed)
+        codebooks = np.empty((subspaces, 256, sub_dim), dtype=np.float32)
+        for j in range(subspaces):
+            codebooks[j] = kmeans(sample[:, j * sub_dim:(j + 1) * sub_dim], 256, iterations, rng)
+        return cls(codebooks)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        codes = np.empty((x.shape[0], self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = nearest_centroids(x[:, j * self.sub_dim:(j + 1) * self.sub_dim], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.codebooks[np.arange(self.subspaces), codes].reshape(codes.shape[0], -1)
+
+    def distance_table(self, query: np.ndarray) -> np.ndarray:
+        """Inner products between each query sub-vector and its subspace's centroids: [subspaces, 256]."""
+        return np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.subspaces, self.sub_dim))
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        table = self.distance_table(query).astype(np.float32)
+        out = np.zeros(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+            # Subspace-major copy of the block: each lookup below gathers from one contiguous row
+            block = np.ascontiguousarray(codes[start:start + SCORE_BLOCK_ROWS].T)
+            scores = out[start:start + block.shape[1]]
+            for j in range(self.subspaces):
+                scores += table[j].take(block[j])
+        return out
+
+    def code_bytes(self) -> int:
+        return self.subspaces
+
+    def nbytes(self) -> int:
+        return self.codebooks.nbytes
+
+    def save(self, file: BinaryIO) -> None:
+        np.savez(file, codebooks=self.codebooks)
+
+    @classmethod
+    def load(cls, path: Path) -> "ProductQuantizer":
+        with np.load(path) as data:
+            return cls(data["codebooks"])
+
+
+def write_atomic(path: Path, write: Callable[[BinaryIO], None]) -> None:
+    # Written aside and renamed, so a loader never sees a partial file
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    with os.fdopen(fd, "wb") as handle:
+        write(handle)
+    os.replace(temp_path, path)
+
+
+QUANTIZERS: dict[str, Type[Quantizer]] = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+class CompressedVectors:
+    """Quantized codes for a snapshot, searched approximately and optionally re-ranked exactly."""
+
+    def __init__(self, quantizer: Quantizer, codes: np.ndarray) -> None:
+        self.quantizer = quantizer
+        self.codes = codes
+
+    @staticmethod
+    def paths(snapshot_path: Path, kind: str) -> Tuple[Path, Path]:
+        return snapshot_path / f"{kind}_quantizer.npz", snapshot_path / f"{kind}_codes.npy"
+
+    @classmethod
+    def build(cls, quantizer: Quantizer, embeddings: np.ndarray, batch_rows: int = SCORE_BLOCK_ROWS) -> "CompressedVectors":
+        codes = np.empty((embeddings.shape[0], quantizer.code_bytes()), dtype=np.uint8)
+        for start in range(0, embeddings.shape[0], batch_rows):
+            codes[start:start + batch_rows] = quantizer.encode(np.asarray(embeddings[start:start + batch_rows]))
+        return cls(quantizer, codes)
+
+    def save(self, snapshot_path: Path) -> None:
+        quantizer_path, codes_path = self.paths(snapshot_path, self.quantizer.kind)
+        # The quantizer goes last: load() treats its presence as the codes being complete
+        write_atomic(codes_path, lambda handle: np.save(handle, self.codes))
+        write_atomic(quantizer_path, self.quantizer.save)
+
+    @classmethod
+    def load(cls, snapshot_path: Path, kind: str) -> Optional["CompressedVectors"]:
+        quantizer_path, codes_path = cls.paths(snapshot_path, kind)
+        if not quantizer_path.exists() or not codes_path.exists():
+            return None
+        # Codes are read into RAM; the exact float32 matrix stays memory-mapped for re-ranking
+        return cls(QUANTIZERS[kind].load(quantizer_path), np.load(codes_path))
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.quantizer.nbytes()
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        exact: Optional[np.ndarray] = None,
+        rerank_factor: int = 0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row positions and inner-product scores of the best `k` rows.
+
+        With `exact` and `rerank_factor`, the best `k * rerank_factor` approximate candidates
+        are re-scored against their exact vectors before the final cut.
+        """
+        approximate = self.quantizer.scores(self.codes, query)
+        if exact is None or rerank_factor <= 0:
+            positions = best_k(approximate, k)
+            return positions, approximate[positions]
+
+        # Sorted gathers keep page faults on a memory-mapped `exact` sequential
+        candidates = np.sort(best_k(approximate, k * rerank_factor))
+        exact_scores = np.asarray(exact[candidates]) @ query
+        order = best_k(exact_scores, k)
+        return candidates[order], exact_scores[order]
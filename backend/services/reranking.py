@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import cast
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.search_record import SearchRecord
+from services.vector_search import EmbeddingStorage, RankedIds, embedding_column
+
+
+def collapse_by_specimen(ranked: RankedIds, specimens: Dict[int, Optional[UUID]]) -> RankedIds:
+    """Keep only the best-ranked media of each specimen; rows without a specimen_uuid are all kept."""
+    seen = set()
+    collapsed = []
+    for record_id, distance in ranked:
+        specimen = specimens.get(record_id)
+        if specimen is not None:
+            if specimen in seen:
+                continue
+            seen.add(specimen)
+        collapsed.append((record_id, distance))
+    return collapsed
+
+
+def mmr(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float, deadline: float) -> Tuple[List[int], bool]:
+    """
+    Greedy maximal marginal relevance over a pool given in relevance order.
+
+    Each step picks the row maximizing `lambda_ * relevance - (1 - lambda_) * max similarity
+    to the rows already picked`, using one pool x pool similarity matrix and a running
+    maximum. If `deadline` (a perf_counter value) passes, the remaining slots are filled in
+    relevance order. Returns the picked pool positions and whether the deadline cut in.
+    """
+    count = min(k, len(relevance))
+    if count == 0:
+        return [], False
+    # Stored embeddings are L2-normalized, so the inner product is the cosine similarity
+    similarity = embeddings @ embeddings.T
+    available = np.ones(len(relevance), dtype=bool)
+    selected = [0]
+    available[0] = False
+    max_similarity = similarity[0].copy()
+    while len(selected) < count:
+        if time.perf_counter() > deadline:
+            selected.extend(np.flatnonzero(available)[:count - len(selected)].tolist())
+            return selected, True
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected, False
+
+
+class DiversityReranker:
+    """
+    Re-ranks an over-fetched candidate pool so one page is not filled by the same specimen
+    or near-identical images: collapse by specimen_uuid, then MMR on the stored embeddings.
+
+    Relevance is the ranking's own order (vector distance or fused score) rescaled to
+    [0, 1], so the same lambda works for vector and hybrid rankings. The MMR loop gets
+    `budget_ms`; past it the page is completed in relevance order.
+    """
+
+    def __init__(self, budget_ms: float = 20, storage: EmbeddingStorage = "vector") -> None:
+        self.budget_ms = budget_ms
+        self.storage = storage
+        self.counts: Dict[str, int] = {"reranks": 0, "collapsed": 0, "budget_exhausted": 0}
+
+    async def pool(
+        self, session: AsyncSession, record_ids: Sequence[int], dim: int, embed_version: Optional[str] = None
+    ) -> Dict[int, Tuple[Optional[UUID], Any]]:
+        # Cast to float32 `vector` so halfvec rows arrive as plain arrays too
+        query = select(
+            SearchRecord.id, SearchRecord.specimen_uuid, cast(embedding_column(self.storage), Vector(dim)).label("embedding")
+        ).where(SearchRecord.id.in_(record_ids))
+        if embed_version is not None:
+            query = query.where(SearchRecord.embed_version == embed_version)
+        results = await session.execute(query)
+        return {row.id: (row.specimen_uuid, row.embedding) for row in results}
+
+    async def rerank(
+        self, session: AsyncSession, ranked: RankedIds, limit: int, lambda_: float, dim: int, embed_version: Optional[str] = None
+    ) -> RankedIds:
+        if not ranked:
+            return ranked
+        pool = await self.pool(session, [record_id for record_id, _ in ranked], dim, embed_version)
+        candidates = [(record_id, distance) for record_id, distance in ranked if record_id in pool]
+        collapsed = collapse_by_specimen(candidates, {record_id: pool[record_id][0] for record_id, _ in candidates})
+        self.counts["reranks"] += 1
+        self.counts["collapsed"] += len(candidates) - len(collapsed)
+        if not collapsed:
+            return collapsed
+
+        embeddings = np.stack([np.asarray(pool[record_id][1], dtype=np.float32) for record_id, _ in collapsed])
+        distances = np.array([distance for _, distance in collapsed], dtype=np.float32)
+        spread = distances.max() - distances.min()
+        relevance = (distances.max() - distances) / spread if spread > 0 else np.ones_like(distances)
+
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        # A 1000-row pool is a few milliseconds of matrix work, so keep it off the event loop
+        selected, exhausted = await asyncio.get_running_loop().run_in_executor(
+            None, mmr, relevance, embeddings, limit, lambda_, deadline
+        )
+        if exhausted:
+            self.counts["budget_exhausted"] += 1
+        return [collapsed[position] for position in selected]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "budget_ms": self.budget_ms}
@@ -0,0 +1,79 @@
+import hashlib
+import logging
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.embed_version_generation import EmbedVersionGeneration
+from services.lru import TTLCache
+from services.vector_search import RankedIds
+
+logger = logging.getLogger(__name__)
+
+ResultKey = Tuple[str, str, int, Hashable]
+
+
+def vector_digest(vector: Sequence[float]) -> str:
+    return hashlib.sha256(np.asarray(vector, dtype="<f4").tobytes()).hexdigest()
+
+
+class SearchResultCache:
+    """
+    Caches the ranked (record id, distance) pairs of a nearest-neighbour query.
+
+    Entries remember the embed_version generation they were computed under; the ingestor
+    bumps that generation in `embed_version_generations` whenever it writes new rows, which
+    makes every cached result for the version stale. Generations are re-read from the
+    database at most every `generation_ttl_seconds`.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 600, generation_ttl_seconds: float = 5) -> None:
+        self.results: TTLCache[Tuple[int, RankedIds]] = TTLCache(max_size, ttl_seconds)
+        self.generations: TTLCache[int] = TTLCache(10_000, generation_ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def key(self, vector: Sequence[float], embed_version: str, limit: int, filters: Hashable = ()) -> ResultKey:
+        return (vector_digest(vector), embed_version, limit, filters)
+
+    async def generation(self, session: AsyncSession, embed_version: str) -> int:
+        generation = self.generations.get(embed_version)
+        if generation is None:
+            result = await session.execute(
+                select(EmbedVersionGeneration.generation).where(
+                    EmbedVersionGeneration.embed_version == embed_version
+                )
+            )
+            generation = result.scalar_one_or_none() or 0
+            self.generations.set(embed_version, generation)
+        return generation
+
+    def get(self, key: ResultKey, generation: int) -> Optional[RankedIds]:
+        entry = self.results.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        cached_generation, ranked = entry
+        if cached_generation != generation:
+            self.stale += 1
+            self.misses += 1
+            self.results.pop(key)
+            return None
+        self.hits += 1
+        return ranked
+
+    def set(self, key: ResultKey, generation: int, ranked: RankedIds) -> None:
+        self.results.set(key, (generation, ranked))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.results),
+        }
@@ -0,0 +1,90 @@
+from datetime import date
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import func
+from sqlalchemy.sql.elements import ColumnElement
+
+from models.search_record import SearchRecord
+
+
+class SearchFilters(BaseModel):
+    """Structured filters on `search_records` columns that are pushed into the search query's WHERE clause."""
+
+    model_config = ConfigDict(frozen=True)
+
+    tax_order: Optional[str] = None
+    tax_family: Optional[str] = None
+    collected_after: Optional[date] = None
+    collected_before: Optional[date] = None
+    # (min_longitude, min_latitude, max_longitude, max_latitude)
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    # (latitude, longitude, radius in meters)
+    near: Optional[Tuple[float, float, float]] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(value is not None for value in self.model_dump().values())
+
+    def cache_key(self) -> Tuple:
+        return tuple(self.model_dump().values())
+
+    def conditions(self) -> List[ColumnElement]:
+        conditions: List[ColumnElement] = []
+        if self.tax_order is not None:
+            conditions.append(SearchRecord.tax_order == self.tax_order)
+        if self.tax_family is not None:
+            conditions.append(SearchRecord.tax_family == self.tax_family)
+        if self.collected_after is not None:
+            conditions.append(SearchRecord.collection_date >= self.collected_after)
+        if self.collected_before is not None:
+            conditions.append(SearchRecord.collection_date <= self.collected_before)
+        if self.bbox is not None:
+            envelope = func.ST_MakeEnvelope(*self.bbox, 4326)
+            conditions.append(func.ST_Intersects(SearchRecord.location, func.geography(envelope)))
+        if self.near is not None:
+            latitude, longitude, radius_m = self.near
+            point = func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326)
+            conditions.append(func.ST_DWithin(SearchRecord.location, func.geography(point), radius_m))
+        return conditions
+
+
+def search_filters(
+    tax_order: Optional[str] = Query(None, max_length=128),
+    tax_family: Optional[str] = Query(None, max_length=128),
+    collected_after: Optional[date] = Query(None, description="Earliest collection_date (inclusive)"),
+    collected_before: Optional[date] = Query(None, description="Latest collection_date (inclusive)"),
+    bbox: Optional[str] = Query(None, description="Map bounding box as min_lon,min_lat,max_lon,max_lat"),
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lon: Optional[float] = Query(None, ge=-180, le=180),
+    within_km: Optional[float] = Query(None, gt=0, le=20_000, description="Radius around near_lat/near_lon"),
+) -> SearchFilters:
+    """FastAPI dependency that parses and validates the search filter query parameters."""
+    parsed_bbox = None
+    if bbox is not None:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(part) for part in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat.")
+        if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise HTTPException(status_code=400, detail="bbox is outside of valid longitude/latitude ranges.")
+        parsed_bbox = (min_lon, min_lat, max_lon, max_lat)
+
+    near = None
+    if any(value is not None for value in (near_lat, near_lon, within_km)):
+        if near_lat is None or near_lon is None or within_km is None:
+            raise HTTPException(status_code=400, detail="near_lat, near_lon and within_km must be provided together.")
+        near = (near_lat, near_lon, within_km * 1000)
+
+    if collected_after is not None and collected_before is not None and collected_after > collected_before:
+        raise HTTPException(status_code=400, detail="collected_after must not be later than collected_before.")
+
+    return SearchFilters(
+        tax_order=tax_order,
+        tax_family=tax_family,
+        collected_after=collected_after,
+        collected_before=collected_before,
+        bbox=parsed_bbox,
+        near=near,
+    )
@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Literal, Optional, Sequence, Tuple
+
+import httpx
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from services.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ThumbnailFormat = Literal["webp", "jpeg"]
+MEDIA_TYPES: Dict[str, str] = {"webp": "image/webp", "jpeg": "image/jpeg"}
+# Portrait thumbnails may be at most this many times taller than wide
+MAX_ASPECT = 4
+
+
+class ThumbnailError(Exception):
+    """The original could not be fetched or is not a usable image."""
+
+
+class DiskLRU:
+    """
+    Content-addressed files under `directory`, kept below `max_bytes` by evicting the least
+    recently used. Safe to call from several threads.
+
+    The recency index lives in memory and is rebuilt from file mtimes at startup. Several
+    processes may share the directory; each evicts against its own index, so a file can
+    disappear under another process, which then treats it as a miss, and files written by
+    another process are indexed when first read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def load(self) -> None:
+        files = [(path.stat(), path) for path in self.directory.glob("??/*") if path.is_file() and not path.name.startswith(".")]
+        with self.lock:
+            for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+                self.entries[path.name] = stat.st_size
+                self.total_bytes += stat.st_size
+            self.evict()
+
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            data = self.path(digest).read_bytes()
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(digest, 0)
+            return None
+        with self.lock:
+            if digest in self.entries:
+                self.entries.move_to_end(digest)
+            else:
+                # Written by another process sharing the directory
+                self.entries[digest] = len(data)
+                self.total_bytes += len(data)
+                self.evict()
+        return data
+
+    def write(self, digest: str, data: bytes) -> None:
+        path = self.path(digest)
+        path.parent.mkdir(exist_ok=True)
+        # Written aside and renamed, so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(digest, 0)
+            self.entries[digest] = len(data)
+            self.evict()
+
+    def evict(self) -> None:
+        # Called with the lock held
+        while self.total_bytes > self.max_bytes and self.entries:
+            digest, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            self.path(digest).unlink(missing_ok=True)
+
+
+def render_thumbnails(
+    contents: bytes, widths: Sequence[int], fmt: ThumbnailFormat, quality: int, max_pixels: int
+) -> Dict[int, bytes]:
+    """Encode one thumbnail per width from a single decode of the original, largest first."""
+    try:
+        img = Image.open(io.BytesIO(contents))
+    except UnidentifiedImageError:
+        raise ThumbnailError("The original is not a supported image.")
+    if img.width * img.height > max_pixels:
+        raise ThumbnailError(f"The original is larger than {max_pixels} pixels.")
+    largest = max(widths)
+    if img.format == "JPEG":
+        img.draft("RGB", (largest, largest))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+
+    thumbnails = {}
+    for width in sorted(widths, reverse=True):
+        # Each size is downscaled from the previous, larger one rather than from the original
+        img.thumbnail((width, width * MAX_ASPECT), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            img.save(buffer, "WEBP", quality=quality, method=4)
+        else:
+            img.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        thumbnails[width] = buffer.getvalue()
+    return thumbnails
+
+
+class Thumbnailer:
+    """
+    Resized copies of remote result media, served from a disk cache.
+
+    A miss fetches the original once, renders every configured width for the requested
+    format on a thread pool and stores them all, so later sizes are hits too. Concurrent
+    misses for the same original share one fetch. media_uuid -> original URL lookups are
+    cached in memory so hits do not touch the database.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int,
+        widths: Sequence[int] = (160, 320, 640),
+        quality: int = 80,
+        max_workers: int = 4,
+        max_source_bytes: int = 50 * 1024 * 1024,
+        max_pixels: int = 50_000_000,
+        fetch_timeout_seconds: float = 10.0,
+        failure_ttl_seconds: float = 300,
+    ) -> None:
+        self.cache = DiskLRU(cache_dir, max_bytes)
+        self.widths = tuple(sorted(set(widths)))
+        self.quality = quality
+        self.max_source_bytes = max_source_bytes
+        self.max_pixels = max_pixels
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self.client = httpx.AsyncClient(timeout=fetch_timeout_seconds, follow_redirects=True)
+        self.sources: TTLCache[str] = TTLCache(100_000, 3600)
+        # Originals that failed recently, so a broken or rate-limiting host is not retried on every request
+        self.failures: TTLCache[str] = TTLCache(10_000, failure_ttl_seconds)
+        self.inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.counts: Dict[str, int] = {"hits": 0, "misses": 0, "fetches": 0, "errors": 0}
+
+    def width_for(self, requested: int) -> int:
+        """The smallest configured width covering `requested`, so the number of variants stays bounded."""
+        return next((width for width in self.widths if width >= requested), self.widths[-1])
+
+    def digest(self, source_url: str, width: int, fmt: ThumbnailFormat) -> str:
+        key = f"{source_url}\0{width}\0{fmt}\0{self.quality}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    async def thumbnail(self, source_url: str, width: int, fmt: ThumbnailFormat) -> bytes:
+        loop = asyncio.get_running_loop()
+        digest = self.digest(source_url, width, fmt)
+        data = await loop.run_in_executor(self.executor, self.cache.read, digest)
+        if data is not None:
+            self.counts["hits"] += 1
+            return data
+
+        self.counts["misses"] += 1
+        failure = self.failures.get(source_url)
+        if failure is not None:
+            raise ThumbnailError(failure)
+        key = (source_url, fmt)
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(self.generate(source_url, fmt))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # Shielded so one client disconnecting does not cancel the fetch for everyone waiting on it
+        thumbnails = await asyncio.shield(task)
+        return thumbnails[width]
+
+    async def generate(self, source_url: str, fmt: ThumbnailFormat) -> Dict[int, bytes]:
+        try:
+            contents = await self.fetch(source_url)
+            loop = asyncio.get_running_loop()
+            thumbnails = await loop.run_in_executor(
+                self.executor, render_thumbnails, contents, self.widths, fmt, self.quality, self.max_pixels
+            )
+        except ThumbnailError as e:
+            self.counts["errors"] += 1
+            self.failures.set(source_url, str(e))
+            raise
+        except Exception as e:
+            # Corrupt pixel data, decompression bombs and the like are cached as failures too
+            logger.warning(f"Rendering thumbnails of {source_url} failed: {e!r}")
+            self.counts["errors"] += 1
+            message = "The original could not be rendered."
+            self.failures.set(source_url, message)
+            raise ThumbnailError(message) from e
+        for width, data in thumbnails.items():
+            await loop.run_in_executor(self.executor, self.cache.write, self.digest(source_url, width, fmt), data)
+        return thumbnails
+
+    async def fetch(self, source_url: str) -> bytes:
+        self.counts["fetches"] += 1
+        chunks = []
+        size = 0
+        try:
+            async with self.client.stream("GET", source_url) as response:
+                if response.status_code != 200:
+                    raise ThumbnailError(f"The media host answered {response.status_code}.")
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_source_bytes:
+                        raise ThumbnailError(f"The original is larger than {self.max_source_bytes} bytes.")
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            logger.warning(f"Fetching {source_url} failed: {e}")
+            raise ThumbnailError("The media host could not be reached.")
+        return b"".join(chunks)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "entries": len(self.cache.entries),
+            "bytes": self.cache.total_bytes,
+            "max_bytes": self.cache.max_bytes,
+            "evictions": self.cache.evictions,
+        }
@@ -0,0 +1,476 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from pgvector.sqlalchemy import HALFVEC, Vector
+from sqlalchemy import ARRAY, Float, Text, and_, bindparam, cast, func, literal, literal_column, or_, text, true, union_all
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.search_record import SearchRecord
+from services.lru import TTLCache
+from services.search_filters import SearchFilters
+
+# The vector_embedder L2-normalizes every stored embedding, so ranking by negative inner
+# product (`<#>`) gives the same order as l2_distance while being cheaper to compute and
+# matching the `vector_ip_ops` ANN indexes built by `tools.ann_indexes`.
+ANN_METHODS = ("hnsw", "ivfflat")
+HNSW_DEFAULT_EF_SEARCH = 40
+HNSW_MAX_EF_SEARCH = 1000
+
+FilterStrategy = Literal["prefilter", "postfilter"]
+# Which column is searched: float32 `embedding`, or its half-precision copy `embedding_half` (V7)
+EmbeddingStorage = Literal["vector", "halfvec"]
+# (record id, distance) pairs, nearest first
+RankedIds = List[Tuple[int, float]]
+
+
+def embedding_column(storage: EmbeddingStorage = "vector") -> Any:
+    return SearchRecord.embedding_half if storage == "halfvec" else SearchRecord.embedding
+
+
+def embedding_type(dim: int, storage: EmbeddingStorage = "vector") -> Any:
+    return HALFVEC(dim) if storage == "halfvec" else Vector(dim)
+
+
+def embedding_expression(dim: int, column: Any = None, storage: EmbeddingStorage = "vector") -> ColumnElement:
+    # The embedding columns are untyped; ANN indexes are expression indexes on this cast.
+    return cast(embedding_column(storage) if column is None else column, embedding_type(dim, storage))
+
+
+def distance_expression(
+    query_vector: Sequence[float], dim: int, column: Any = None, storage: EmbeddingStorage = "vector"
+) -> ColumnElement:
+    return embedding_expression(dim, column, storage).max_inner_product(cast(list(query_vector), embedding_type(dim, storage)))
+
+
+def partition_suffix(embed_version: str) -> str:
+    # Mirrors the SQL function search_records_partition_suffix (V8); change both together
+    if re.fullmatch(r"[a-z0-9_]{1,32}", embed_version):
+        return embed_version
+    slug = re.sub(r"[^a-z0-9]+", "_", embed_version.lower()).strip("_")[:24]
+    return f"{slug}_{hashlib.md5(embed_version.encode('utf-8')).hexdigest()[:8]}"
+
+
+def partition_name(embed_version: str) -> str:
+    """The search_records partition holding one embed_version (created by ensure_search_records_partition)."""
+    return f"search_records_{partition_suffix(embed_version)}"
+
+
+def ann_index_name(embed_version: str, method: str, storage: EmbeddingStorage = "vector") -> str:
+    # "_h" rather than "_halfvec" keeps the longest names within Postgres' 63-byte limit
+    return f"idx_search_records_{method}{'_h' if storage == 'halfvec' else ''}_{partition_suffix(embed_version)}"
+
+
+def recall_settings(ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[str]:
+    statements = []
+    if ef_search is not None:
+        statements.append(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes is not None:
+        statements.append(f"SET LOCAL ivfflat.probes = {int(probes)}")
+    return statements
+
+
+async def apply_recall_settings(session: AsyncSession, ef_search: Optional[int] = None, probes: Optional[int] = None) -> None:
+    """Set the HNSW/IVFFlat recall knobs for the rest of the session's current transaction."""
+    for statement in recall_settings(ef_search, probes):
+        await session.execute(text(statement))
+
+
+def effective_ef_search(ef_search: Optional[int], fetch_rows: int) -> Optional[int]:
+    # An HNSW scan returns at most ef_search rows, so it must cover every row the query asks for
+    if ef_search is None and fetch_rows <= HNSW_DEFAULT_EF_SEARCH:
+        return None
+    return min(max(ef_search or HNSW_DEFAULT_EF_SEARCH, fetch_rows), HNSW_MAX_EF_SEARCH)
+
+
+def nearest_query(
+    query_vector: Sequence[float],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    filters: Optional[SearchFilters] = None,
+    strategy: FilterStrategy = "prefilter",
+    overfetch_factor: int = 10,
+    storage: EmbeddingStorage = "vector",
+) -> Select:
+    """
+    The nearest-neighbour query for one embed_version, selecting only (id, distance).
+
+    Filtered queries either materialize the matching rows first and rank them exactly
+    ("prefilter", for selective filters), or take the `limit * overfetch_factor` nearest rows
+    from the ANN index and filter those ("postfilter", for broad filters).
+    """
+    version_condition = SearchRecord.embed_version == embed_version
+    if filters is None or filters.is_empty:
+        distance = distance_expression(query_vector, dim, storage=storage)
+        return select(SearchRecord.id, distance.label("distance")).where(
+            version_condition
+        ).order_by(distance).limit(limit)
+
+    if strategy == "prefilter":
+        candidates = select(SearchRecord.id, embedding_column(storage).label("embedding")).where(
+            version_condition, *filters.conditions()
+        ).cte("candidates").prefix_with("MATERIALIZED")
+        distance = distance_expression(query_vector, dim, candidates.c.embedding, storage)
+        return select(candidates.c.id, distance.label("distance")).order_by(distance).limit(limit)
+
+    distance = distance_expression(query_vector, dim, storage=storage)
+    nearest = select(SearchRecord.id, distance.label("distance")).where(
+        version_condition
+    ).order_by(distance).limit(limit * overfetch_factor).subquery("nearest")
+    return select(nearest.c.id, nearest.c.distance).join(SearchRecord, SearchRecord.id == nearest.c.id).where(
+        *filters.conditions()
+    ).order_by(nearest.c.distance).limit(limit)
+
+
+def next_page_query(
+    query_vector: Sequence[float],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    last_distance: float,
+    last_id: int,
+    filters: Optional[SearchFilters] = None,
+    storage: EmbeddingStorage = "vector",
+    exact: bool = False,
+) -> Select:
+    """
+    Keyset continuation of a ranked search: the `limit` rows ordered after (last_distance, last_id).
+
+    The keyset predicate filters the rows an HNSW scan returns, so the scan has to reach past
+    every row already served; `exact` ranks the version's (filtered) rows without the index
+    instead, for pages deeper than any ef_search allows.
+    """
+    if exact:
+        source = select(SearchRecord.id, embedding_column(storage).label("embedding")).where(
+            SearchRecord.embed_version == embed_version, *(filters.conditions() if filters is not None else ())
+        ).cte("candidates").prefix_with("MATERIALIZED")
+        record_id = source.c.id
+        distance = distance_expression(query_vector, dim, source.c.embedding, storage)
+        conditions = []
+    else:
+        record_id = SearchRecord.id
+        distance = distance_expression(query_vector, dim, storage=storage)
+        conditions = [SearchRecord.embed_version == embed_version]
+        if filters is not None:
+            conditions.extend(filters.conditions())
+    conditions.extend([
+        or_(distance > last_distance, and_(distance == last_distance, record_id > last_id)),
+        # The previous page may have been ranked with slightly different float rounding (e.g. by the local engine)
+        record_id != last_id,
+    ])
+    return select(record_id.label("id"), distance.label("distance")).where(*conditions).order_by(
+        distance, record_id
+    ).limit(limit)
+
+
+async def next_page(
+    session: AsyncSession,
+    query_vector: Sequence[float],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    last_distance: float,
+    last_id: int,
+    filters: Optional[SearchFilters] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    storage: EmbeddingStorage = "vector",
+    offset: int = 0,
+    overfetch_factor: int = 10,
+) -> RankedIds:
+    """
+    The page after (last_distance, last_id), `offset` rows into the ranking.
+
+    The HNSW scan is sized to cover the `offset` rows already served as well as this page
+    (times `overfetch_factor` when filtered). Past HNSW_MAX_EF_SEARCH, or when the scan
+    still comes back short, the page is ranked exactly.
+    """
+    depth = offset + limit
+    if filters is not None and not filters.is_empty:
+        depth *= overfetch_factor
+    if depth <= HNSW_MAX_EF_SEARCH:
+        await apply_recall_settings(session, effective_ef_search(ef_search, depth), probes)
+        results = await session.execute(
+            next_page_query(query_vector, embed_version, limit, dim, last_distance, last_id, filters, storage)
+        )
+        ranked = [(row.id, row.distance) for row in results]
+        if len(ranked) == limit:
+            return ranked
+    results = await session.execute(
+        next_page_query(query_vector, embed_version, limit, dim, last_distance, last_id, filters, storage, exact=True)
+    )
+    return [(row.id, row.distance) for row in results]
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    return "[" + ",".join(repr(float(value)) for value in vector) + "]"
+
+
+def batch_nearest_query(
+    query_vectors: Sequence[Sequence[float]],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    filters: Optional[SearchFilters] = None,
+    storage: EmbeddingStorage = "vector",
+) -> Select:
+    """
+    Nearest neighbours of many query vectors in one statement: a LATERAL top-k per element
+    of the unnested query array, returning (query_index, id, distance).
+    """
+    queries = func.unnest(
+        bindparam("query_vectors", [vector_literal(vector) for vector in query_vectors], type_=ARRAY(Text))
+    ).table_valued("query_vector", with_ordinality="ordinality").render_derived(name="queries")
+    distance = embedding_expression(dim, storage=storage).max_inner_product(
+        cast(queries.c.query_vector, embedding_type(dim, storage))
+    )
+    conditions = [SearchRecord.embed_version == embed_version]
+    if filters is not None:
+        conditions.extend(filters.conditions())
+    nearest = select(SearchRecord.id, distance.label("distance")).where(*conditions).order_by(
+        distance
+    ).limit(limit).lateral("nearest")
+    return select(
+        (queries.c.ordinality - 1).label("query_index"), nearest.c.id, nearest.c.distance
+    ).select_from(queries).join(nearest, true()).order_by(queries.c.ordinality, nearest.c.distance)
+
+
+async def batch_nearest(
+    session: AsyncSession,
+    query_vectors: Sequence[Sequence[float]],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    filters: Optional[SearchFilters] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    overfetch_factor: int = 10,
+    storage: EmbeddingStorage = "vector",
+) -> List[RankedIds]:
+    # Filters are applied inside each ANN scan, so give the scan room to find `limit` matches
+    fetch_rows = limit if filters is None or filters.is_empty else limit * overfetch_factor
+    await apply_recall_settings(session, effective_ef_search(ef_search, fetch_rows), probes)
+    results = await session.execute(batch_nearest_query(query_vectors, embed_version, limit, dim, filters, storage))
+    ranked: List[RankedIds] = [[] for _ in query_vectors]
+    for row in results:
+        ranked[row.query_index].append((row.id, row.distance))
+    return ranked
+
+
+def similar_query(record_id: int, embed_version: str, limit: int, dim: int, storage: EmbeddingStorage = "vector") -> Select:
+    """
+    The nearest neighbours of a stored row, ranked against its own embedding.
+
+    The source embedding is an uncorrelated scalar subquery, which Postgres evaluates once
+    (an InitPlan) before the ordered ANN index scan. `embed_version` must be given as a
+    value, not read from the source row, so the planner can match the partial index. When
+    the source row does not exist in that version, the one-time filter yields no rows.
+    """
+    source = SearchRecord.__table__.alias("source")
+    source_embedding = select(embedding_expression(dim, source.c[embedding_column(storage).key], storage)).where(
+        source.c.id == record_id, source.c.embed_version == embed_version
+    ).scalar_subquery()
+    distance = embedding_expression(dim, storage=storage).max_inner_product(source_embedding)
+    return select(SearchRecord.id, distance.label("distance")).where(
+        source_embedding.is_not(None),
+        SearchRecord.embed_version == embed_version,
+        SearchRecord.id != record_id,
+    ).order_by(distance).limit(limit)
+
+
+async def similar(
+    session: AsyncSession,
+    record_id: int,
+    embed_version: str,
+    limit: int,
+    dim: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    storage: EmbeddingStorage = "vector",
+) -> RankedIds:
+    # One extra row, since the ANN scan still visits the source row before it is filtered out
+    await apply_recall_settings(session, effective_ef_search(ef_search, limit + 1), probes)
+    results = await session.execute(similar_query(record_id, embed_version, limit, dim, storage))
+    return [(row.id, row.distance) for row in results]
+
+
+LEXICAL_TS_CONFIG = "simple"
+
+
+def lexical_document() -> ColumnElement:
+    # Must match the expression of idx_search_records_lexical_tsv (V6) node for node, so the
+    # separators are inlined rather than bound as parameters
+    empty, space = literal_column("''"), literal_column("' '")
+    names = func.coalesce(SearchRecord.scientific_name, empty).op("||")(space).op("||")(
+        func.coalesce(SearchRecord.common_name, empty)
+    ).op("||")(space).op("||")(func.coalesce(SearchRecord.higher_taxon, empty))
+    return func.to_tsvector(literal_column(f"'{LEXICAL_TS_CONFIG}'::regconfig"), names)
+
+
+def lexical_query(query_text: str, embed_version: str, limit: int, filters: Optional[SearchFilters] = None) -> Select:
+    """
+    Rows whose names match `query_text`, best first, selecting (id, score).
+
+    A row matches on full-text tokens or on trigram similarity (`%`) with any of the name
+    columns, so both exact binomials and misspellings are found through the V6 GIN indexes.
+    """
+    ts_query = func.websearch_to_tsquery(literal_column(f"'{LEXICAL_TS_CONFIG}'::regconfig"), query_text)
+    document = lexical_document()
+    columns = (SearchRecord.scientific_name, SearchRecord.common_name, SearchRecord.higher_taxon)
+    score = func.ts_rank_cd(document, ts_query) + func.greatest(*(func.similarity(column, query_text) for column in columns))
+    conditions = [
+        SearchRecord.embed_version == embed_version,
+        or_(document.op("@@")(ts_query), *(column.op("%")(query_text) for column in columns)),
+    ]
+    if filters is not None:
+        conditions.extend(filters.conditions())
+    return select(SearchRecord.id, score.label("score")).where(*conditions).order_by(
+        score.desc(), SearchRecord.id
+    ).limit(limit)
+
+
+def hybrid_query(
+    query_text: str,
+    query_vector: Sequence[float],
+    embed_version: str,
+    limit: int,
+    dim: int,
+    candidates: int = 100,
+    rrf_k: int = 60,
+    filters: Optional[SearchFilters] = None,
+    strategy: FilterStrategy = "prefilter",
+    overfetch_factor: int = 10,
+    storage: EmbeddingStorage = "vector",
+) -> Select:
+    """
+    Lexical and vector candidates fused by reciprocal rank in one statement, selecting (id, distance).
+
+    Each side contributes its `candidates` best rows; a row scores sum(1 / (rrf_k + rank))
+    over the sides that found it. `distance` is the negated score, so the result orders
+    like the vector-only queries (smallest first).
+    """
+    vector = nearest_query(
+        query_vector, embed_version, candidates, dim, filters, strategy, overfetch_factor, storage
+    ).subquery("vector_candidates")
+    lexical = lexical_query(query_text, embed_version, candidates, filters).subquery("lexical_candidates")
+    fused = union_all(
+        select(vector.c.id, func.row_number().over(order_by=(vector.c.distance, vector.c.id)).label("rank")),
+        select(lexical.c.id, func.row_number().over(order_by=(lexical.c.score.desc(), lexical.c.id)).label("rank")),
+    ).subquery("fused")
+    score = cast(func.sum(literal_column("1.0").op("/")((literal_column(str(int(rrf_k))) + fused.c.rank).self_group())), Float)
+    return select(fused.c.id, (-score).label("distance")).group_by(fused.c.id).order_by(
+        score.desc(), fused.c.id
+    ).limit(limit)
+
+
+class FilterPlanner:
+    """
+    Chooses between pre-filtering and over-fetch post-filtering for a filtered search.
+
+    Selectivity is measured with a count capped at `prefilter_max_rows + 1` (cheap with the
+    composite and GiST indexes) and remembered per (embed_version, filters) for `ttl_seconds`.
+    Every query it runs searches the `storage` embedding column.
+    """
+
+    def __init__(
+        self,
+        prefilter_max_rows: int = 20_000,
+        overfetch_factor: int = 10,
+        ttl_seconds: float = 300,
+        storage: EmbeddingStorage = "vector",
+    ) -> None:
+        self.prefilter_max_rows = prefilter_max_rows
+        self.overfetch_factor = overfetch_factor
+        self.storage = storage
+        self.matches: TTLCache[int] = TTLCache(10_000, ttl_seconds)
+        self.counts: Dict[str, int] = {"prefilter": 0, "postfilter": 0, "postfilter_fallback": 0}
+
+    async def matching_rows(self, session: AsyncSession, embed_version: str, filters: SearchFilters) -> int:
+        key = (embed_version, filters.cache_key())
+        matches = self.matches.get(key)
+        if matches is None:
+            capped = select(literal(1)).select_from(SearchRecord).where(
+                SearchRecord.embed_version == embed_version, *filters.conditions()
+            ).limit(self.prefilter_max_rows + 1).subquery()
+            matches = (await session.execute(select(func.count()).select_from(capped))).scalar_one()
+            self.matches.set(key, matches)
+        return matches
+
+    async def strategy(self, session: AsyncSession, embed_version: str, filters: SearchFilters) -> FilterStrategy:
+        matches = await self.matching_rows(session, embed_version, filters)
+        return "prefilter" if matches <= self.prefilter_max_rows else "postfilter"
+
+    async def nearest(
+        self,
+        session: AsyncSession,
+        query_vector: Sequence[float],
+        embed_version: str,
+        limit: int,
+        dim: int,
+        filters: Optional[SearchFilters] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> RankedIds:
+        if filters is None or filters.is_empty:
+            await apply_recall_settings(session, effective_ef_search(ef_search, limit), probes)
+            results = await session.execute(nearest_query(query_vector, embed_version, limit, dim, storage=self.storage))
+            return [(row.id, row.distance) for row in results]
+
+        strategy = await self.strategy(session, embed_version, filters)
+        if strategy == "postfilter":
+            fetch_rows = limit * self.overfetch_factor
+            await apply_recall_settings(session, effective_ef_search(ef_search, fetch_rows), probes)
+            results = await session.execute(
+                nearest_query(
+                    query_vector, embed_version, limit, dim, filters, "postfilter", self.overfetch_factor, self.storage
+                )
+            )
+            ranked = [(row.id, row.distance) for row in results]
+            self.counts["postfilter"] += 1
+            if len(ranked) == limit:
+                return ranked
+            # Too few of the over-fetched neighbours passed the filters; rank the matches exactly instead
+            self.counts["postfilter_fallback"] += 1
+
+        results = await session.execute(nearest_query(
+            query_vector, embed_version, limit, dim, filters, "prefilter", storage=self.storage
+        ))
+        self.counts["prefilter"] += 1
+        return [(row.id, row.distance) for row in results]
+
+    async def hybrid(
+        self,
+        session: AsyncSession,
+        query_text: str,
+        query_vector: Sequence[float],
+        embed_version: str,
+        limit: int,
+        dim: int,
+        candidates: int,
+        rrf_k: int,
+        filters: Optional[SearchFilters] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> RankedIds:
+        """Reciprocal rank fusion of lexical and vector candidates, in a single round-trip."""
+        candidates = max(candidates, limit)
+        strategy: FilterStrategy = "prefilter"
+        fetch_rows = candidates
+        if filters is not None and not filters.is_empty:
+            strategy = await self.strategy(session, embed_version, filters)
+            if strategy == "postfilter":
+                fetch_rows = candidates * self.overfetch_factor
+            self.counts[strategy] += 1
+        await apply_recall_settings(session, effective_ef_search(ef_search, fetch_rows), probes)
+        results = await session.execute(hybrid_query(
+            query_text, query_vector, embed_version, limit, dim, candidates, rrf_k, filters, strategy,
+            self.overfetch_factor, self.storage,
+        ))
+        return [(row.id, row.distance) for row in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "cached_selectivities": len(self.matches)}
@@ -0,0 +1,171 @@
+"""
+Build, drop and list per-embed_version ANN indexes on search_records.
+
+Each index is an expression index over `embedding::vector(dim)` (or, with `--storage
+halfvec`, `embedding_half::halfvec(dim)`) on one embed_version's partition (V8), so
+versions can be indexed (and rebuilt) independently. New partitions get an HNSW index
+with the default parameters when they are created; use `build` after `drop` to change
+them, or for IVFFlat. Run from `backend/`:
+
+    python -m tools.ann_indexes build --embed-version default
+    python -m tools.ann_indexes build --embed-version default --method ivfflat --lists 1000
+    python -m tools.ann_indexes list
+    python -m tools.ann_indexes drop --embed-version default
+"""
+import argparse
+import asyncio
+import logging
+import math
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config.settings import Settings
+from services.vector_search import ANN_METHODS, EmbeddingStorage, ann_index_name, partition_name
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_index_sql(
+    embed_version: str,
+    method: str,
+    dim: int,
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    concurrently: bool = True,
+    storage: EmbeddingStorage = "vector",
+) -> str:
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == "ivfflat":
+        options = f"lists = {int(lists)}"
+    else:
+        raise ValueError(f"Unknown ANN method: {method}")
+    column = "_half" if storage == "halfvec" else ""
+
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {ann_index_name(embed_version, method, storage)} "
+        f"ON {partition_name(embed_version)} USING {method} ((embedding{column}::{storage}({int(dim)})) {storage}_ip_ops) "
+        f"WITH ({options})"
+    )
+
+
+async def count_rows(engine: AsyncEngine, embed_version: str) -> int:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT count(*) FROM search_records WHERE embed_version = :embed_version"),
+            {"embed_version": embed_version},
+        )
+        return result.scalar_one()
+
+
+async def build(
+    engine: AsyncEngine,
+    embed_version: str,
+    method: str,
+    dim: int,
+    m: int,
+    ef_construction: int,
+    lists: Optional[int],
+    maintenance_work_mem: Optional[str],
+    concurrently: bool,
+    storage: EmbeddingStorage = "vector",
+) -> None:
+    rows = await count_rows(engine, embed_version)
+    if rows == 0:
+        logger.warning(f"No rows for embed_version {embed_version!r}; the index will be empty")
+    if method == "ivfflat" and lists is None:
+        # pgvector's recommendation: rows / 1000 up to 1M rows, sqrt(rows) above that
+        lists = max(10, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+
+    async with engine.connect() as conn:
+        # A version with no rows yet may have no partition either
+        await conn.execute(
+            text("SELECT ensure_search_records_partition(:embed_version, :dim, :storage, false)"),
+            {"embed_version": embed_version, "dim": dim, "storage": storage},
+        )
+    statement = build_index_sql(embed_version, method, dim, m, ef_construction, lists or 100, concurrently, storage)
+    logger.info(f"Building {method} index over {rows} rows: {statement}")
+
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        if maintenance_work_mem:
+            await conn.execute(text(f"SET maintenance_work_mem = {quote_literal(maintenance_work_mem)}"))
+        await conn.execute(text(statement))
+    logger.info(f"Built {ann_index_name(embed_version, method, storage)} in {time.perf_counter() - started:.1f}s")
+
+
+async def drop(
+    engine: AsyncEngine, embed_version: str, method: str, concurrently: bool, storage: EmbeddingStorage = "vector"
+) -> None:
+    name = ann_index_name(embed_version, method, storage)
+    async with engine.connect() as conn:
+        await conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}"))
+    logger.info(f"Dropped {name}")
+
+
+async def list_indexes(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT indexname, pg_size_pretty(pg_relation_size(indexname::regclass)), indexdef "
+            "FROM pg_indexes "
+            "WHERE tablename LIKE 'search\\_records\\_%' AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%') "
+            "ORDER BY indexname"
+        ))
+        for name, size, definition in result.all():
+            print(f"{name}\t{size}\t{definition}")
+
+
+async def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Manage per-embed_version ANN indexes on search_records")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build an ANN index for one embed_version")
+    build_parser.add_argument("--embed-version", default="default")
+    build_parser.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    build_parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    build_parser.add_argument("--m", type=int, default=16, help="HNSW: max connections per layer")
+    build_parser.add_argument("--ef-construction", type=int, default=64, help="HNSW: candidate list size while building")
+    build_parser.add_argument("--lists", type=int, default=None, help="IVFFlat: number of lists (default derived from row count)")
+    build_parser.add_argument("--maintenance-work-mem", default=None, help="e.g. 2GB; the build is much faster when the graph fits")
+    build_parser.add_argument("--no-concurrently", dest="concurrently", action="store_false", help="Lock the table instead of building concurrently")
+    build_parser.add_argument("--storage", choices=("vector", "halfvec"), default=settings.embedding_storage, help="Embedding column to index")
+
+    drop_parser = subparsers.add_parser("drop", help="Drop the ANN index for one embed_version")
+    drop_parser.add_argument("--embed-version", default="default")
+    drop_parser.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    drop_parser.add_argument("--no-concurrently", dest="concurrently", action="store_false")
+    drop_parser.add_argument("--storage", choices=("vector", "halfvec"), default=settings.embedding_storage)
+
+    subparsers.add_parser("list", help="List existing ANN indexes")
+
+    args = parser.parse_args()
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    engine = create_async_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+    try:
+        if args.command == "build":
+            await build(
+                engine, args.embed_version, args.method, args.dim, args.m, args.ef_construction,
+                args.lists, args.maintenance_work_mem, args.concurrently, args.storage,
+            )
+        elif args.command == "drop":
+            await drop(engine, args.embed_version, args.method, args.concurrently, args.storage)
+        else:
+            await list_indexes(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Move embed_versions ingested before V7 onto half-precision (`embedding_half`) storage.
+Run from `backend/`:
+
+    python -m tools.halfvec status
+    python -m tools.halfvec backfill --embed-version default
+    python -m tools.halfvec release --embed-version default
+
+`backfill` fills `embedding_half` from `embedding` in small batches (each its own
+transaction, so it can be interrupted and resumed) and then builds the version's halfvec
+HNSW index; after that, EMBEDDING_STORAGE=halfvec can be switched on. `release` is the
+optional last step once every backend searches halfvec: it drops the float32 index and
+clears `embedding`, which is where the disk saving comes from.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config.settings import Settings
+from tools.ann_indexes import build as build_ann_index, drop as drop_ann_index
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SQL = text(
+    "UPDATE search_records SET embedding_half = embedding::halfvec "
+    "WHERE id IN ("
+    "  SELECT id FROM search_records"
+    "  WHERE embed_version = :embed_version AND embedding_half IS NULL AND embedding IS NOT NULL"
+    "  LIMIT :batch_size"
+    ")"
+)
+
+
+async def backfill(engine: AsyncEngine, embed_version: str, dim: int, batch_size: int, index: bool) -> None:
+    started = time.perf_counter()
+    total = 0
+    while True:
+        async with engine.connect() as conn:
+            result = await conn.execute(BACKFILL_BATCH_SQL, {"embed_version": embed_version, "batch_size": batch_size})
+        if result.rowcount == 0:
+            break
+        total += result.rowcount
+        logger.info(f"{embed_version}: {total} rows converted ({time.perf_counter() - started:.1f}s)")
+    logger.info(f"Backfilled {total} rows of {embed_version} in {time.perf_counter() - started:.1f}s")
+
+    if index:
+        await build_ann_index(engine, embed_version, "hnsw", dim, 16, 64, None, None, concurrently=True, storage="halfvec")
+
+
+async def release(engine: AsyncEngine, embed_version: str, batch_size: int) -> None:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT count(*) FROM search_records "
+                "WHERE embed_version = :embed_version AND embedding IS NOT NULL AND embedding_half IS NULL"
+            ),
+            {"embed_version": embed_version},
+        )
+        missing = result.scalar_one()
+    if missing:
+        raise SystemExit(f"{missing} rows of {embed_version} have no embedding_half yet; run backfill first")
+
+    await drop_ann_index(engine, embed_version, "hnsw", concurrently=True, storage="vector")
+    await drop_ann_index(engine, embed_version, "ivfflat", concurrently=True, storage="vector")
+    total = 0
+    while True:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "UPDATE search_records SET embedding = NULL WHERE id IN ("
+                    "  SELECT id FROM search_records WHERE embed_version = :embed_version AND embedding IS NOT NULL"
+                    "  LIMIT :batch_size"
+                    ")"
+                ),
+                {"embed_version": embed_version, "batch_size": batch_size},
+            )
+        if result.rowcount == 0:
+            break
+        total += result.rowcount
+    logger.info(f"Cleared the float32 embeddings of {total} rows of {embed_version}; VACUUM reclaims the space")
+
+
+async def status(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT embed_version, count(*), count(embedding), count(embedding_half), "
+            "pg_size_pretty(coalesce(sum(pg_column_size(embedding)), 0)), "
+            "pg_size_pretty(coalesce(sum(pg_column_size(embedding_half)), 0)) "
+            "FROM search_records GROUP BY embed_version ORDER BY embed_version"
+        ))
+        print(f"{'embed_version':<24}{'rows':>10}{'vector':>10}{'halfvec':>10}{'vector size':>14}{'halfvec size':>14}")
+        for embed_version, rows, vectors, halves, vector_size, half_size in result.all():
+            print(f"{embed_version:<24}{rows:>10}{vectors:>10}{halves:>10}{vector_size:>14}{half_size:>14}")
+
+
+async def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Backfill and cut over to half-precision embedding storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = subparsers.add_parser("backfill", help="Fill embedding_half for one embed_version and index it")
+    backfill_parser.add_argument("--embed-version", default="default")
+    backfill_parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    backfill_parser.add_argument("--batch-size", type=int, default=5000)
+    backfill_parser.add_argument("--no-index", dest="index", action="store_false", help="Skip building the halfvec HNSW index")
+
+    release_parser = subparsers.add_parser("release", help="Drop the float32 index and embeddings of one embed_version")
+    release_parser.add_argument("--embed-version", default="default")
+    release_parser.add_argument("--batch-size", type=int, default=5000)
+
+    subparsers.add_parser("status", help="Show per-version row counts and column sizes")
+
+    args = parser.parse_args()
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block; each batch commits on its own
+    engine = create_async_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+    try:
+        if args.command == "backfill":
+            await backfill(engine, args.embed_version, args.dim, args.batch_size, args.index)
+        elif args.command == "release":
+            await release(engine, args.embed_version, args.batch_size)
+        else:
+            await status(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
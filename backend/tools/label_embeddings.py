@@ -0,0 +1,74 @@
+"""
+Build the label-embedding matrices behind /api/classify ahead of time, so the backend's
+first classification does not wait for every name to be encoded. Run from `backend/`:
+
+    python -m tools.label_embeddings build
+    python -m tools.label_embeddings build --model-name ViT-L-14 --model-pretrained laion2b_s32b_b82k
+    python -m tools.label_embeddings status
+
+`build` encodes only the names that are not in the stored matrices yet, so re-running it
+after an ingest is cheap; running backends append new names on their own as well.
+"""
+import argparse
+import asyncio
+import logging
+
+import torch
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config.settings import Settings
+from services.label_embeddings import LabelMatrix, ZeroShotClassifier, label_dir
+from services.model_registry import ModelRegistry, ModelSpec
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def build(settings: Settings, spec: ModelSpec) -> None:
+    device = torch.device("cuda" if torch.cuda.is_available() and settings.inference_backend == "torch" else "cpu")
+    engine = create_async_engine(settings.database_url)
+    models = ModelRegistry(settings, device, max_resident=1)
+    try:
+        classifier = ZeroShotClassifier(
+            engine, models, settings.classify_label_dir, settings.classify_ranks, settings.classify_prompt_template
+        )
+        encoded = await classifier.refresh(spec)
+        logger.info(f"Encoded {encoded} new labels for {spec.name}/{spec.pretrained}")
+    finally:
+        await models.close()
+        await engine.dispose()
+
+
+def status(settings: Settings, spec: ModelSpec) -> None:
+    directory = label_dir(settings.classify_label_dir, spec)
+    print(f"{directory}")
+    for rank in settings.classify_ranks:
+        matrix = LabelMatrix.load(directory, rank)
+        if matrix is None:
+            print(f"  {rank:<16} not built")
+        else:
+            stale = "" if matrix.template == settings.classify_prompt_template else " (other template; will be rebuilt)"
+            print(f"  {rank:<16} {len(matrix.labels):>8} labels  token {matrix.token}{stale}")
+
+
+async def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Manage the label-embedding matrices used by /api/classify")
+    parser.add_argument("--model-name", default=settings.model_name)
+    parser.add_argument("--model-pretrained", default=settings.model_pretrained)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="Encode the names missing from the matrices of one model")
+    subparsers.add_parser("status", help="Show the stored matrices of one model")
+
+    args = parser.parse_args()
+    spec = ModelSpec(args.model_name, args.model_pretrained)
+
+    if args.command == "build":
+        await build(settings, spec)
+    else:
+        status(settings, spec)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
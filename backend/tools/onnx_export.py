@@ -0,0 +1,116 @@
+"""
+Export the configured open_clip model (MODEL_NAME / MODEL_PRETRAINED) to ONNX for the
+CPU inference backend (`INFERENCE_BACKEND=onnx`). Run from `backend/`:
+
+    python -m tools.onnx_export export --quantize
+
+The text and image towers are written to ONNX_MODEL_DIR/<model>--<pretrained>/, with
+dynamically int8-quantized copies when `--quantize` is given. `parity` checks the exported
+towers against the torch model by cosine similarity of their embeddings, on sample queries
+and on the images in `--image-dir` (random pixels when none is given), and exits non-zero
+if any falls below `--min-cosine`:
+
+    python -m tools.onnx_export parity --int8 --image-dir ./sample_images
+
+Other models served through the model registry are exported with `--model-name` and
+`--model-pretrained`.
+"""
+import argparse
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import open_clip
+import torch
+from PIL import Image
+
+from config.settings import Settings
+from services.onnx_encoder import OnnxCLIP, artifact_dir, export_towers
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUERIES = [
+    "a frog",
+    "pressed fern specimen on herbarium paper",
+    "pinned blue morpho butterfly",
+    "skull of a small rodent, lateral view",
+    "Quercus alba",
+    "bird with a red crest perched on a branch",
+    "lichen on bark",
+    "jar of preserved fish in ethanol",
+]
+
+
+def sample_pixels(preprocess, image_size, image_dir: Optional[str], count: int) -> torch.Tensor:
+    if image_dir is None:
+        return torch.randn(count, 3, *image_size)
+    paths = sorted(path for path in Path(image_dir).iterdir() if path.is_file())[:count]
+    if not paths:
+        raise SystemExit(f"No images in {image_dir}")
+    return torch.stack([preprocess(Image.open(path).convert("RGB")) for path in paths])
+
+
+def cosine(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    return torch.nn.functional.cosine_similarity(a.float(), b.float(), dim=-1)
+
+
+def parity(settings: Settings, directory: Path, int8: bool, image_dir: Optional[str], images: int, min_cosine: float) -> bool:
+    model, _, preprocess = open_clip.create_model_and_transforms(settings.model_name, pretrained=settings.model_pretrained)
+    model = model.float().eval()
+    tokenizer = open_clip.get_tokenizer(settings.model_name)
+    onnx_model = OnnxCLIP(directory, quantized=int8)
+
+    tokens = tokenizer(SAMPLE_QUERIES)
+    pixels = sample_pixels(preprocess, model.visual.image_size, image_dir, images)
+    with torch.no_grad():
+        results = [
+            ("text", cosine(model.encode_text(tokens), onnx_model.encode_text(tokens))),
+            ("image", cosine(model.encode_image(pixels), onnx_model.encode_image(pixels))),
+        ]
+
+    print(f"{settings.model_name}/{settings.model_pretrained} {'int8' if int8 else 'float32'} ONNX vs torch")
+    print(f"{'tower':<8}{'inputs':>8}{'min cos':>10}{'mean cos':>10}")
+    passed = True
+    for tower, similarities in results:
+        print(f"{tower:<8}{len(similarities):>8}{similarities.min().item():>10.5f}{similarities.mean().item():>10.5f}")
+        passed &= similarities.min().item() >= min_cosine
+    return passed
+
+
+def export(settings: Settings, directory: Path, quantize: bool, opset: int) -> List[Path]:
+    model, _, _ = open_clip.create_model_and_transforms(settings.model_name, pretrained=settings.model_pretrained)
+    tokenizer = open_clip.get_tokenizer(settings.model_name)
+    return export_towers(model, tokenizer, directory, quantize=quantize, opset=opset)
+
+
+def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Export and check ONNX query encoders")
+    parser.add_argument("--onnx-model-dir", default=settings.onnx_model_dir)
+    parser.add_argument("--model-name", default=settings.model_name, help="Export another model for the model registry")
+    parser.add_argument("--model-pretrained", default=settings.model_pretrained)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the text and image towers to ONNX")
+    export_parser.add_argument("--quantize", action="store_true", help="Also write dynamically int8-quantized towers")
+    export_parser.add_argument("--opset", type=int, default=17)
+
+    parity_parser = subparsers.add_parser("parity", help="Compare ONNX and torch embeddings by cosine similarity")
+    parity_parser.add_argument("--int8", action="store_true", help="Check the int8-quantized towers")
+    parity_parser.add_argument("--image-dir", default=None)
+    parity_parser.add_argument("--images", type=int, default=16)
+    parity_parser.add_argument("--min-cosine", type=float, default=0.99)
+
+    args = parser.parse_args()
+    settings = settings.model_copy(update={"model_name": args.model_name, "model_pretrained": args.model_pretrained})
+    directory = artifact_dir(args.onnx_model_dir, settings.model_name, settings.model_pretrained)
+
+    if args.command == "export":
+        export(settings, directory, args.quantize, args.opset)
+    elif not parity(settings, directory, args.int8, args.image_dir, args.images, args.min_cosine):
+        raise SystemExit(f"Cosine similarity below {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Manage the per-embed_version partitions of search_records (V8). Run from `backend/`:
+
+    python -m tools.partitions list
+    python -m tools.partitions create --embed-version my_experiment
+    python -m tools.partitions detach --embed-version my_experiment
+    python -m tools.partitions attach --embed-version my_experiment
+    python -m tools.partitions drop --embed-version my_experiment
+
+The ingestor creates partitions itself on first write, so `create` is only needed to
+pre-create one (e.g. with `--no-index` before a bulk load). `detach` takes a version out
+of search without touching its rows: the partition becomes a standalone table, with its
+indexes, that can be dumped, attached again or dropped. Each of these bumps the version's
+generation, so cached search results for it are dropped.
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config.settings import Settings
+from services.vector_search import partition_name
+from tools.ann_indexes import quote_literal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUMP_GENERATION_SQL = text(
+    "INSERT INTO embed_version_generations (embed_version, generation) VALUES (:embed_version, 1) "
+    "ON CONFLICT (embed_version) DO UPDATE SET generation = embed_version_generations.generation + 1, updated_at = now()"
+)
+
+
+async def is_attached(engine: AsyncEngine, embed_version: str) -> bool:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT search_records_partition_attached(:name)"),
+            {"name": partition_name(embed_version)},
+        )
+        return result.scalar_one()
+
+
+async def bump_generation(engine: AsyncEngine, embed_version: str) -> None:
+    async with engine.connect() as conn:
+        await conn.execute(BUMP_GENERATION_SQL, {"embed_version": embed_version})
+
+
+async def create(engine: AsyncEngine, embed_version: str, dim: int, storage: str, index: bool) -> None:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT ensure_search_records_partition(:embed_version, :dim, :storage, :index)"),
+            {"embed_version": embed_version, "dim": dim, "storage": storage, "index": index},
+        )
+        logger.info(f"Partition {result.scalar_one()} is in place")
+
+
+async def detach(engine: AsyncEngine, embed_version: str, concurrently: bool) -> None:
+    name = partition_name(embed_version)
+    if not await is_attached(engine, embed_version):
+        raise SystemExit(f"{name} is not an attached partition of search_records")
+    async with engine.connect() as conn:
+        await conn.execute(text(f"ALTER TABLE search_records DETACH PARTITION {name}{' CONCURRENTLY' if concurrently else ''}"))
+    await bump_generation(engine, embed_version)
+    logger.info(f"Detached {name}; its rows are no longer searchable")
+
+
+async def attach(engine: AsyncEngine, embed_version: str) -> None:
+    name = partition_name(embed_version)
+    if await is_attached(engine, embed_version):
+        raise SystemExit(f"{name} is already attached")
+    async with engine.connect() as conn:
+        # Validating the partition constraint scans the table once; the parent's indexes attach to the existing ones
+        await conn.execute(
+            text(f"ALTER TABLE search_records ATTACH PARTITION {name} FOR VALUES IN ({quote_literal(embed_version)})")
+        )
+    await bump_generation(engine, embed_version)
+    logger.info(f"Attached {name}")
+
+
+async def drop(engine: AsyncEngine, embed_version: str) -> None:
+    name = partition_name(embed_version)
+    if await is_attached(engine, embed_version):
+        await detach(engine, embed_version, concurrently=True)
+    async with engine.connect() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    logger.info(f"Dropped {name}")
+
+
+async def list_partitions(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint, "
+            "pg_size_pretty(pg_total_relation_size(child.oid)) "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'search_records'::regclass "
+            "ORDER BY child.relname"
+        ))
+        for name, bound, rows, size in result.all():
+            print(f"{name}\t{bound}\t~{max(rows, 0)} rows\t{size}")
+
+
+async def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Manage the per-embed_version partitions of search_records")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Create the partition (and HNSW index) for one embed_version")
+    create_parser.add_argument("--embed-version", required=True)
+    create_parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    create_parser.add_argument("--storage", choices=("vector", "halfvec"), default=settings.embedding_storage, help="Embedding column to index")
+    create_parser.add_argument("--no-index", dest="index", action="store_false", help="Build the ANN index later, e.g. after a bulk load")
+
+    detach_parser = subparsers.add_parser("detach", help="Take one embed_version out of search_records, keeping its table")
+    detach_parser.add_argument("--embed-version", required=True)
+    detach_parser.add_argument("--no-concurrently", dest="concurrently", action="store_false", help="Lock search_records instead of detaching concurrently")
+
+    attach_parser = subparsers.add_parser("attach", help="Put a detached embed_version back into search_records")
+    attach_parser.add_argument("--embed-version", required=True)
+
+    drop_parser = subparsers.add_parser("drop", help="Detach and drop one embed_version's partition")
+    drop_parser.add_argument("--embed-version", required=True)
+
+    subparsers.add_parser("list", help="List partitions with their size")
+
+    args = parser.parse_args()
+
+    # DETACH PARTITION CONCURRENTLY cannot run inside a transaction block
+    engine = create_async_engine(settings.database_url, isolation_level="AUTOCOMMIT")
+    try:
+        if args.command == "create":
+            await create(engine, args.embed_version, args.dim, args.storage, args.index)
+        elif args.command == "detach":
+            await detach(engine, args.embed_version, args.concurrently)
+        elif args.command == "attach":
+            await attach(engine, args.embed_version)
+        elif args.command == "drop":
+            await drop(engine, args.embed_version)
+        else:
+            await list_partitions(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
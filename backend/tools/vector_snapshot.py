@@ -0,0 +1,282 @@
+"""
+Export an embed_version's embeddings from search_records into a memory-mapped snapshot
+for the local search engine (`SEARCH_ENGINE=local`). Run from `backend/`:
+
+    python -m tools.vector_snapshot export --embed-version default
+
+The snapshot is written next to the previous ones and then published by atomically
+replacing the version's CURRENT pointer, so running backends pick it up on their next
+refresh without a restart.
+
+Quantized codes for `LOCAL_ENGINE_COMPRESSION` are built before publishing with
+`export --compress`, or added to the current snapshot with `compress`, which publishes
+them as a new snapshot (hard-linking the unchanged files) so running backends reload it.
+`evaluate` reports their memory footprint and recall@k against exact l2 search over the
+same rows:
+
+    python -m tools.vector_snapshot export --embed-version default --compress pq
+    python -m tools.vector_snapshot compress --embed-version default --method pq --subspaces 64
+    python -m tools.vector_snapshot evaluate --embed-version default --method pq --k 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import cast, func
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+
+from config.settings import Settings
+from models.search_record import SearchRecord
+from services.local_engine import (
+    CURRENT_POINTER,
+    EMBEDDINGS_FILE,
+    IDS_FILE,
+    snapshot_version_dir,
+    write_snapshot_pointer,
+)
+from services.quantization import CompressedVectors, ProductQuantizer, ScalarQuantizer, best_k
+from services.vector_search import EmbeddingStorage, embedding_column
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CompressionOptions(NamedTuple):
+    method: str
+    subspaces: int = 64
+    iterations: int = 20
+    train_size: int = 100_000
+
+
+async def export(
+    database_url: str,
+    snapshot_dir: str,
+    embed_version: str,
+    dim: int,
+    batch_size: int,
+    keep: int,
+    storage: EmbeddingStorage = "vector",
+    compression: Optional[CompressionOptions] = None,
+) -> Path:
+    version_dir = snapshot_version_dir(snapshot_dir, embed_version)
+    version_dir.mkdir(parents=True, exist_ok=True)
+    snapshot_id = new_snapshot_id()
+    path = version_dir / snapshot_id
+    path.mkdir()
+
+    column = embedding_column(storage)
+    condition = (SearchRecord.embed_version == embed_version) & (column.is_not(None))
+    engine = create_async_engine(database_url)
+    started = time.perf_counter()
+    try:
+        # One REPEATABLE READ transaction so the row count and the streamed rows agree
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            count = (await conn.execute(select(func.count()).select_from(SearchRecord).where(condition))).scalar_one()
+            ids = np.lib.format.open_memmap(path / IDS_FILE, mode="w+", dtype=np.int64, shape=(count,))
+            embeddings = np.lib.format.open_memmap(path / EMBEDDINGS_FILE, mode="w+", dtype=np.float32, shape=(count, dim))
+
+            offset = 0
+            result = await conn.stream(
+                # Cast so halfvec rows also arrive as float32 vectors
+                select(SearchRecord.id, cast(column, Vector(dim))).where(condition).order_by(SearchRecord.id),
+                execution_options={"yield_per": batch_size},
+            )
+            async for rows in result.partitions():
+                for record_id, embedding in rows:
+                    ids[offset] = record_id
+                    embeddings[offset] = embedding
+                    offset += 1
+                logger.info(f"Exported {offset}/{count} embeddings")
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    finally:
+        await engine.dispose()
+
+    ids.flush()
+    embeddings.flush()
+    del ids, embeddings
+
+    if compression is not None:
+        try:
+            compress_snapshot(path, compression)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    publish(version_dir, snapshot_id, keep)
+    logger.info(f"Published snapshot {path} ({count} x {dim}) in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def new_snapshot_id() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def publish(version_dir: Path, snapshot_id: str, keep: int) -> None:
+    """Point CURRENT at a complete snapshot directory and prune all but `keep` older ones."""
+    write_snapshot_pointer(version_dir, snapshot_id)
+    # Older snapshots stay mapped by running backends until they refresh, so keep a few around
+    previous = sorted(p for p in version_dir.iterdir() if p.is_dir() and p.name != snapshot_id)
+    for stale in previous[:max(0, len(previous) - keep)]:
+        shutil.rmtree(stale, ignore_errors=True)
+        logger.info(f"Removed old snapshot {stale}")
+
+
+def current_snapshot_path(snapshot_dir: str, embed_version: str) -> Path:
+    version_dir = snapshot_version_dir(snapshot_dir, embed_version)
+    return version_dir / (version_dir / CURRENT_POINTER).read_text().strip()
+
+
+def train_sample(embeddings: np.ndarray, train_size: int, rng: np.random.Generator) -> np.ndarray:
+    if embeddings.shape[0] <= train_size:
+        return np.asarray(embeddings)
+    return np.asarray(embeddings[np.sort(rng.choice(embeddings.shape[0], train_size, replace=False))])
+
+
+def compress_snapshot(path: Path, options: CompressionOptions) -> CompressedVectors:
+    """Train a quantizer on the snapshot at `path` and write its codes there; `path` must not be published yet."""
+    embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+    sample = train_sample(embeddings, options.train_size, np.random.default_rng(0))
+
+    started = time.perf_counter()
+    if options.method == "pq":
+        quantizer = ProductQuantizer.train(sample, subspaces=options.subspaces, iterations=options.iterations)
+    else:
+        quantizer = ScalarQuantizer.train(sample)
+    logger.info(f"Trained {options.method} quantizer on {sample.shape[0]} vectors in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    compressed = CompressedVectors.build(quantizer, embeddings)
+    compressed.save(path)
+    logger.info(f"Encoded {embeddings.shape[0]} vectors into {path} in {time.perf_counter() - started:.1f}s")
+    return compressed
+
+
+def compress(snapshot_dir: str, embed_version: str, options: CompressionOptions, keep: int) -> Path:
+    """
+    Add codes to the current snapshot by publishing a copy of it under a new snapshot id.
+
+    Running backends only reload when CURRENT changes, and may have the current snapshot
+    mapped, so it is never modified in place; its files are hard-linked into the copy.
+    """
+    current = current_snapshot_path(snapshot_dir, embed_version)
+    version_dir = current.parent
+    snapshot_id = new_snapshot_id()
+    path = version_dir / snapshot_id
+    path.mkdir()
+    try:
+        replaced = {replaced_path.name for replaced_path in CompressedVectors.paths(path, options.method)}
+        for source in current.iterdir():
+            if source.name in replaced or source.name.startswith("."):
+                continue
+            try:
+                os.link(source, path / source.name)
+            except OSError:
+                shutil.copy2(source, path / source.name)
+        compress_snapshot(path, options)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    publish(version_dir, snapshot_id, keep)
+    logger.info(f"Published snapshot {path} with {options.method} codes, replacing {current.name}")
+    return path
+
+
+def exact_l2_top_k(embeddings: np.ndarray, squared_norms: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2; the last term does not change the order
+    return best_k(2 * (embeddings @ query) - squared_norms, k)
+
+
+def evaluate(snapshot_dir: str, embed_version: str, method: str, k: int, queries: int, rerank_factor: int) -> None:
+    path = current_snapshot_path(snapshot_dir, embed_version)
+    embeddings = np.asarray(np.load(path / EMBEDDINGS_FILE, mmap_mode="r"))
+    compressed = CompressedVectors.load(path, method)
+    if compressed is None:
+        raise SystemExit(f"No {method} codes in {path}; run `compress` first")
+
+    rng = np.random.default_rng(1)
+    sample = embeddings[rng.choice(embeddings.shape[0], min(queries, embeddings.shape[0]), replace=False)]
+    squared_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+    truth = [set(exact_l2_top_k(embeddings, squared_norms, query, k).tolist()) for query in sample]
+
+    print(f"embed_version={embed_version} rows={embeddings.shape[0]} dim={embeddings.shape[1]} k={k} queries={len(sample)}")
+    print(f"{'variant':<24}{'resident MiB':>14}{'recall@k':>10}{'mean ms':>10}{'p99 ms':>10}")
+
+    def report(name: str, resident_bytes: int, search) -> None:
+        recalls, latencies = [], []
+        for query, expected in zip(sample, truth):
+            started = time.perf_counter()
+            found = search(query)
+            latencies.append(1000 * (time.perf_counter() - started))
+            recalls.append(len(expected.intersection(found.tolist())) / len(expected))
+        print(f"{name:<24}{resident_bytes / 2**20:>14.1f}{np.mean(recalls):>10.4f}{np.mean(latencies):>10.2f}{np.percentile(latencies, 99):>10.2f}")
+
+    report("float32 inner product", embeddings.nbytes, lambda q: best_k(embeddings @ q, k))
+    report(f"{method}", compressed.nbytes(), lambda q: compressed.search(q, k)[0])
+    if rerank_factor > 0:
+        report(f"{method} + rerank x{rerank_factor}", compressed.nbytes(), lambda q: compressed.search(q, k, embeddings, rerank_factor)[0])
+
+
+async def main() -> None:
+    settings = Settings()
+
+    parser = argparse.ArgumentParser(description="Manage vector snapshots for the local search engine")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export a snapshot of one embed_version")
+    export_parser.add_argument("--embed-version", default="default")
+    export_parser.add_argument("--snapshot-dir", default=settings.local_engine_snapshot_dir)
+    export_parser.add_argument("--dim", type=int, default=settings.embedding_dim)
+    export_parser.add_argument("--batch-size", type=int, default=10_000)
+    export_parser.add_argument("--keep", type=int, default=2, help="How many previous snapshots to keep")
+    export_parser.add_argument("--storage", choices=("vector", "halfvec"), default=settings.embedding_storage, help="Embedding column to export")
+    export_parser.add_argument("--compress", dest="method", choices=("int8", "pq"), help="Also build quantized codes before publishing")
+
+    compress_parser = subparsers.add_parser("compress", help="Train a quantizer on the current snapshot and publish it with the codes")
+    compress_parser.add_argument("--embed-version", default="default")
+    compress_parser.add_argument("--snapshot-dir", default=settings.local_engine_snapshot_dir)
+    compress_parser.add_argument("--method", choices=("int8", "pq"), default="pq")
+    compress_parser.add_argument("--keep", type=int, default=2, help="How many previous snapshots to keep")
+
+    for subparser in (export_parser, compress_parser):
+        subparser.add_argument("--subspaces", type=int, default=64, help="PQ: number of sub-vectors (bytes per code)")
+        subparser.add_argument("--iterations", type=int, default=20, help="PQ: k-means iterations per subspace")
+        subparser.add_argument("--train-size", type=int, default=100_000)
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="Report memory and recall@k of the quantized codes")
+    evaluate_parser.add_argument("--embed-version", default="default")
+    evaluate_parser.add_argument("--snapshot-dir", default=settings.local_engine_snapshot_dir)
+    evaluate_parser.add_argument("--method", choices=("int8", "pq"), default="pq")
+    evaluate_parser.add_argument("--k", type=int, default=10)
+    evaluate_parser.add_argument("--queries", type=int, default=200)
+    evaluate_parser.add_argument("--rerank-factor", type=int, default=settings.local_engine_rerank_factor)
+
+    args = parser.parse_args()
+
+    compression = None
+    if args.command in ("export", "compress") and args.method is not None:
+        compression = CompressionOptions(args.method, args.subspaces, args.iterations, args.train_size)
+
+    if args.command == "export":
+        await export(
+            settings.database_url, args.snapshot_dir, args.embed_version, args.dim, args.batch_size, args.keep, args.storage,
+            compression,
+        )
+    elif args.command == "compress":
+        compress(args.snapshot_dir, args.embed_version, compression, args.keep)
+    else:
+        evaluate(args.snapshot_dir, args.embed_version, args.method, args.k, args.queries, args.rerank_factor)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -52,6 +52,7 @@ const app = Vue.createApp({
       <item-dialog
         v-if="focusImage"
         :clicked-item="selected" 
+        @selected-result="onSelectResult"
         @close-focus="onCloseFocus" />
     </div>
   `
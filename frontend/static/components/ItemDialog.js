@@ -1,3 +1,5 @@
+import Result from '../models/Result.js';
+
 export default {
     name: 'ItemDialog',
     props: ['clickedItem'],
@@ -45,6 +47,18 @@ export default {
                 </div>
               </div>
             </div>
+            <div class="similar" v-if="similar.length">
+              <div class="key">Similar specimens</div>
+              <div class="similar-images">
+                <img
+                  v-for="result in similar"
+                  :key="result.id"
+                  :src="result.thumbnail_url"
+                  onerror="this.onerror=''; this.src='static/unavailable-image.jpg';"
+                  @click="selectSimilar(result)"
+                />
+              </div>
+            </div>
           </div>
           <div class="image-src">
             <img
@@ -56,10 +70,48 @@ export default {
         </div>
       </div>
     `,
+    data() {
+      return {
+        similar: [],
+      };
+    },
+    watch: {
+      clickedItem: {
+        immediate: true,
+        handler(item) {
+          this.loadSimilar(item);
+        },
+      },
+    },
     methods: {
         closeFocus() {
           this.$emit('close-focus');
         },
+        selectSimilar(result) {
+          this.$emit('selected-result', result);
+        },
+        loadSimilar(item) {
+          // Ranked from the stored embedding, so this is cheap enough to fetch on every open
+          this.similar = [];
+          if (item === undefined || item.id === undefined) {
+            return;
+          }
+          var endpoint = window.location.origin + "/api/records/" + item.id + "/similar";
+          let self = this;
+
+          axios
+            .get(endpoint, { params: { limit: 12, embed_version: item.embed_version } })
+            .then(function (response) {
+              // Ignore responses for an item the dialog no longer shows
+              if (self.clickedItem === item && response.data.hasOwnProperty('records')) {
+                self.similar = response.data.records.map((record) => new Result(record));
+              }
+            })
+            .catch(function () {
+              // Similar specimens are optional; the dialog works without them
+              self.similar = [];
+            });
+        },
     },
   };
   
\ No newline at end of file
@@ -8,7 +8,7 @@ export default {
         <div class="img-column" v-for="column in resultColumns" :key="column">
             <template v-for="result in column">
                 <img
-                    :src="result.image_source_name != 'NA' ? result.media_url : 'static/unavailable-image.jpg'"
+                    :src="result.image_source_name != 'NA' ? result.thumbnail_url : 'static/unavailable-image.jpg'"
                     onerror="this.onerror=''; this.src='static/unavailable-image.jpg';"
                     class="img-fluid"
                     :id="result.id"
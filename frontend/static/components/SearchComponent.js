@@ -55,7 +55,8 @@ export default {
             // in axios methods
             var bodyFormData = new FormData();
             bodyFormData.append("search_param", this.inputQuery);
-            this.queryAPI(bodyFormData);
+            // Hybrid ranking also matches scientific and common names exactly
+            this.queryAPI(bodyFormData, { mode: "hybrid" });
           },
           uploadFileChanged(event) {
             const files = event.target.files;
@@ -67,13 +68,14 @@ export default {
               this.queryAPI(bodyFormData);
             }
           },
-          queryAPI(formData) {
+          queryAPI(formData, params = {}) {
             var endpoint = window.location.origin + "/api/search";
             let self = this;
       
             axios({
               method: "post",
               url: endpoint,
+              params: params,
               data: formData,
               headers: { "Content-Type": "multipart/form-data" },
             })
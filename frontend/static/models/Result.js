@@ -15,6 +15,11 @@ export default class Result {
       this.map_url = `https://maps.google.com/?q=${this.latitude}%2C${this.longitude}`;
       this.source_id = search_results.specimen_id;
       this.source = search_results.source;
+      this.embed_version = search_results.embed_version;
+      // Resized copy served (and cached) by the backend, instead of the multi-megabyte original
+      this.thumbnail_url = search_results.external_id
+        ? `${window.location.origin}/api/media/${search_results.external_id}/thumb`
+        : this.media_url;
   
       this.name = search_results.scientific_name;
       this.description = search_results.description;
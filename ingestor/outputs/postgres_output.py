@@ -1,31 +1,57 @@
 # NOTE: Run the sql schema changes before running this script
 
 import asyncpg
-from typing import List, Any
+import json
+from typing import List, Any, Literal
 from logging import getLogger
 from schema.processed_search_record import ProcessedSearchRecord
 
 
 logger = getLogger("outputs.postgres")
 
+BUMP_GENERATIONS_QUERY = """
+INSERT INTO embed_version_generations (embed_version, generation)
+SELECT unnest($1::varchar[]), 1
+ON CONFLICT (embed_version) DO UPDATE
+SET generation = embed_version_generations.generation + 1, updated_at = now()
+"""
+
+EMBEDDING_STORAGES = ("vector", "halfvec", "both")
+
+# Creates the version's search_records partition (V8), with an HNSW index, if it is missing
+ENSURE_PARTITION_QUERY = "SELECT ensure_search_records_partition($1, $2, $3)"
+DEFAULT_EMBEDDING_DIM = 512
+
 
 async def index_to_postgres(
     data: List[ProcessedSearchRecord],
     conn: asyncpg.Connection,
     table: str,
+    embedding_storage: Literal["vector", "halfvec", "both"] = "both",
 ) -> None:
     """
     Inserts or updates data into a PostgreSQL table.
 
+    `search_records` is partitioned by embed_version; the partition (and its HNSW index
+    over the column the backend will search) is created first for versions that have none.
+    Every embed_version written to also has its generation in `embed_version_generations`
+    bumped in the same transaction, which invalidates cached search results for it.
+
     Args:
         data (List[ProcessedRecord]): A list of ProcessedRecord objects to be inserted into the table.
         conn (asyncpg.Connection): The connection object to the PostgreSQL database.
         table (str): The name of the table to insert the data into.
+        embedding_storage (str): Which embedding columns to write: "vector" (float32
+            `embedding` only), "halfvec" (half-precision `embedding_half` only, for
+            deployments searching with EMBEDDING_STORAGE=halfvec) or "both" (the default,
+            so either column can be searched).
 
     Raises:
         ValueError: If the data list is empty or if required fields are missing.
         asyncpg.PostgresError: If there's an error during the database operation.
     """
+    if embedding_storage not in EMBEDDING_STORAGES:
+        raise ValueError(f"embedding_storage must be one of {EMBEDDING_STORAGES}, got {embedding_storage!r}")
     if not data:
         logger.warning("No data to insert/update")
         return
@@ -50,6 +76,7 @@ async def index_to_postgres(
         "earliest_age_or_lowest_stage",
         "external_media_uri",
         "embedding",
+        "embedding_half",
         "model",
         "pretrained",
         "embed_version",
@@ -61,7 +88,13 @@ async def index_to_postgres(
         if record.get("media_uuid") is None:
             logger.warning(f"Skipping record without media_uuid: {record}")
             continue
-        values.append(tuple(record.get(col) for col in columns))
+        # Both columns take the same text form; Postgres rounds it to half precision for embedding_half
+        row = {**record, "embedding_half": record.get("embedding")}
+        if embedding_storage == "vector":
+            row["embedding_half"] = None
+        elif embedding_storage == "halfvec":
+            row["embedding"] = None
+        values.append(tuple(row.get(col) for col in columns))
 
     if not values:
         logger.warning("No valid records to insert/update")
@@ -78,16 +111,35 @@ async def index_to_postgres(
     ON CONFLICT (media_uuid, embed_version) DO UPDATE SET {update_set}
     """
 
+    embed_versions = sorted({row[columns.index("embed_version")] for row in values})
+    embedding = next((record["embedding"] for record in data if record.get("embedding")), None)
+    dim = len(json.loads(embedding)) if embedding else DEFAULT_EMBEDDING_DIM
+    index_storage = "halfvec" if embedding_storage == "halfvec" else "vector"
+
+    async def ensure_partitions() -> None:
+        for embed_version in embed_versions:
+            await conn.execute(ENSURE_PARTITION_QUERY, embed_version, dim, index_storage)
+
+    async def write() -> None:
+        await conn.executemany(query, values)
+        # Invalidates the backend's cached search results for these versions
+        await conn.execute(BUMP_GENERATIONS_QUERY, embed_versions)
+
     try:
         # Check if we're already in a transaction
         in_transaction = conn.is_in_transaction()
         
         if not in_transaction:
+            # Separately committed: creating a partition locks search_records, which
+            # should not last for the whole batch
+            async with conn.transaction():
+                await ensure_partitions()
             async with conn.transaction():
-                await conn.executemany(query, values)
+                await write()
         else:
             # If we're already in a transaction, just execute the query
-            await conn.executemany(query, values)
+            await ensure_partitions()
+            await write()
         
         logger.info(f"Successfully inserted/updated {len(values)} records into {table}")
     except asyncpg.PostgresError as e:
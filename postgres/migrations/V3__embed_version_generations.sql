@@ -0,0 +1,15 @@
+-- 1. Per-embed_version generation counter.
+-- The ingestor bumps a version's generation whenever it writes rows for it, so
+-- caches keyed on embed_version (e.g. the backend's search result cache) can
+-- tell when their entries are stale.
+CREATE TABLE IF NOT EXISTS embed_version_generations (
+    embed_version VARCHAR(512) PRIMARY KEY,
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 2. Seed a row for every version that already has data
+INSERT INTO embed_version_generations (embed_version, generation)
+SELECT DISTINCT embed_version, 1
+FROM search_records
+ON CONFLICT (embed_version) DO NOTHING;
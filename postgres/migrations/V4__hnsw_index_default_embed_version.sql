@@ -0,0 +1,12 @@
+-- 1. HNSW index for the 'default' embed_version.
+-- Embeddings are L2-normalized by the vector_embedder, so the backend ranks by
+-- negative inner product (<#>), which orders rows exactly like l2_distance.
+-- `embedding` is an untyped VECTOR column, so the index is an expression index on
+-- a cast to a fixed dimension; the search query uses the same expression.
+-- Other embed_versions get their own partial index via `python -m tools.ann_indexes build`
+-- (run from backend/); that tool uses the same naming scheme as below.
+CREATE INDEX IF NOT EXISTS idx_search_records_hnsw_default
+ON search_records
+USING hnsw ((embedding::vector(512)) vector_ip_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE embed_version = 'default';
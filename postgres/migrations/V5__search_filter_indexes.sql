@@ -0,0 +1,17 @@
+-- Indexes backing the structured filters on /api/search.
+-- Every search is scoped to one embed_version, so the B-tree filters lead with it.
+
+-- 1. Taxonomy filters
+CREATE INDEX IF NOT EXISTS idx_search_records_version_tax_order
+ON search_records (embed_version, tax_order);
+
+CREATE INDEX IF NOT EXISTS idx_search_records_version_tax_family
+ON search_records (embed_version, tax_family);
+
+-- 2. Collection date range filter
+CREATE INDEX IF NOT EXISTS idx_search_records_version_collection_date
+ON search_records (embed_version, collection_date);
+
+-- 3. Bounding box (ST_Intersects) and radius (ST_DWithin) filters on location
+CREATE INDEX IF NOT EXISTS idx_search_records_location
+ON search_records USING gist (location);
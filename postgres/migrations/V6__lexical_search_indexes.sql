@@ -0,0 +1,22 @@
+-- Indexes backing the lexical half of hybrid search (`mode=hybrid` on /api/search).
+-- The backend's lexical query in services/vector_search.py uses exactly these expressions;
+-- change both together, or the planner falls back to sequential scans.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. Full-text match over the taxonomic names. The 'simple' configuration does no
+-- stemming, so Latin binomials ("Papilio glaucus") are matched token for token.
+CREATE INDEX IF NOT EXISTS idx_search_records_lexical_tsv
+ON search_records
+USING gin (to_tsvector('simple'::regconfig,
+    coalesce(scientific_name, '') || ' ' || coalesce(common_name, '') || ' ' || coalesce(higher_taxon, '')));
+
+-- 2. Trigram indexes for misspelled and partial names (the `%` similarity operator)
+CREATE INDEX IF NOT EXISTS idx_search_records_scientific_name_trgm
+ON search_records USING gin (scientific_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_search_records_common_name_trgm
+ON search_records USING gin (common_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_search_records_higher_taxon_trgm
+ON search_records USING gin (higher_taxon gin_trgm_ops);
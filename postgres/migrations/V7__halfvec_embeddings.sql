@@ -0,0 +1,8 @@
+-- Half-precision embedding storage (pgvector >= 0.7 `halfvec`): 2 bytes per dimension
+-- instead of 4, for both the heap and the ANN indexes.
+-- Nullable with no default, so adding the column does not rewrite the table. Existing rows
+-- are copied over per embed_version, and their halfvec ANN index built, by
+-- `python -m tools.halfvec backfill --embed-version <version>` (run from backend/); the
+-- backend searches this column once EMBEDDING_STORAGE=halfvec.
+ALTER TABLE search_records
+ADD COLUMN IF NOT EXISTS embedding_half halfvec;
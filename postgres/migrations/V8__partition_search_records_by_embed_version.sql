@@ -0,0 +1,162 @@
+-- Rebuild search_records as a LIST-partitioned table with one partition per embed_version.
+-- Scans, vacuum and index builds of one version no longer touch the others, and retiring a
+-- version is a partition detach (`python -m tools.partitions detach`, run from backend/)
+-- instead of a bulk DELETE.
+--
+-- Partition and ANN index names follow services/vector_search.py (`partition_suffix`):
+-- the embed_version itself when it is a short lowercase identifier, otherwise a slug plus
+-- the first 8 hex digits of its md5. Change both together.
+--
+-- This migration copies every row and builds one HNSW index per version, so it takes a
+-- while on a large table; it holds an exclusive lock on search_records throughout.
+--
+-- Each version's index is built at that version's own embedding width (read from its rows
+-- with vector_dims), so versions ingested with wider models (ViT-L-14, 768) migrate too.
+-- Every existing ANN index is dropped with the old table, including custom IVFFlat or
+-- HNSW indexes with other m/ef_construction built by `python -m tools.ann_indexes`; they
+-- are replaced by HNSW with the defaults (m = 16, ef_construction = 64). Rebuild any
+-- custom ones per partition afterwards.
+
+-- 1. Naming and partition creation, shared by this migration, the ingestor and backend/tools
+CREATE OR REPLACE FUNCTION search_records_partition_suffix(p_embed_version text)
+RETURNS text
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_embed_version ~ '^[a-z0-9_]{1,32}$' THEN p_embed_version
+        ELSE left(trim(both '_' from regexp_replace(lower(p_embed_version), '[^a-z0-9]+', '_', 'g')), 24)
+            || '_' || left(md5(p_embed_version), 8)
+    END
+$$;
+
+-- Creates the version's partition if it is missing, with an HNSW index over the given
+-- embedding column ('vector' for `embedding`, 'halfvec' for `embedding_half`) unless
+-- p_index is false (bulk loads build it after copying instead). Returns the partition name.
+CREATE OR REPLACE FUNCTION ensure_search_records_partition(
+    p_embed_version text,
+    p_dim integer DEFAULT 512,
+    p_storage text DEFAULT 'vector',
+    p_index boolean DEFAULT true
+)
+RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    suffix text := search_records_partition_suffix(p_embed_version);
+    partition_name text := 'search_records_' || suffix;
+BEGIN
+    IF p_storage NOT IN ('vector', 'halfvec') THEN
+        RAISE EXCEPTION 'Unknown embedding storage: %', p_storage;
+    END IF;
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+    -- Serializes concurrent ingestors writing the same new version
+    PERFORM pg_advisory_xact_lock(hashtext('search_records_partitions'));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF search_records FOR VALUES IN (%L)',
+        partition_name, p_embed_version
+    );
+    IF p_index THEN
+        EXECUTE format(
+            'CREATE INDEX %I ON %I USING hnsw ((%I::%s(%s)) %s_ip_ops) WITH (m = 16, ef_construction = 64)',
+            'idx_search_records_hnsw' || CASE WHEN p_storage = 'halfvec' THEN '_h' ELSE '' END || '_' || suffix,
+            partition_name,
+            CASE WHEN p_storage = 'halfvec' THEN 'embedding_half' ELSE 'embedding' END,
+            p_storage, p_dim, p_storage
+        );
+    END IF;
+    RETURN partition_name;
+END
+$$;
+
+-- 2. The partitioned table, with the same columns, defaults and id sequence
+ALTER TABLE search_records RENAME TO search_records_unpartitioned;
+
+CREATE TABLE search_records (LIKE search_records_unpartitioned INCLUDING DEFAULTS)
+PARTITION BY LIST (embed_version);
+
+ALTER SEQUENCE search_records_id_seq OWNED BY search_records.id;
+
+-- 3. One partition per existing version, filled before its ANN index is built
+DO $$
+DECLARE
+    version text;
+BEGIN
+    FOR version IN SELECT DISTINCT embed_version FROM search_records_unpartitioned LOOP
+        -- No index yet, so the width is unused here; step 5 reads it per version
+        PERFORM ensure_search_records_partition(version, 512, 'vector', false);
+    END LOOP;
+END
+$$;
+
+INSERT INTO search_records SELECT * FROM search_records_unpartitioned;
+
+-- Also frees the index and constraint names (search_records_pkey, ...) reused below
+DROP TABLE search_records_unpartitioned;
+
+-- 4. Keys and non-vector indexes, declared once on the parent and created on every partition.
+-- Unique constraints on a partitioned table must include the partition key. Within a
+-- partition embed_version is constant, so the V5 filter indexes drop it.
+ALTER TABLE search_records ADD PRIMARY KEY (id, embed_version);
+
+CREATE UNIQUE INDEX idx_unique_media_uuid_embed_version
+ON search_records (media_uuid, embed_version);
+
+CREATE INDEX idx_search_records_tax_order ON search_records (tax_order);
+
+CREATE INDEX idx_search_records_tax_family ON search_records (tax_family);
+
+CREATE INDEX idx_search_records_collection_date ON search_records (collection_date);
+
+CREATE INDEX idx_search_records_location ON search_records USING gist (location);
+
+CREATE INDEX idx_search_records_lexical_tsv
+ON search_records
+USING gin (to_tsvector('simple'::regconfig,
+    coalesce(scientific_name, '') || ' ' || coalesce(common_name, '') || ' ' || coalesce(higher_taxon, '')));
+
+CREATE INDEX idx_search_records_scientific_name_trgm
+ON search_records USING gin (scientific_name gin_trgm_ops);
+
+CREATE INDEX idx_search_records_common_name_trgm
+ON search_records USING gin (common_name gin_trgm_ops);
+
+CREATE INDEX idx_search_records_higher_taxon_trgm
+ON search_records USING gin (higher_taxon gin_trgm_ops);
+
+-- 5. Per-partition ANN indexes, replacing the partial ones (V4 and tools.ann_indexes).
+-- Built for each version's halfvec column too where it has been backfilled (V7).
+-- The width comes from the version's own rows; a version without embeddings gets 512.
+DO $$
+DECLARE
+    version text;
+    suffix text;
+    dim integer;
+BEGIN
+    FOR version IN SELECT DISTINCT embed_version FROM search_records LOOP
+        suffix := search_records_partition_suffix(version);
+        dim := coalesce(
+            (SELECT vector_dims(embedding) FROM search_records
+             WHERE embed_version = version AND embedding IS NOT NULL LIMIT 1),
+            512
+        );
+        EXECUTE format(
+            'CREATE INDEX %I ON %I USING hnsw ((embedding::vector(%s)) vector_ip_ops) WITH (m = 16, ef_construction = 64)',
+            'idx_search_records_hnsw_' || suffix, 'search_records_' || suffix, dim
+        );
+        dim := (SELECT vector_dims(embedding_half) FROM search_records
+                WHERE embed_version = version AND embedding_half IS NOT NULL LIMIT 1);
+        IF dim IS NOT NULL THEN
+            EXECUTE format(
+                'CREATE INDEX %I ON %I USING hnsw ((embedding_half::halfvec(%s)) halfvec_ip_ops) WITH (m = 16, ef_construction = 64)',
+                'idx_search_records_hnsw_h_' || suffix, 'search_records_' || suffix, dim
+            );
+        END IF;
+    END LOOP;
+END
+$$;
+
+ANALYZE search_records;
@@ -0,0 +1,67 @@
+-- ensure_search_records_partition (V8) returned early whenever any relation with the
+-- partition's name existed. After `tools.partitions detach`, re-ingesting that version then
+-- failed on insert with "no partition of relation found for row", and so did a version whose
+-- name collides with an unrelated relation. It now only treats an attached child of
+-- search_records as the partition, and raises a clear error for a same-named relation that
+-- is not one.
+
+CREATE OR REPLACE FUNCTION search_records_partition_attached(p_partition_name text)
+RETURNS boolean
+LANGUAGE sql STABLE AS $$
+    SELECT EXISTS (
+        SELECT 1
+        FROM pg_inherits
+        WHERE inhparent = 'search_records'::regclass
+          AND inhrelid = to_regclass(p_partition_name)
+          AND NOT inhdetachpending
+    )
+$$;
+
+CREATE OR REPLACE FUNCTION ensure_search_records_partition(
+    p_embed_version text,
+    p_dim integer DEFAULT 512,
+    p_storage text DEFAULT 'vector',
+    p_index boolean DEFAULT true
+)
+RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    suffix text := search_records_partition_suffix(p_embed_version);
+    partition_name text := 'search_records_' || suffix;
+BEGIN
+    IF p_storage NOT IN ('vector', 'halfvec') THEN
+        RAISE EXCEPTION 'Unknown embedding storage: %', p_storage;
+    END IF;
+    IF search_records_partition_attached(partition_name) THEN
+        RETURN partition_name;
+    END IF;
+    -- Serializes concurrent ingestors writing the same new version
+    PERFORM pg_advisory_xact_lock(hashtext('search_records_partitions'));
+    IF search_records_partition_attached(partition_name) THEN
+        RETURN partition_name;
+    END IF;
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RAISE EXCEPTION 'Relation % exists but is not an attached partition of search_records', partition_name
+            USING HINT = format(
+                'If embed_version %L was detached, run `python -m tools.partitions attach` or `drop` for it; '
+                'otherwise the name collides with another relation and the version needs a different name.',
+                p_embed_version
+            );
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF search_records FOR VALUES IN (%L)',
+        partition_name, p_embed_version
+    );
+    IF p_index THEN
+        EXECUTE format(
+            'CREATE INDEX %I ON %I USING hnsw ((%I::%s(%s)) %s_ip_ops) WITH (m = 16, ef_construction = 64)',
+            'idx_search_records_hnsw' || CASE WHEN p_storage = 'halfvec' THEN '_h' ELSE '' END || '_' || suffix,
+            partition_name,
+            CASE WHEN p_storage = 'halfvec' THEN 'embedding_half' ELSE 'embedding' END,
+            p_storage, p_dim, p_storage
+        );
+    END IF;
+    RETURN partition_name;
+END
+$$;